@@ -0,0 +1,124 @@
+"""
+Micro-benchmark: reference geocoding helpers vs the fused address parser.
+
+    python -m benchmarks.address_parser_bench --rows 200000 --workers 4
+
+Generates a deterministic OPIS-style corpus (highway intersections, exits,
+mile markers, postal addresses, heavy duplication as in the real feed), checks
+that the fused parser matches the reference functions row-for-row, and prints
+rows/second for each path.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import django
+
+CITIES = [
+    ("Miami", "FL"), ("Atlanta", "GA"), ("Dallas", "TX"), ("Amarillo", "TX"), ("Gary", "IN"),
+    ("Little Rock", "AR"), ("Knoxville", "TN"), ("Laramie", "WY"), ("Barstow", "CA"), ("Joplin", "MO"),
+]
+STREETS = ["Main", "Commerce", "Industrial", "Truck Stop", "Frontage", "Airport", "Market", "Oak"]
+SUFFIXES = ["St", "Rd", "Ave", "Blvd", "Hwy", "Pkwy", "Dr", "Ln", "Way"]
+
+
+def road(rnd):
+    kind = rnd.choice(["I", "I", "US", "SR"])
+    return f"{kind}-{rnd.randint(1, 99 if kind != 'SR' else 999)}"
+
+
+def synthetic_address(rnd):
+    shape = rnd.random()
+    if shape < 0.30:
+        return f"{road(rnd)} & {road(rnd)}" + (f", EXIT {rnd.randint(1, 400)}" if rnd.random() < 0.5 else "")
+    if shape < 0.40:
+        return f"{road(rnd)} and {road(rnd)} & {road(rnd)}"
+    if shape < 0.55:
+        return f"{road(rnd)} EXIT {rnd.randint(1, 400)}"
+    if shape < 0.62:
+        return f"{road(rnd)} MM {rnd.randint(1, 400)}"
+    if shape < 0.70:
+        return road(rnd)
+    if shape < 0.95:
+        return f"{rnd.randint(1, 99999)}  {rnd.choice(['', 'N ', 'SW '])}{rnd.choice(STREETS)} {rnd.choice(SUFFIXES)}"
+    return f"{rnd.choice(STREETS)} Travel Center"
+
+
+def synthetic_corpus(rows, seed=7, distinct=0.35):
+    """About `distinct` of the rows are unique; the rest repeat earlier rows (as the feed does)."""
+    rnd = random.Random(seed)
+    out = []
+    for _ in range(rows):
+        if out and rnd.random() > distinct:
+            out.append(rnd.choice(out))
+            continue
+        city, state = rnd.choice(CITIES)
+        out.append((synthetic_address(rnd), f" {city} ", state.lower()))
+    return out
+
+
+def timed(label, fn, n):
+    t0 = time.perf_counter()
+    result = fn()
+    dt = time.perf_counter() - t0
+    print(f"{label:<34} {dt:8.3f}s  {n / dt:12,.0f} rows/s")
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+    django.setup()
+
+    from routing.services import address_parser
+    from routing.services.geocoding import classify_address, normalize_address_components
+
+    corpus = synthetic_corpus(args.rows, seed=args.seed)
+    print(f"{len(corpus):,} rows, {len(set(corpus)):,} distinct, {args.workers} workers")
+
+    def reference():
+        out = []
+        for a, c, s in corpus:
+            norm = normalize_address_components(a, c, s)
+            out.append((norm, classify_address(norm[0])))
+        return out
+
+    def fused_uncached():
+        out = []
+        for a, c, s in corpus:
+            norm = address_parser._normalize(a, c, s)
+            out.append((norm, address_parser._classify(norm[0])))
+        return out
+
+    def cold(fn):
+        address_parser.parse_station.cache_clear()
+        address_parser.classify.cache_clear()
+        return fn()
+
+    ref = timed("reference (normalize+classify)", reference, len(corpus))
+    timed("fused single pass, no memo", fused_uncached, len(corpus))
+    fused = timed("fused + memo, in-process", lambda: cold(lambda: address_parser.parse_stations_batch(corpus)), len(corpus))
+    timed(
+        f"fused + memo, {args.workers} processes",
+        lambda: cold(lambda: address_parser.parse_stations_batch(corpus, workers=args.workers)),
+        len(corpus),
+    )
+
+    mismatches = sum(
+        1 for (norm, cls), p in zip(ref, fused)
+        if norm != (p.address, p.city, p.state) or cls != p.classification()
+    )
+    print(f"mismatches vs reference: {mismatches}")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    sys.exit(main())
@@ -0,0 +1,232 @@
+"""
+Traffic driver for /api/v1/route-plan/ load tests.
+
+    python -m benchmarks.loadtest --url http://127.0.0.1:8000/api/v1/route-plan/ \
+        --concurrency 32 --duration 60 --mix hot=0.6,tail=0.3,coords=0.1
+
+Replays a mix of lane patterns:
+    hot     a small set of popular city pairs with Zipf-like popularity (cache hits)
+    tail    random city pairs with varied street addresses (geocode + route misses)
+    coords  random city pairs sent as lat/lon (no geocoding)
+
+Closed loop by default: each of --concurrency workers sends its next request
+when the previous one returns. With --rate the load is open loop: requests are
+scheduled at a fixed rate and latency is measured from the scheduled time, so
+queueing behind a saturated server is counted rather than hidden.
+
+Reports throughput, status codes and latency percentiles overall and per stage,
+the latter from the Server-Timing header (geocode, route, decode, corridor, plan, db).
+Point the app at the stand-ins from benchmarks.loadtest_servers first.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+import requests
+
+from benchmarks.synthetic import CITIES
+
+STREETS = ("Main St", "Oak Ave", "Industrial Blvd", "Truck Stop Rd", "Commerce Dr", "Highway 1")
+CORRIDOR_CHOICES = (5, 10, 10, 10, 25)
+_SERVER_TIMING = re.compile(r"([\w-]+)(?:;dur=([\d.]+))?")
+
+
+def parse_mix(spec: str) -> dict:
+    mix = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, weight = item.partition("=")
+        if name not in ("hot", "tail", "coords"):
+            raise ValueError(f"Unknown lane pattern '{name}'")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def _city_label(name: str) -> str:
+    return f"{name}, {CITIES[name][2]}"
+
+
+class LaneMix:
+    """Deterministic (per seed) stream of request bodies."""
+
+    def __init__(self, mix: dict, hot_lanes: int, seed: int):
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.patterns = list(mix)
+        self.weights = [mix[p] for p in self.patterns]
+        self.names = sorted(CITIES)
+        self.hot = []
+        while len(self.hot) < hot_lanes:
+            start, finish = self.rng.sample(self.names, 2)
+            self.hot.append((start, finish))
+        self.hot_weights = [1.0 / (rank + 1) for rank in range(len(self.hot))]
+
+    def next(self):
+        with self.lock:
+            pattern = self.rng.choices(self.patterns, self.weights)[0]
+            if pattern == "hot":
+                start, finish = self.rng.choices(self.hot, self.hot_weights)[0]
+                return pattern, {"start": _city_label(start), "finish": _city_label(finish), "corridor_miles": 10}
+            start, finish = self.rng.sample(self.names, 2)
+            corridor = self.rng.choice(CORRIDOR_CHOICES)
+            if pattern == "coords":
+                jitter = lambda: self.rng.uniform(-0.05, 0.05)  # noqa: E731
+                return pattern, {
+                    "start": {"lat": round(CITIES[start][0] + jitter(), 5), "lon": round(CITIES[start][1] + jitter(), 5)},
+                    "finish": {"lat": round(CITIES[finish][0] + jitter(), 5), "lon": round(CITIES[finish][1] + jitter(), 5)},
+                    "corridor_miles": corridor,
+                }
+            address = lambda city: f"{self.rng.randint(100, 9999)} {self.rng.choice(STREETS)}, {_city_label(city)}"  # noqa: E731
+            return pattern, {"start": address(start), "finish": address(finish), "corridor_miles": corridor}
+
+
+def parse_server_timing(header: str) -> dict:
+    stages = {}
+    for part in filter(None, (p.strip() for p in (header or "").split(","))):
+        match = _SERVER_TIMING.match(part)
+        if match and match.group(2) is not None:
+            stages[match.group(1)] = float(match.group(2))
+    return stages
+
+
+def percentiles(values, points=(50, 90, 99)):
+    ordered = sorted(values)
+    if not ordered:
+        return {f"p{p}": None for p in points}
+    return {f"p{p}": round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))], 1) for p in points}
+
+
+class Results:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latency_ms = []
+        self.by_pattern = defaultdict(list)
+        self.stages = defaultdict(list)
+        self.statuses = Counter()
+        self.errors = Counter()
+
+    def record(self, pattern, status, latency_ms, server_timing=None, error=None):
+        with self.lock:
+            self.statuses[status] += 1
+            self.latency_ms.append(latency_ms)
+            self.by_pattern[pattern].append(latency_ms)
+            if error:
+                self.errors[error] += 1
+            for stage, dur in parse_server_timing(server_timing).items():
+                self.stages[stage].append(dur)
+
+
+def run(args, lanes: LaneMix, results: Results):
+    headers = {"X-API-Key": args.api_key, "Content-Type": "application/json"}
+    stop_at = time.monotonic() + args.duration if args.duration else None
+    issued = [0]
+    issued_lock = threading.Lock()
+    started = time.monotonic()
+
+    def next_slot():
+        """Returns the scheduled start (open loop) / now (closed loop), or None when done."""
+        with issued_lock:
+            if args.requests and issued[0] >= args.requests:
+                return None
+            index = issued[0]
+            issued[0] += 1
+        scheduled = started + index / args.rate if args.rate else time.monotonic()
+        if stop_at is not None and scheduled >= stop_at:
+            return None
+        return scheduled
+
+    def worker():
+        session = requests.Session()
+        while True:
+            scheduled = next_slot()
+            if scheduled is None:
+                return
+            delay = scheduled - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            pattern, body = lanes.next()
+            try:
+                response = session.post(args.url, data=json.dumps(body), headers=headers, timeout=args.timeout)
+                results.record(pattern, response.status_code, (time.monotonic() - scheduled) * 1000,
+                               response.headers.get("Server-Timing"))
+            except requests.RequestException as e:
+                results.record(pattern, "error", (time.monotonic() - scheduled) * 1000, error=type(e).__name__)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(args.concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.monotonic() - started
+
+
+def report(results: Results, elapsed: float) -> dict:
+    total = sum(results.statuses.values())
+    return {
+        "requests": total,
+        "elapsed_s": round(elapsed, 2),
+        "throughput_rps": round(total / elapsed, 2) if elapsed else None,
+        "statuses": {str(k): v for k, v in sorted(results.statuses.items(), key=lambda kv: str(kv[0]))},
+        "errors": dict(results.errors),
+        "latency_ms": {**percentiles(results.latency_ms), "max": round(max(results.latency_ms), 1) if total else None},
+        "patterns": {p: {"requests": len(v), **percentiles(v)} for p, v in results.by_pattern.items()},
+        "stages": {s: {"requests": len(v), **percentiles(v)} for s, v in results.stages.items()},
+    }
+
+
+def print_report(summary: dict):
+    print(f"{summary['requests']} requests in {summary['elapsed_s']}s = {summary['throughput_rps']} req/s")
+    print("status: " + ", ".join(f"{k} x{v}" for k, v in summary["statuses"].items()))
+    if summary["errors"]:
+        print("client errors: " + ", ".join(f"{k} x{v}" for k, v in summary["errors"].items()))
+    lat = summary["latency_ms"]
+    print(f"\n{'':<12}{'n':>7}{'p50':>10}{'p90':>10}{'p99':>10}  (ms)")
+    print(f"{'overall':<12}{summary['requests']:>7}{lat['p50']:>10}{lat['p90']:>10}{lat['p99']:>10}  max {lat['max']}")
+    for group in ("patterns", "stages"):
+        print()
+        for name, row in summary[group].items():
+            print(f"{name:<12}{row['requests']:>7}{row['p50']:>10}{row['p90']:>10}{row['p99']:>10}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", type=str, default="http://127.0.0.1:8000/api/v1/route-plan/")
+    parser.add_argument("--api_key", type=str, default=os.environ.get("INTERNAL_API_KEY", ""))
+    parser.add_argument("--concurrency", type=int, default=16, help="Worker threads (max requests in flight)")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds to run (0 = until --requests)")
+    parser.add_argument("--requests", type=int, default=0, help="Stop after this many requests (0 = no limit)")
+    parser.add_argument("--rate", type=float, default=0, help="Open-loop requests/second (0 = closed loop)")
+    parser.add_argument("--mix", type=str, default="hot=0.6,tail=0.3,coords=0.1")
+    parser.add_argument("--hot_lanes", type=int, default=20)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--warmup", type=int, default=0, help="Requests sent (and discarded) before measuring")
+    parser.add_argument("--json", type=str, default=None, help="Also write the report to this file")
+    args = parser.parse_args(argv)
+    if not args.duration and not args.requests:
+        parser.error("Set --duration or --requests")
+
+    lanes = LaneMix(parse_mix(args.mix), args.hot_lanes, args.seed)
+    if args.warmup:
+        warm = argparse.Namespace(**{**vars(args), "requests": args.warmup, "duration": 0, "rate": 0})
+        run(warm, lanes, Results())
+
+    results = Results()
+    elapsed = run(args, lanes, results)
+    summary = report(results, elapsed)
+    summary["config"] = {k: v for k, v in vars(args).items() if k not in ("api_key", "json")}
+    print_report(summary)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+    return 0 if summary["requests"] else 1
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    sys.exit(main())
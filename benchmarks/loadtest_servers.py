@@ -0,0 +1,341 @@
+"""
+Local stand-ins for the public services the API calls, for load tests.
+
+    python -m benchmarks.loadtest_servers --env_file /tmp/loadtest.env \
+        --osrm latency_ms=60,jitter=0.4 --census latency_ms=300,error_rate=0.05
+
+Starts one HTTP server per service, each in its own process:
+
+    osrm       GET  /route/v1/driving/{lon},{lat};{lon},{lat}[?alternatives=N]
+    census     GET  /geocoder/locations/onelineaddress?address=...
+               POST /geocoder/locations/addressbatch   (multipart addressFile CSV)
+    google     GET  /maps/api/geocode/json?address=...&key=...
+    nominatim  GET  /search?q=...&format=json
+
+Responses have the shape the real services return and the fields the clients
+read. Geocoders resolve any known city name in the query (benchmarks.synthetic.CITIES)
+near that city and hash anything else to a point in the contiguous US, so every
+query has a stable answer. OSRM returns a straight polyline6 route at OSRM-like
+vertex density.
+
+Each service takes a spec of comma-separated key=value settings:
+    latency_ms  median response latency        jitter     lognormal sigma (0 = fixed)
+    error_rate  share of HTTP 503 responses    miss_rate  share of "no match" answers
+    hang_rate   share of responses delayed by hang_s seconds (client timeouts)
+
+GET /__stats on any server returns its request/error/hang counts. The printed
+(or --env_file) environment points the app at these servers and lifts the
+outbound rate limits; load it before starting the app under test.
+"""
+import argparse
+import email.parser
+import functools
+import hashlib
+import json
+import multiprocessing
+import os
+import random
+import re
+import signal
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import polyline
+
+from benchmarks.synthetic import CITIES, CONUS, METERS_PER_MILE
+from routing.services.corridor import haversine_miles
+
+SERVICES = {
+    # name: (default port offset, default spec, env var, path)
+    "osrm": (0, "latency_ms=60,jitter=0.4", "OSRM_BASE_URL", "/route/v1/driving"),
+    "census": (1, "latency_ms=300,jitter=0.5", "CENSUS_GEOCODER_URL", "/geocoder/locations/onelineaddress"),
+    "google": (2, "latency_ms=80,jitter=0.3", "GOOGLE_GEOCODE_URL", "/maps/api/geocode/json"),
+    "nominatim": (3, "latency_ms=150,jitter=0.4", "NOMINATIM_URL", "/search"),
+}
+SPEC_DEFAULTS = {"latency_ms": 50.0, "jitter": 0.0, "error_rate": 0.0, "miss_rate": 0.0, "hang_rate": 0.0, "hang_s": 30.0}
+
+ROAD_FACTOR = 1.15  # road distance vs great circle
+AVG_SPEED_MPS = 26.8  # ~60 mph
+VERTEX_MILES = 0.3
+
+_CITY_PATTERNS = sorted(((name.lower(), coords) for name, coords in CITIES.items()), key=lambda c: -len(c[0]))
+
+
+def parse_spec(spec: str) -> dict:
+    conf = dict(SPEC_DEFAULTS)
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        key, _, value = item.partition("=")
+        if key not in SPEC_DEFAULTS:
+            raise ValueError(f"Unknown setting '{key}' (expected one of {', '.join(SPEC_DEFAULTS)})")
+        conf[key] = float(value)
+    return conf
+
+
+def _unit(query: str, salt: str) -> float:
+    digest = hashlib.blake2b(f"{salt}:{query}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") / 2 ** 64
+
+
+def locate(query: str):
+    """Stable (lat, lon, city, state) for any query string."""
+    text = query.lower()
+    for name, (lat, lon, state) in _CITY_PATTERNS:
+        if name in text:
+            return (lat + (_unit(text, "lat") - 0.5) * 0.04, lon + (_unit(text, "lon") - 0.5) * 0.04,
+                    name.title(), state)
+    lat = CONUS[0] + _unit(text, "lat") * (CONUS[1] - CONUS[0])
+    lon = CONUS[2] + _unit(text, "lon") * (CONUS[3] - CONUS[2])
+    return lat, lon, "Springfield", "US"
+
+
+def _straight(lat1, lon1, lat2, lon2):
+    miles = haversine_miles(lat1, lon1, lat2, lon2)
+    steps = max(1, int(miles / VERTEX_MILES))
+    return [(lat1 + (lat2 - lat1) * i / steps, lon1 + (lon2 - lon1) * i / steps) for i in range(steps + 1)], miles
+
+
+def _route_entry(points, miles):
+    distance = miles * ROAD_FACTOR * METERS_PER_MILE
+    return {
+        "geometry": polyline.encode(points, precision=6),
+        "distance": round(distance, 1),
+        "duration": round(distance / AVG_SPEED_MPS, 1),
+        "weight": round(distance / AVG_SPEED_MPS, 1),
+        "weight_name": "routability",
+        "legs": [],
+    }
+
+
+@functools.lru_cache(maxsize=4096)
+def fake_route(lon1: float, lat1: float, lon2: float, lat2: float, alternatives: int = 0) -> dict:
+    points, miles = _straight(lat1, lon1, lat2, lon2)
+    routes = [_route_entry(points, miles)]
+    # Alternatives detour through a midpoint pushed sideways, alternately left and right
+    for k in range(1, alternatives + 1):
+        offset = 0.4 * ((k + 1) // 2) * (1 if k % 2 else -1)
+        mid_lat, mid_lon = (lat1 + lat2) / 2 + offset * (lon2 - lon1) / 10, (lon1 + lon2) / 2 - offset * (lat2 - lat1) / 10
+        first, first_miles = _straight(lat1, lon1, mid_lat, mid_lon)
+        second, second_miles = _straight(mid_lat, mid_lon, lat2, lon2)
+        routes.append(_route_entry(first + second[1:], first_miles + second_miles))
+    return {
+        "code": "Ok",
+        "routes": routes,
+        "waypoints": [{"location": [lon1, lat1]}, {"location": [lon2, lat2]}],
+    }
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    service = ""
+    conf = SPEC_DEFAULTS
+    stats = None
+    stats_lock = threading.Lock()
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _count(self, key):
+        with self.stats_lock:
+            self.stats[key] = self.stats.get(key, 0) + 1
+
+    def _send(self, status, body, content_type="application/json"):
+        payload = body if isinstance(body, bytes) else json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _delay_or_fail(self) -> bool:
+        """Sleep the injected latency; returns False if an error response was sent."""
+        conf = self.conf
+        latency = conf["latency_ms"] / 1000.0
+        if conf["jitter"]:
+            latency *= random.lognormvariate(0, conf["jitter"])
+        if random.random() < conf["hang_rate"]:
+            self._count("hangs")
+            latency += conf["hang_s"]
+        time.sleep(latency)
+        if random.random() < conf["error_rate"]:
+            self._count("errors")
+            self._send(503, {"error": "injected failure"})
+            return False
+        return True
+
+    def _miss(self) -> bool:
+        if random.random() < self.conf["miss_rate"]:
+            self._count("misses")
+            return True
+        return False
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == "/__stats":
+            with self.stats_lock:
+                return self._send(200, {"service": self.service, **self.stats})
+        self._count("requests")
+        if not self._delay_or_fail():
+            return
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        handler = getattr(self, f"get_{self.service}", None)
+        if handler is None:
+            return self._send(404, {"error": "not found"})
+        handler(url.path, params)
+
+    def do_POST(self):
+        self._count("requests")
+        if self.service != "census" or not self.path.startswith("/geocoder/locations/addressbatch"):
+            return self._send(404, {"error": "not found"})
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if not self._delay_or_fail():
+            return
+        self.post_census_batch(body)
+
+    # --- services -------------------------------------------------------
+
+    def get_osrm(self, path, params):
+        match = re.match(r"^/route/v1/driving/([-\d.]+),([-\d.]+);([-\d.]+),([-\d.]+)", unquote(path))
+        if not match:
+            return self._send(400, {"code": "InvalidUrl", "message": "Expected {lon},{lat};{lon},{lat}"})
+        if self._miss():
+            return self._send(400, {"code": "NoRoute", "message": "Impossible route between points"})
+        alternatives = params.get("alternatives", "0")
+        alternatives = 1 if alternatives == "true" else 0 if alternatives == "false" else int(alternatives)
+        self._send(200, fake_route(*(float(g) for g in match.groups()), alternatives=alternatives))
+
+    def _census_match(self, address):
+        lat, lon, city, state = locate(address)
+        return {
+            "matchedAddress": address.upper(),
+            "coordinates": {"x": round(lon, 6), "y": round(lat, 6)},
+            "tigerLine": {"tigerLineId": str(int(_unit(address, "tiger") * 1e9)), "side": "L"},
+            "addressComponents": {"city": city.upper(), "state": state},
+        }
+
+    def get_census(self, path, params):
+        if not path.startswith("/geocoder/locations/onelineaddress"):
+            return self._send(404, {"error": "not found"})
+        address = params.get("address", "")
+        matches = [] if self._miss() else [self._census_match(address)]
+        self._send(200, {"result": {"input": {"address": {"address": address}}, "addressMatches": matches}})
+
+    def post_census_batch(self, body):
+        message = email.parser.BytesParser().parsebytes(
+            b"Content-Type: " + self.headers.get("Content-Type", "").encode() + b"\r\n\r\n" + body
+        )
+        parts = message.get_payload() if message.is_multipart() else []
+        upload = next((p for p in parts if p.get_param("name", header="content-disposition") == "addressFile"), None)
+        if upload is None:
+            return self._send(400, b"addressFile is required", content_type="text/plain")
+        lines = []
+        for row in upload.get_payload(decode=True).decode("utf-8", "replace").splitlines():
+            fields = [f.strip().strip('"') for f in row.split(",")]
+            if not fields or not fields[0]:
+                continue
+            record_id, address = fields[0], ", ".join(f for f in fields[1:] if f)
+            if self._miss():
+                lines.append(f'"{record_id}","{address}","No_Match"')
+                continue
+            m = self._census_match(address)
+            lines.append(
+                f'"{record_id}","{address}","Match","Exact","{m["matchedAddress"]}",'
+                f'"{m["coordinates"]["x"]},{m["coordinates"]["y"]}","{m["tigerLine"]["tigerLineId"]}","L"'
+            )
+        self._send(200, ("\n".join(lines) + "\n").encode(), content_type="text/csv")
+
+    def get_google(self, path, params):
+        if not params.get("key"):
+            return self._send(200, {"status": "REQUEST_DENIED", "error_message": "The provided API key is invalid.", "results": []})
+        address = params.get("address", "")
+        if self._miss():
+            return self._send(200, {"status": "ZERO_RESULTS", "results": []})
+        lat, lon, _, _ = locate(address)
+        self._send(200, {"status": "OK", "results": [{
+            "formatted_address": f"{address}, USA",
+            "geometry": {"location": {"lat": round(lat, 7), "lng": round(lon, 7)}, "location_type": "APPROXIMATE"},
+            "place_id": f"fake_{int(_unit(address, 'place') * 1e12)}",
+            "types": ["locality", "political"],
+            "partial_match": False,
+        }]})
+
+    def get_nominatim(self, path, params):
+        query = params.get("q", "")
+        if self._miss():
+            return self._send(200, [])
+        lat, lon, city, state = locate(query)
+        self._send(200, [{
+            "lat": f"{lat:.7f}", "lon": f"{lon:.7f}",
+            "display_name": f"{city}, {state}, United States",
+            "class": "place", "type": "city", "importance": 0.7,
+        }])
+
+
+def serve(service: str, host: str, port: int, conf: dict):
+    handler = type(f"{service.title()}Handler", (FakeHandler,), {"service": service, "conf": conf, "stats": {}})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.request_queue_size = 512
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    server.serve_forever()
+
+
+def environment(host: str, ports: dict) -> dict:
+    env = {SERVICES[name][2]: f"http://{host}:{port}{SERVICES[name][3]}" for name, port in ports.items()}
+    if "google" in ports:
+        env["GOOGLE_MAPS_API_KEY"] = "loadtest"
+    # The stand-ins have no quotas; don't let the client-side limits cap the test
+    env.update({"CENSUS_RATE_LIMIT": "10000", "GOOGLE_MAPS_RATE_LIMIT": "10000", "OSM_RATE_LIMIT": "10000"})
+    return env
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--base_port", type=int, default=8090, help="osrm, census, google, nominatim get consecutive ports")
+    parser.add_argument("--services", type=str, default=",".join(SERVICES), help="Comma-separated services to start")
+    parser.add_argument("--env_file", type=str, default=None, help="Also write the app environment to this file")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for injected latency/errors")
+    for name, (_, default, _, _) in SERVICES.items():
+        parser.add_argument(f"--{name}", type=str, default=default, help=f"{name} spec (default: {default})")
+    args = parser.parse_args(argv)
+
+    names = [n.strip() for n in args.services.split(",") if n.strip()]
+    unknown = set(names) - set(SERVICES)
+    if unknown:
+        parser.error(f"Unknown services: {', '.join(sorted(unknown))}")
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    ports = {name: args.base_port + SERVICES[name][0] for name in names}
+    processes = []
+    for name in names:
+        conf = parse_spec(getattr(args, name))
+        proc = multiprocessing.Process(target=serve, args=(name, args.host, ports[name], conf), name=f"fake-{name}", daemon=True)
+        proc.start()
+        processes.append(proc)
+        print(f"{name:<10} http://{args.host}:{ports[name]}  {conf}")
+
+    env = environment(args.host, ports)
+    lines = [f"export {key}={value}" for key, value in env.items()]
+    print("\n" + "\n".join(lines))
+    if args.env_file:
+        with open(args.env_file, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+    try:
+        while all(p.is_alive() for p in processes):
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for p in processes:
+            p.terminate()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    sys.exit(main())
@@ -0,0 +1,249 @@
+"""
+Planner and corridor pipeline benchmark on synthetic data.
+
+    python -m benchmarks.planner_bench --stations 1000,10000,100000 --save main
+    python -m benchmarks.planner_bench --stations 1000,10000,100000 --compare main
+
+For each station-set size, plans every synthetic long route (see
+benchmarks.synthetic) against the in-memory station provider (StationGrid, the
+same path batch planning and plan_trips use) and times each stage separately:
+
+    decode      GeometryService.decode_polyline of the polyline6 geometry
+    route_index RouteIndex build (cumulative distance + segment grid)
+    corridor    StationGrid.near: stations in grid cells near the route
+    linref      locate_stations: exact corridor filter + position along the route
+    plan        FuelPlanner.solve (greedy loop)
+
+With --cluster_miles the synthetic stations are first grouped into co-located
+clusters (routing.services.station_clusters), as import_fuel_prices does, so
+`plan` includes cluster compaction and `avg_planned` shows the shrunk input.
+
+With --postgis the synthetic stations are also inserted into the configured
+database inside a rolled-back transaction, and FuelPlanner.fetch_candidates is
+timed as `corridor_postgis` (one ST_DWithin + ST_LineLocatePoint query).
+
+Results are written as JSON baselines under benchmarks/baselines/ (not committed)
+and compared stage by stage; a stage regresses when it is slower by more than
+--tolerance and by more than --noise_ms. The summed plan cost is compared too,
+so a change that alters plans is reported even if it is faster.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+import django
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+STAGES = ("decode", "route_index", "corridor", "linref", "plan")
+
+
+def _median_and_p90(values):
+    ordered = sorted(values)
+    return statistics.median(ordered), ordered[min(len(ordered) - 1, int(0.9 * len(ordered)))]
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_size(stations, routes, corridor_miles, repeat, postgis=False):
+    """Per-stage timings (ms) for one station set across all routes."""
+    from routing.services.corridor import RouteIndex, StationGrid, locate_stations
+    from routing.services.fuel_planner import FuelPlanner
+    from routing.services.geometry import GeometryService
+
+    t0 = time.perf_counter()
+    grid = StationGrid(stations)
+    build_ms = (time.perf_counter() - t0) * 1000
+
+    samples = {stage: [] for stage in STAGES}
+    near_counts, candidate_counts, planned_counts, plan_cost, unplanned = [], [], [], 0.0, 0
+    for route in routes:
+        for attempt in range(repeat):
+            t = time.perf_counter()
+            points = GeometryService.decode_polyline(route["geometry"])
+            t_decode = time.perf_counter()
+            index = RouteIndex(points, cell_deg=grid.cell_deg)
+            t_index = time.perf_counter()
+            near = grid.near(index, corridor_miles)
+            t_near = time.perf_counter()
+            planner = FuelPlanner(points, route["distance"], corridor_miles=corridor_miles)
+            total_miles = GeometryService.meters_to_miles(route["distance"])
+            candidates = [
+                planner.station_entry(row, fraction * total_miles)
+                for row, fraction, _ in locate_stations(index, near, corridor_miles)
+            ]
+            t_linref = time.perf_counter()
+            stops, stats = planner.solve(candidates)
+            t_plan = time.perf_counter()
+
+            for stage, start, end in (("decode", t, t_decode), ("route_index", t_decode, t_index),
+                                      ("corridor", t_index, t_near), ("linref", t_near, t_linref),
+                                      ("plan", t_linref, t_plan)):
+                samples[stage].append((end - start) * 1000)
+            if attempt == 0:
+                near_counts.append(len(near))
+                candidate_counts.append(len(candidates))
+                planned_counts.append(len(planner.compact_clusters(candidates)[0]))
+                if stops is None:
+                    unplanned += 1
+                else:
+                    plan_cost += stats["total_cost"]
+
+    result = {
+        "grid_build_ms": round(build_ms, 2),
+        "stages": {},
+        "avg_near_stations": round(statistics.mean(near_counts), 1),
+        "avg_candidates": round(statistics.mean(candidate_counts), 1),
+        "avg_planned": round(statistics.mean(planned_counts), 1),
+        "plan_cost_sum": round(plan_cost, 2),
+        "unplanned_routes": unplanned,
+    }
+    per_route_total = [sum(samples[stage][i] for stage in STAGES) for i in range(len(samples["plan"]))]
+    for stage, values in list(samples.items()) + [("total", per_route_total)]:
+        median, p90 = _median_and_p90(values)
+        result["stages"][stage] = {"median_ms": round(median, 3), "p90_ms": round(p90, 3)}
+
+    if postgis:
+        result["stages"]["corridor_postgis"] = bench_postgis(stations, routes, corridor_miles, repeat)
+    return result
+
+
+def bench_postgis(stations, routes, corridor_miles, repeat):
+    """fetch_candidates timings against the real database, rolled back afterwards."""
+    from django.contrib.gis.geos import Point
+    from django.db import transaction
+    from routing.models import FuelStation
+    from routing.services.fuel_planner import FuelPlanner
+    from routing.services.geometry import GeometryService
+
+    values = []
+    with transaction.atomic():
+        FuelStation.objects.all().delete()
+        FuelStation.objects.bulk_create((
+            FuelStation(
+                opis_id=s["opis_id"], name=s["name"], address=s["address"], city=s["city"], state=s["state"],
+                retail_price=s["retail_price"], location=Point(s["lon"], s["lat"], srid=4326),
+            ) for s in stations
+        ), batch_size=5000)
+        for route in routes:
+            planner = FuelPlanner(GeometryService.decode_polyline(route["geometry"]), route["distance"], corridor_miles)
+            for _ in range(repeat):
+                t = time.perf_counter()
+                planner.fetch_candidates()
+                values.append((time.perf_counter() - t) * 1000)
+        transaction.set_rollback(True)
+    median, p90 = _median_and_p90(values)
+    return {"median_ms": round(median, 3), "p90_ms": round(p90, 3)}
+
+
+def compare(current, baseline, tolerance, noise_ms):
+    """Print stage deltas; returns the number of regressions (timing or plan output)."""
+    regressions = 0
+    for size, result in current["results"].items():
+        base = baseline["results"].get(size)
+        if base is None:
+            print(f"{size} stations: no baseline")
+            continue
+        print(f"{size} stations:")
+        for stage, now in result["stages"].items():
+            before = base["stages"].get(stage)
+            if before is None:
+                continue
+            delta = now["median_ms"] - before["median_ms"]
+            ratio = now["median_ms"] / before["median_ms"] if before["median_ms"] else float("inf")
+            flag = ""
+            if ratio > 1 + tolerance and delta > noise_ms:
+                flag = "  REGRESSION"
+                regressions += stage != "total"
+            elif ratio < 1 - tolerance and -delta > noise_ms:
+                flag = "  faster"
+            print(f"  {stage:<17} {before['median_ms']:10.3f} -> {now['median_ms']:10.3f} ms  ({ratio:5.2f}x){flag}")
+        if result["plan_cost_sum"] != base["plan_cost_sum"] or result["unplanned_routes"] != base["unplanned_routes"]:
+            regressions += 1
+            print(f"  PLANS CHANGED: cost sum {base['plan_cost_sum']} -> {result['plan_cost_sum']}, "
+                  f"unplanned {base['unplanned_routes']} -> {result['unplanned_routes']}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stations", type=str, default="1000,10000,100000", help="Comma-separated station-set sizes")
+    parser.add_argument("--routes", type=int, default=0, help="Number of synthetic routes (0 = all corridors)")
+    parser.add_argument("--corridor_miles", type=float, default=10)
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per route")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--postgis", action="store_true", help="Also time the PostGIS candidate query")
+    parser.add_argument("--cluster_miles", type=float, default=0, help="Cluster co-located stations within this radius (0 = off)")
+    parser.add_argument("--save", type=str, default=None, help="Save results as baselines/<name>.json")
+    parser.add_argument("--compare", type=str, default=None, help="Compare against baselines/<name>.json")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Relative slowdown that counts as a regression")
+    parser.add_argument("--noise_ms", type=float, default=0.5, help="Absolute slowdown below which deltas are noise")
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+    django.setup()
+
+    from benchmarks.synthetic import CORRIDORS, synthetic_routes, synthetic_stations
+
+    names = list(CORRIDORS)[:args.routes] if args.routes else ()
+    routes = synthetic_routes(seed=args.seed, names=names)
+    print(f"{len(routes)} routes, {statistics.mean(len(r['points']) for r in routes):,.0f} vertices and "
+          f"{statistics.mean(r['distance'] for r in routes) / 1609.344:,.0f} miles on average; "
+          f"corridor {args.corridor_miles:g} mi, {args.repeat} runs each")
+
+    report = {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "seed": args.seed,
+            "routes": len(routes),
+            "corridor_miles": args.corridor_miles,
+            "repeat": args.repeat,
+            "cluster_miles": args.cluster_miles,
+        },
+        "results": {},
+    }
+    for size in (int(s) for s in args.stations.split(",") if s.strip()):
+        stations = synthetic_stations(size, seed=args.seed)
+        if args.cluster_miles:
+            from routing.services.station_clusters import cluster_points
+            clusters = cluster_points(((s["opis_id"], s["lat"], s["lon"]) for s in stations), args.cluster_miles)
+            for station in stations:
+                station["cluster_id"] = clusters.get(station["opis_id"])
+        result = bench_size(stations, routes, args.corridor_miles, args.repeat, postgis=args.postgis)
+        report["results"][str(size)] = result
+        stages = "  ".join(f"{stage} {v['median_ms']:.2f}" for stage, v in result["stages"].items())
+        print(f"{size:>7,} stations ({result['avg_candidates']:.0f} candidates, {result['avg_planned']:.0f} planned/route): "
+              f"{stages}  [median ms/route]")
+
+    status = 0
+    if args.compare:
+        with open(os.path.join(BASELINE_DIR, f"{args.compare}.json"), "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"\nvs baseline '{args.compare}' ({baseline['meta'].get('git_revision')}, {baseline['meta'].get('created_at')}):")
+        regressions = compare(report, baseline, args.tolerance, args.noise_ms)
+        print(f"{regressions} regression(s)")
+        status = 1 if regressions else 0
+    if args.save:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        path = os.path.join(BASELINE_DIR, f"{args.save}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved {path}")
+    return status
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    sys.exit(main())
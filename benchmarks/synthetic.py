@@ -0,0 +1,200 @@
+"""
+Deterministic synthetic nationwide station sets and long routes for benchmarks.
+
+Stations cluster at interchanges along a dozen interstate-like corridors (the
+way truck stops do), with a share scattered off-corridor. Prices follow a
+regional base (West Coast high, Gulf/Central low) plus per-interchange and
+per-station spread, with a few premium outliers. Routes follow the same
+corridors at OSRM-like vertex density (about one vertex per 0.3 miles), so
+corridor queries see realistic candidate counts.
+
+Same seed, same data: results are comparable across runs and machines.
+No Django imports.
+"""
+import math
+import random
+from typing import Dict, List, Sequence, Tuple
+
+import polyline
+
+from routing.services.corridor import MILES_PER_DEG_LAT, haversine_miles
+
+METERS_PER_MILE = 1609.344
+
+CITIES: Dict[str, Tuple[float, float, str]] = {
+    "Miami": (25.77, -80.19, "FL"), "Jacksonville": (30.33, -81.66, "FL"), "Tampa": (27.95, -82.46, "FL"),
+    "Savannah": (32.08, -81.09, "GA"), "Atlanta": (33.75, -84.39, "GA"), "Richmond": (37.54, -77.44, "VA"),
+    "Washington": (38.90, -77.04, "DC"), "Baltimore": (39.29, -76.61, "MD"), "Philadelphia": (39.95, -75.17, "PA"),
+    "New York": (40.71, -74.01, "NY"), "Boston": (42.36, -71.06, "MA"), "Buffalo": (42.89, -78.88, "NY"),
+    "Raleigh": (35.78, -78.64, "NC"), "Columbia": (34.00, -81.03, "SC"), "Knoxville": (35.96, -83.92, "TN"),
+    "Chattanooga": (35.05, -85.31, "TN"), "Nashville": (36.16, -86.78, "TN"), "Memphis": (35.15, -90.05, "TN"),
+    "Lexington": (38.04, -84.50, "KY"), "Louisville": (38.25, -85.76, "KY"), "Cincinnati": (39.10, -84.51, "OH"),
+    "Columbus": (39.96, -83.00, "OH"), "Cleveland": (41.50, -81.69, "OH"), "Detroit": (42.33, -83.05, "MI"),
+    "Indianapolis": (39.77, -86.16, "IN"), "Chicago": (41.88, -87.63, "IL"), "Madison": (43.07, -89.40, "WI"),
+    "St. Louis": (38.63, -90.20, "MO"), "Kansas City": (39.10, -94.58, "MO"), "Des Moines": (41.59, -93.62, "IA"),
+    "Minneapolis": (44.98, -93.27, "MN"), "Duluth": (46.79, -92.10, "MN"), "Sioux Falls": (43.54, -96.73, "SD"),
+    "Omaha": (41.26, -95.93, "NE"), "Wichita": (37.69, -97.34, "KS"), "Oklahoma City": (35.47, -97.52, "OK"),
+    "Dallas": (32.78, -96.80, "TX"), "Austin": (30.27, -97.74, "TX"), "San Antonio": (29.42, -98.49, "TX"),
+    "Laredo": (27.51, -99.51, "TX"), "Houston": (29.76, -95.37, "TX"), "Amarillo": (35.22, -101.83, "TX"),
+    "El Paso": (31.76, -106.49, "TX"), "Shreveport": (32.53, -93.75, "LA"), "New Orleans": (29.95, -90.07, "LA"),
+    "Jackson": (32.30, -90.18, "MS"), "Birmingham": (33.52, -86.80, "AL"), "Mobile": (30.69, -88.04, "AL"),
+    "Little Rock": (34.75, -92.29, "AR"), "Albuquerque": (35.08, -106.65, "NM"), "Denver": (39.74, -104.99, "CO"),
+    "Cheyenne": (41.14, -104.82, "WY"), "Billings": (45.78, -108.50, "MT"), "Salt Lake City": (40.76, -111.89, "UT"),
+    "Flagstaff": (35.20, -111.65, "AZ"), "Phoenix": (33.45, -112.07, "AZ"), "Tucson": (32.22, -110.97, "AZ"),
+    "Barstow": (34.90, -117.02, "CA"), "Los Angeles": (34.05, -118.24, "CA"), "San Diego": (32.72, -117.16, "CA"),
+    "San Francisco": (37.77, -122.42, "CA"), "Sacramento": (38.58, -121.49, "CA"), "Reno": (39.53, -119.81, "NV"),
+    "Portland": (45.52, -122.68, "OR"), "Seattle": (47.61, -122.33, "WA"), "Spokane": (47.66, -117.43, "WA"),
+}
+
+CORRIDORS: Dict[str, Sequence[str]] = {
+    "I-95": ("Miami", "Jacksonville", "Savannah", "Richmond", "Washington", "Philadelphia", "New York", "Boston"),
+    "I-10": ("Los Angeles", "Phoenix", "Tucson", "El Paso", "San Antonio", "Houston", "New Orleans", "Jacksonville"),
+    "I-40": ("Barstow", "Flagstaff", "Albuquerque", "Amarillo", "Oklahoma City", "Little Rock", "Memphis",
+             "Nashville", "Knoxville", "Raleigh"),
+    "I-80": ("San Francisco", "Sacramento", "Reno", "Salt Lake City", "Cheyenne", "Omaha", "Des Moines", "Chicago",
+             "Cleveland", "New York"),
+    "I-90": ("Seattle", "Spokane", "Billings", "Sioux Falls", "Madison", "Chicago", "Cleveland", "Buffalo", "Boston"),
+    "I-35": ("Laredo", "San Antonio", "Austin", "Dallas", "Oklahoma City", "Wichita", "Kansas City", "Des Moines",
+             "Minneapolis", "Duluth"),
+    "I-75": ("Miami", "Tampa", "Atlanta", "Chattanooga", "Knoxville", "Lexington", "Cincinnati", "Detroit"),
+    "I-5": ("San Diego", "Los Angeles", "Sacramento", "Portland", "Seattle"),
+    "I-70": ("Denver", "Kansas City", "St. Louis", "Indianapolis", "Columbus", "Baltimore"),
+    "I-20": ("Dallas", "Shreveport", "Jackson", "Birmingham", "Atlanta", "Columbia"),
+    "I-25": ("El Paso", "Albuquerque", "Denver", "Cheyenne"),
+    "I-65": ("Mobile", "Birmingham", "Nashville", "Louisville", "Indianapolis", "Chicago"),
+}
+
+# Contiguous US bounding box for off-corridor stations
+CONUS = (25.0, 49.0, -124.5, -67.0)
+OFF_CORRIDOR_SHARE = 0.1
+BRANDS = ("Pilot", "Love's", "TA", "Petro", "Flying J", "Sapp Bros", "Kwik Trip", "Sheetz", "Circle K", "Independent")
+
+# Wiggle so corridors are not straight lines between cities
+WIGGLE_AMPLITUDE_MILES = 2.0
+WIGGLE_WAVELENGTH_MILES = 40.0
+
+
+def regional_base_price(lat: float, lon: float) -> float:
+    if lon < -114:
+        return 4.55  # West Coast
+    if lon < -100:
+        return 3.70  # Mountain
+    if lat < 33.5 and lon < -85:
+        return 3.05  # Gulf
+    if lon < -85:
+        return 3.30  # Central
+    return 3.55  # East
+
+
+def corridor_path(name: str, spacing_miles: float = 0.3, seed: int = 0) -> List[Tuple[float, float]]:
+    """Dense (lat, lon) vertices along a corridor. Deterministic per (name, seed)."""
+    rnd = random.Random(f"{seed}:{name}")
+    phase = rnd.uniform(0, 2 * math.pi)
+    waypoints = [CITIES[c][:2] for c in CORRIDORS[name]]
+    points: List[Tuple[float, float]] = []
+    travelled = 0.0
+    legs = list(zip(waypoints, waypoints[1:]))
+    for leg, ((lat1, lon1), (lat2, lon2)) in enumerate(legs):
+        length = haversine_miles(lat1, lon1, lat2, lon2)
+        steps = max(1, int(length / spacing_miles))
+        # Unit normal of the leg, in degrees per mile
+        kx = MILES_PER_DEG_LAT * math.cos(math.radians((lat1 + lat2) / 2))
+        dx, dy = (lon2 - lon1) * kx, (lat2 - lat1) * MILES_PER_DEG_LAT
+        norm = math.hypot(dx, dy) or 1.0
+        nx, ny = -dy / norm, dx / norm
+        # Each leg ends where the next begins; only the last leg includes its end
+        for i in range(steps + (1 if leg == len(legs) - 1 else 0)):
+            t = i / steps
+            s = travelled + t * length
+            # Taper the wiggle to zero at the cities so legs join up
+            off = WIGGLE_AMPLITUDE_MILES * math.sin(math.pi * t) * math.sin(2 * math.pi * s / WIGGLE_WAVELENGTH_MILES + phase)
+            lat = lat1 + t * (lat2 - lat1) + off * ny / MILES_PER_DEG_LAT
+            lon = lon1 + t * (lon2 - lon1) + off * nx / kx
+            points.append((round(lat, 6), round(lon, 6)))
+        travelled += length
+    return points
+
+
+def path_length_miles(points: Sequence[Tuple[float, float]]) -> float:
+    return sum(haversine_miles(a[0], a[1], b[0], b[1]) for a, b in zip(points, points[1:]))
+
+
+def _nearest_city(lat: float, lon: float, names: Sequence[str]) -> Tuple[str, str]:
+    name = min(names, key=lambda c: (CITIES[c][0] - lat) ** 2 + (CITIES[c][1] - lon) ** 2)
+    return name, CITIES[name][2]
+
+
+def synthetic_stations(count: int, seed: int = 7) -> List[dict]:
+    """
+    `count` stations as planner snapshot rows (see routing.services.stations.snapshot_row):
+    opis_id, name, address, city, state, retail_price, lat, lon.
+    """
+    rnd = random.Random(seed)
+
+    # Interchanges every 8-30 miles along each corridor, with a popularity weight
+    interchanges = []
+    for name in CORRIDORS:
+        path = corridor_path(name, spacing_miles=1.0, seed=seed)
+        i = rnd.randint(0, 20)
+        while i < len(path):
+            lat, lon = path[i]
+            interchanges.append({
+                "lat": lat, "lon": lon, "road": name,
+                "weight": rnd.lognormvariate(0, 0.9),
+                "price_offset": rnd.gauss(0, 0.12),
+                "exit": i,
+                "towns": CORRIDORS[name],
+            })
+            i += rnd.randint(8, 30)
+    weights = [ic["weight"] for ic in interchanges]
+
+    stations = []
+    on_corridor = count - int(count * OFF_CORRIDOR_SHARE)
+    picks = rnd.choices(range(len(interchanges)), weights=weights, k=on_corridor)
+    for n in range(count):
+        if n < on_corridor:
+            ic = interchanges[picks[n]]
+            # Within a couple of miles of the interchange
+            lat = ic["lat"] + rnd.gauss(0, 0.6) / MILES_PER_DEG_LAT
+            lon = ic["lon"] + rnd.gauss(0, 0.6) / (MILES_PER_DEG_LAT * math.cos(math.radians(ic["lat"])))
+            city, state = _nearest_city(lat, lon, ic["towns"])
+            address = f"{ic['road']} EXIT {ic['exit']}"
+            offset = ic["price_offset"]
+        else:
+            lat, lon = rnd.uniform(CONUS[0], CONUS[1]), rnd.uniform(CONUS[2], CONUS[3])
+            city, state = _nearest_city(lat, lon, list(CITIES))
+            address = f"{rnd.randint(1, 99999)} Main St"
+            offset = rnd.gauss(0, 0.12)
+        price = regional_base_price(lat, lon) + offset + rnd.gauss(0, 0.08)
+        if rnd.random() < 0.05:
+            price += rnd.uniform(0.3, 0.8)  # premium outliers
+        stations.append({
+            "opis_id": n + 1,
+            "name": f"{rnd.choice(BRANDS)} #{n + 1}",
+            "address": address,
+            "city": city,
+            "state": state,
+            "retail_price": round(min(6.5, max(2.5, price)), 3),
+            "lat": round(lat, 6),
+            "lon": round(lon, 6),
+        })
+    return stations
+
+
+def synthetic_routes(seed: int = 7, spacing_miles: float = 0.3, names: Sequence[str] = ()) -> List[dict]:
+    """
+    One long route per corridor (alternately reversed), shaped like an OSRM
+    response: polyline6 geometry and distance in meters, plus the decoded points.
+    """
+    routes = []
+    for n, name in enumerate(names or CORRIDORS):
+        points = corridor_path(name, spacing_miles=spacing_miles, seed=seed)
+        if n % 2:
+            points = points[::-1]
+        routes.append({
+            "name": name if n % 2 == 0 else f"{name} (reverse)",
+            "points": points,
+            "geometry": polyline.encode(points, precision=6),
+            "distance": path_length_miles(points) * METERS_PER_MILE,
+        })
+    return routes
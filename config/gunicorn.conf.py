@@ -0,0 +1,28 @@
+"""
+Production server config for the ASGI app (config/asgi.py).
+
+    gunicorn config.asgi:application -c config/gunicorn.conf.py
+
+Each uvicorn worker runs one event loop, so a worker keeps serving other requests
+while the async route-plan view waits on geocoders or OSRM. Worker count tracks
+CPU cores rather than expected concurrency.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn_worker.UvicornWorker"
+
+# Geocoding budget + OSRM + planning fit well inside this; stuck workers get recycled
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 60))
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers periodically to bound memory growth
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 5000))
+max_requests_jitter = 500
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.environ.get("GUNICORN_LOG_LEVEL", "info")
@@ -2,9 +2,12 @@ from django.contrib import admin
 from django.urls import path, include
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 
+from routing.api.monitoring import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/v1/', include('routing.urls')),
+    path('metrics', metrics_view, name='metrics'),
     
     # Swagger
     path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
@@ -1,7 +1,19 @@
 from django.contrib import admin
-from .models import FuelStation
+from .models import FuelStation, GeocodeRun, PlanJob
 
 @admin.register(FuelStation)
 class FuelStationAdmin(admin.ModelAdmin):
     list_display = ('opis_id', 'name', 'city', 'state', 'retail_price')
     search_fields = ('name', 'city', 'opis_id')
+
+
+@admin.register(GeocodeRun)
+class GeocodeRunAdmin(admin.ModelAdmin):
+    list_display = ('run_id', 'strategy', 'shard_count', 'last_checkpoint_at', 'created_at')
+    search_fields = ('run_id',)
+
+
+@admin.register(PlanJob)
+class PlanJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'state', 'priority', 'status_code', 'worker', 'created_at', 'finished_at')
+    list_filter = ('state', 'kind')
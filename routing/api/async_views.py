@@ -0,0 +1,130 @@
+"""
+Async route-plan endpoint for ASGI deployments (config/asgi.py).
+
+Same request/response contract as RoutePlanView, but a request no longer pins a
+worker thread while it waits on providers:
+  - start and finish are geocoded concurrently,
+  - OSRM is called through the shared async HTTP client,
+  - DRF admission (auth, permissions, throttles, validation) and the planner's
+    DB work run on a bounded thread pool, so open connections stay bounded.
+
+Everything else is RoutePlanView's own code: the lane lookup, each geocode
+(GeocodingRouter, run on its own bounded pool), the planning step and the error
+responses, under the same deadline, stage bulkheads and trace recording. Only
+the planning step is profiled, since the request moves between threads.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+
+from .serializers import RoutePlanRequestSerializer
+from .views import RoutePlanView
+
+from routing.services import traces
+from routing.services.bulkhead import astage
+from routing.services.deadline import Deadline
+from routing.services.osrm_client import OSRMClient
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _pool(name: str, size: int) -> ThreadPoolExecutor:
+    with _pools_lock:
+        pool = _pools.get(name)
+        if pool is None:
+            pool = _pools[name] = ThreadPoolExecutor(max_workers=size, thread_name_prefix=f"async-{name}")
+        return pool
+
+
+def run_in_geocode_pool(func):
+    return sync_to_async(func, thread_sensitive=False, executor=_pool("geocode", settings.ASYNC_GEOCODE_THREADS))
+
+
+def run_in_db_pool(func):
+    """sync_to_async on the bounded DB pool, honouring CONN_MAX_AGE in those threads."""
+    def run(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(run, thread_sensitive=False, executor=_pool("db", settings.ASYNC_DB_THREADS))
+
+
+def _admit(api_view, drf_request):
+    """DRF auth, permission and throttle checks plus validation; raises APIException."""
+    api_view.initial(drf_request)
+    serializer = RoutePlanRequestSerializer(data=drf_request.data)
+    if not serializer.is_valid():
+        return None, Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    return serializer.validated_data, None
+
+
+class AsyncRoutePlanView(View):
+    http_method_names = ["post", "options"]
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # Token auth only, like DRF's APIView
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def post(self, request, *args, **kwargs):
+        # A DRF view instance supplies the policies (auth, throttles, renderers) and the planning
+        api_view = RoutePlanView(args=args, kwargs=kwargs)
+        api_view.defer_profiling = True
+        api_view.headers = api_view.default_response_headers
+        drf_request = api_view.initialize_request(request, *args, **kwargs)
+        api_view.request = drf_request
+
+        try:
+            data, response = await run_in_db_pool(_admit)(api_view, drf_request)
+            if response is None:
+                with traces.recording(drf_request.data) as trace:
+                    response = await self._route_plan(api_view, data)
+                    if trace is not None:
+                        await run_in_db_pool(trace.finish)(response.status_code, response.data)
+        except APIException as exc:
+            response = api_view.handle_exception(exc)
+
+        return api_view.finalize_response(drf_request, response, *args, **kwargs)
+
+    async def _route_plan(self, api_view, data):
+        """RoutePlanView.plan with the waits on geocoders and OSRM off the event loop's thread."""
+        deadline = Deadline(settings.ROUTE_PLAN_BUDGET_SECONDS)
+        try:
+            response = await run_in_db_pool(api_view.lane_response)(data)
+            if response is not None:
+                return response
+
+            # 1. Resolve both ends concurrently (one geocoding budget shared by both)
+            geocode_deadline = Deadline(min(settings.GEOCODE_BUDGET_SECONDS, deadline.remaining()))
+            start_coords, finish_coords = await asyncio.gather(
+                run_in_geocode_pool(api_view.geocode)(data['start'], geocode_deadline, deadline),
+                run_in_geocode_pool(api_view.geocode)(data['finish'], geocode_deadline, deadline),
+            )
+
+            # 2. Get Route
+            async with astage("route", deadline):
+                if data['alternatives']:
+                    routes = await OSRMClient.aget_routes(start_coords, finish_coords, data['alternatives'])
+                else:
+                    routes = [await OSRMClient.aget_route(start_coords, finish_coords)]
+            api_view.record_routes(data, routes)
+
+            # 3. Plan Fuel (decode + corridor query + solve)
+            return await run_in_db_pool(api_view.profiled)(
+                api_view.plan_routes, data, start_coords, finish_coords, routes, deadline
+            )
+
+        except Exception as e:
+            return api_view.error_response(e)
@@ -1,4 +1,5 @@
 import os
+from django.conf import settings
 from rest_framework import authentication, exceptions
 
 class SimpleUser:
@@ -8,6 +9,8 @@ class SimpleUser:
     is_authenticated = True
     is_active = True
     is_anonymous = False
+    # May request per-request profiles (X-Profile header)
+    can_profile = False
 
 class HeaderAPIKeyAuthentication(authentication.BaseAuthentication):
     def authenticate(self, request):
@@ -20,7 +23,11 @@ class HeaderAPIKeyAuthentication(authentication.BaseAuthentication):
         if not internal_key:
             raise exceptions.AuthenticationFailed('API Key authentication is enabled but not configured on the server.')
 
-        if api_key != internal_key:
+        # Profiling keys are valid API keys that also carry the profiling flag
+        can_profile = api_key in settings.PROFILING_API_KEYS
+        if api_key != internal_key and not can_profile:
             raise exceptions.AuthenticationFailed('Invalid API Key.')
 
-        return (SimpleUser(), None)
+        user = SimpleUser()
+        user.can_profile = can_profile
+        return (user, None)
@@ -0,0 +1,92 @@
+"""
+Plan job API: submit a route-plan or batch request, then poll (or long-poll) for
+its result. Jobs are executed by `run_plan_worker` exactly as the synchronous
+endpoints would handle the same request.
+"""
+from django.conf import settings
+from django.urls import reverse
+from rest_framework import serializers, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from drf_spectacular.utils import OpenApiParameter, extend_schema
+
+from routing.models import PlanJob
+from routing.services import bulkhead, plan_jobs
+from routing.services.deadline import Deadline
+
+from .serializers import RoutePlanBatchRequestSerializer, RoutePlanRequestSerializer
+from .views import RoutePlanBatchView, RoutePlanView
+
+# kind -> (request serializer, runner(validated_data, deadline) -> Response)
+JOB_KINDS = {
+    PlanJob.KIND_ROUTE_PLAN: (RoutePlanRequestSerializer, lambda data, deadline: RoutePlanView().plan(data, deadline)),
+    PlanJob.KIND_BATCH: (RoutePlanBatchRequestSerializer, lambda data, deadline: RoutePlanBatchView().plan(data['trips'], deadline)),
+}
+
+
+def execute_job(job: PlanJob):
+    """
+    Run a claimed job; returns (status_code, result body). It runs under its own
+    timeout rather than the interactive request budget, and outside the stage
+    bulkheads, which are sized for interactive traffic (the worker's --concurrency
+    bounds jobs).
+    """
+    serializer_class, run = JOB_KINDS[job.kind]
+    serializer = serializer_class(data=job.payload)
+    if not serializer.is_valid():
+        return status.HTTP_400_BAD_REQUEST, serializer.errors
+    with bulkhead.exempt():
+        response = run(serializer.validated_data, Deadline(job.timeout_s))
+    return response.status_code, response.data
+
+
+class PlanJobSubmitSerializer(serializers.Serializer):
+    kind = serializers.ChoiceField(choices=PlanJob.KINDS, default=PlanJob.KIND_ROUTE_PLAN)
+    request = serializers.DictField(help_text="Body for route-plan/ (kind=route_plan) or route-plan/batch/ (kind=batch)")
+    priority = serializers.IntegerField(default=5, min_value=0, max_value=9, help_text="Higher runs first")
+    timeout_s = serializers.IntegerField(required=False, min_value=1, max_value=settings.PLAN_JOB_MAX_TIMEOUT_S)
+
+
+class PlanJobSerializer(serializers.ModelSerializer):
+    job_id = serializers.UUIDField(source="id")
+    status = serializers.IntegerField(source="status_code", allow_null=True)
+
+    class Meta:
+        model = PlanJob
+        fields = ["job_id", "kind", "state", "priority", "created_at", "started_at", "finished_at", "expires_at", "status", "result"]
+
+
+class PlanJobListView(APIView):
+    @extend_schema(request=PlanJobSubmitSerializer, responses={202: PlanJobSerializer})
+    def post(self, request):
+        serializer = PlanJobSubmitSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+
+        # Reject malformed plans now rather than after they have queued
+        request_serializer = JOB_KINDS[data['kind']][0](data=data['request'])
+        if not request_serializer.is_valid():
+            return Response({"request": request_serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        job = plan_jobs.submit(data['kind'], data['request'], priority=data['priority'], timeout_s=data.get('timeout_s'))
+        location = reverse('plan-job-detail', kwargs={'job_id': job.id})
+        return Response(PlanJobSerializer(job).data, status=status.HTTP_202_ACCEPTED, headers={"Location": location})
+
+
+class PlanJobDetailView(APIView):
+    @extend_schema(
+        parameters=[OpenApiParameter("wait", float, description="Long-poll: seconds to wait for the job to finish (capped at PLAN_JOB_MAX_WAIT_S)")],
+        responses={200: PlanJobSerializer}
+    )
+    def get(self, request, job_id):
+        try:
+            wait = float(request.query_params.get('wait', 0))
+        except ValueError:
+            return Response({"error": "wait must be a number of seconds."}, status=status.HTTP_400_BAD_REQUEST)
+        wait = min(max(wait, 0.0), settings.PLAN_JOB_MAX_WAIT_S)
+
+        job = plan_jobs.wait_for(job_id, wait) if wait else plan_jobs.get_live(job_id)
+        if job is None:
+            return Response({"error": "Plan job not found or its result has expired."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(PlanJobSerializer(job).data)
@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.views.decorators.http import require_GET
+
+from routing.services.metrics import REGISTRY
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@require_GET
+def metrics_view(request):
+    """Prometheus scrape endpoint for this worker process's metrics registry."""
+    if not settings.METRICS_ENABLED:
+        raise Http404()
+    return HttpResponse(REGISTRY.render_prometheus(), content_type=PROMETHEUS_CONTENT_TYPE)
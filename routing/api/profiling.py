@@ -0,0 +1,95 @@
+"""
+Per-request profiling for API-key callers with the profiling flag
+(settings.PROFILING_API_KEYS).
+
+Send `X-Profile: sample` (stack sampling) or `X-Profile: cprofile` (deterministic),
+optionally with `X-Profile-Interval-Ms`. The response carries `X-Profile-Id` and
+`X-Profile-Url`; fetch the profile there as JSON, or as collapsed stacks with
+`?format=collapsed`. Requests that were not profiled get `X-Profile-Skipped`
+with the reason (only for authenticated callers).
+"""
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.permissions import BasePermission
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from routing.services import profiling
+
+from .renderers import CollapsedStacksRenderer
+
+
+class CanProfile(BasePermission):
+    message = "This API key is not allowed to use profiling."
+
+    def has_permission(self, request, view):
+        return bool(getattr(request.user, "can_profile", False))
+
+
+class ProfilingMixin:
+    """
+    Profiles one request between DRF's `initial` (so auth, permissions and
+    throttles have already passed) and `finalize_response`.
+    """
+    # The async view moves between threads, so it profiles only the block it runs
+    # through profiled() (its planning step) instead of the whole request
+    defer_profiling = False
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.profile, self.profile_skipped, self.profile_request = None, None, None
+        mode = request.META.get("HTTP_X_PROFILE")
+        if not mode:
+            return
+        if not getattr(request.user, "can_profile", False):
+            self.profile_skipped = profiling.SKIP_NOT_PERMITTED
+            return
+        try:
+            interval_ms = float(request.META.get("HTTP_X_PROFILE_INTERVAL_MS") or 0) or None
+        except ValueError:
+            interval_ms = None
+        if self.defer_profiling:
+            self.profile_request = (mode, interval_ms)
+            return
+        self.profile, self.profile_skipped = profiling.start_profile(mode, interval_ms)
+
+    def profiled(self, func, *args, **kwargs):
+        """Call func, profiling the calling thread meanwhile if profiling was deferred."""
+        pending, self.profile_request = getattr(self, "profile_request", None), None
+        if pending is None:
+            return func(*args, **kwargs)
+        self.profile, self.profile_skipped = profiling.start_profile(*pending)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            if self.profile is not None:
+                self.profile.stop()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        profile = getattr(self, "profile", None)
+        if profile is not None and response.streaming:
+            # The body is planned after this returns, so the profile would miss it
+            self.profile = None
+            profile.discard()
+            response["X-Profile-Skipped"] = profiling.SKIP_STREAMING
+        elif profile is not None:
+            self.profile = None
+            profile_id = profile.finish(method=request.method, path=request.path, status=response.status_code)
+            response["X-Profile-Id"] = profile_id
+            response["X-Profile-Url"] = reverse("profile-detail", kwargs={"profile_id": profile_id})
+        elif getattr(self, "profile_skipped", None):
+            response["X-Profile-Skipped"] = self.profile_skipped
+        return response
+
+
+class ProfileDetailView(APIView):
+    permission_classes = [CanProfile]
+    renderer_classes = [JSONRenderer, CollapsedStacksRenderer]
+
+    def get(self, request, profile_id):
+        profile = profiling.load_profile(profile_id)
+        if profile is None:
+            return Response({"error": "Profile not found or expired."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(profile)
@@ -0,0 +1,41 @@
+import json
+
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Newline-delimited JSON. Views stream one object per line themselves; this
+    renderer makes `Accept: application/x-ndjson` negotiable and renders
+    non-streamed responses (e.g. validation errors) as a single line.
+    """
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+    charset = "utf-8"
+
+    @staticmethod
+    def line(data) -> bytes:
+        return (json.dumps(data, cls=JSONEncoder, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return self.line(data)
+
+
+class CollapsedStacksRenderer(BaseRenderer):
+    """
+    A stored profile's collapsed stacks (`frame;frame count` per line), ready for
+    flamegraph.pl or speedscope. Error bodies fall back to their JSON text.
+    """
+    media_type = "text/plain"
+    format = "collapsed"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if isinstance(data, dict) and "collapsed" in data:
+            return data["collapsed"].encode("utf-8")
+        return json.dumps(data, cls=JSONEncoder, ensure_ascii=False).encode("utf-8")
@@ -1,15 +1,57 @@
+from django.conf import settings
 from rest_framework import serializers
+from routing.services.fuel_planner import FuelPlanner
 from routing.services.geometry import GeometryService
 
 class LatLonField(serializers.Serializer):
     lat = serializers.FloatField(min_value=-90, max_value=90)
     lon = serializers.FloatField(min_value=-180, max_value=180)
 
+class ScenarioSerializer(serializers.Serializer):
+    name = serializers.CharField(required=False, max_length=100)
+    mpg = serializers.FloatField(default=FuelPlanner.VEHICLE_MPG, min_value=1, max_value=50)
+    tank_gallons = serializers.FloatField(default=FuelPlanner.TANK_CAPACITY_GALLONS, min_value=1, max_value=500)
+    start_fuel_gallons = serializers.FloatField(required=False, allow_null=True, default=None, min_value=0,
+                                                help_text="Fuel on board at the start (default: full)")
+    reserve_gallons = serializers.FloatField(default=0, min_value=0, help_text="Never planned below this")
+    corridor_miles = serializers.IntegerField(required=False, min_value=1, max_value=50,
+                                              help_text="Default: the request's corridor_miles")
+
+    def validate(self, attrs):
+        if attrs['reserve_gallons'] >= attrs['tank_gallons']:
+            raise serializers.ValidationError("reserve_gallons must be less than tank_gallons.")
+        if attrs['start_fuel_gallons'] is not None and attrs['start_fuel_gallons'] > attrs['tank_gallons']:
+            raise serializers.ValidationError("start_fuel_gallons cannot exceed tank_gallons.")
+        return attrs
+
+
 class RoutePlanRequestSerializer(serializers.Serializer):
     # Support "start": "Miami, FL" OR "start": {"lat": 25, "lon": -80}
     start = serializers.JSONField(help_text="Address string OR {'lat': float, 'lon': float}")
     finish = serializers.JSONField(help_text="Address string OR {'lat': float, 'lon': float}")
     corridor_miles = serializers.IntegerField(default=10, min_value=1, max_value=50)
+    alternatives = serializers.IntegerField(
+        default=0, min_value=0, max_value=settings.ROUTE_PLAN_MAX_ALTERNATIVES,
+        help_text="Also plan up to this many OSRM alternative routes and return the cheapest"
+    )
+    corridor_mode = serializers.ChoiceField(
+        choices=["fixed", "adaptive"], default="fixed",
+        help_text="adaptive: start narrow and widen, up to corridor_miles, only where stations are sparse"
+    )
+    scenarios = serializers.ListField(
+        child=ScenarioSerializer(), required=False, min_length=1, max_length=settings.ROUTE_PLAN_MAX_SCENARIOS,
+        help_text="Plan the route for each vehicle profile / corridor width over one station lookup"
+    )
+
+    def validate(self, attrs):
+        if attrs['corridor_mode'] == "adaptive" and (attrs['alternatives'] or attrs.get('scenarios')):
+            raise serializers.ValidationError("corridor_mode 'adaptive' applies to single-route plans only.")
+        if attrs.get('scenarios'):
+            if attrs['alternatives']:
+                raise serializers.ValidationError("scenarios cannot be combined with alternatives.")
+            for scenario in attrs['scenarios']:
+                scenario.setdefault('corridor_miles', attrs['corridor_miles'])
+        return attrs
 
     def validate_coord_or_address(self, value):
         if isinstance(value, str):
@@ -37,6 +79,35 @@ class RoutePlanRequestSerializer(serializers.Serializer):
         return self.validate_coord_or_address(value)
 
 
+class BatchTripSerializer(RoutePlanRequestSerializer):
+    """One trip of a batch: a single-route plan over the fixed corridor."""
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        if attrs['alternatives'] or attrs.get('scenarios') or attrs['corridor_mode'] != "fixed":
+            raise serializers.ValidationError(
+                "Batch trips do not support alternatives, scenarios or corridor_mode 'adaptive'; "
+                "send those trips to route-plan/."
+            )
+        return attrs
+
+
+class RouteReplanRequestSerializer(serializers.Serializer):
+    plan_id = serializers.CharField(max_length=64, help_text="plan_id of an earlier route-plan response")
+    position = LatLonField(help_text="Current position of the vehicle, on or near the planned route")
+    fuel_gallons = serializers.FloatField(
+        min_value=0, max_value=FuelPlanner.TANK_CAPACITY_GALLONS,
+        help_text="Fuel currently in the tank"
+    )
+
+
+class CoLocatedStationSerializer(serializers.Serializer):
+    station_id = serializers.IntegerField()
+    name = serializers.CharField()
+    address = serializers.CharField()
+    price_per_gallon = serializers.FloatField()
+
+
 class RouteStepSerializer(serializers.Serializer):
     station_id = serializers.IntegerField()
     name = serializers.CharField()
@@ -49,6 +120,45 @@ class RouteStepSerializer(serializers.Serializer):
     miles_from_start = serializers.FloatField()
     gallons_purchased = serializers.FloatField()
     stop_cost = serializers.FloatField()
+    co_located = serializers.ListField(
+        child=CoLocatedStationSerializer(), required=False,
+        help_text="Pricier stations at the same interchange, cheapest first"
+    )
+
+
+class RouteAlternativeSerializer(serializers.Serializer):
+    index = serializers.IntegerField(help_text="OSRM route order (0 = fastest)")
+    selected = serializers.BooleanField()
+    route_distance_miles = serializers.FloatField()
+    duration_s = serializers.FloatField(allow_null=True)
+    total_cost = serializers.FloatField(allow_null=True)
+    total_gallons = serializers.FloatField(allow_null=True)
+    stops = serializers.IntegerField(allow_null=True)
+    error = serializers.CharField(required=False)
+
+
+class CorridorSegmentSerializer(serializers.Serializer):
+    from_miles = serializers.FloatField()
+    to_miles = serializers.FloatField()
+    width_miles = serializers.FloatField()
+    candidates = serializers.IntegerField()
+
+
+class CorridorReportSerializer(serializers.Serializer):
+    mode = serializers.CharField()
+    fetches = serializers.IntegerField(help_text="Corridor queries run")
+    candidates = serializers.IntegerField()
+    segments = serializers.ListField(child=CorridorSegmentSerializer())
+
+
+class ScenarioPlanSerializer(ScenarioSerializer):
+    index = serializers.IntegerField(help_text="Position of the scenario in the request")
+    selected = serializers.BooleanField(help_text="Whether this plan is the response body")
+    candidates = serializers.IntegerField(help_text="Stations within this scenario's corridor")
+    fuel_plan = serializers.ListField(child=RouteStepSerializer(), required=False)
+    total_cost = serializers.FloatField(required=False)
+    total_gallons = serializers.FloatField(required=False)
+    error = serializers.CharField(required=False)
 
 
 class RoutePlanResponseSerializer(serializers.Serializer):
@@ -60,3 +170,50 @@ class RoutePlanResponseSerializer(serializers.Serializer):
     fuel_plan = serializers.ListField(child=RouteStepSerializer())
     total_cost = serializers.FloatField()
     total_gallons = serializers.FloatField()
+    alternatives = serializers.ListField(
+        child=RouteAlternativeSerializer(), required=False,
+        help_text="Every planned route when alternatives were requested; the response body is the selected one"
+    )
+    scenarios = serializers.ListField(
+        child=ScenarioPlanSerializer(), required=False,
+        help_text="Every scenario's plan when scenarios were requested; the response body is the first feasible one"
+    )
+    corridor = CorridorReportSerializer(
+        required=False, help_text="Final width and candidate count per route segment (adaptive corridors)"
+    )
+    plan_id = serializers.CharField(
+        required=False, help_text="Pass to /route-plan/replan/ to replan this route mid-trip"
+    )
+
+
+class ReplanPositionSerializer(LatLonField):
+    miles_from_start = serializers.FloatField()
+    off_route_miles = serializers.FloatField()
+
+
+class RouteReplanResponseSerializer(RoutePlanResponseSerializer):
+    position = ReplanPositionSerializer(help_text="The reported position snapped onto the route")
+    remaining_miles = serializers.FloatField()
+
+
+class RoutePlanBatchRequestSerializer(serializers.Serializer):
+    # Each trip is validated on its own (BatchTripSerializer) so one bad
+    # trip is reported in its result slot instead of failing the batch.
+    trips = serializers.ListField(
+        child=serializers.DictField(),
+        min_length=1,
+        max_length=settings.ROUTE_PLAN_BATCH_MAX_TRIPS,
+        help_text="List of route-plan requests ({'start', 'finish', 'corridor_miles'})"
+    )
+
+
+class RoutePlanBatchResultSerializer(serializers.Serializer):
+    index = serializers.IntegerField(help_text="Position of the trip in the request")
+    status = serializers.IntegerField(help_text="HTTP status the single-trip endpoint would have returned")
+    result = RoutePlanResponseSerializer(required=False)
+    error = serializers.JSONField(required=False)
+
+
+class RoutePlanBatchResponseSerializer(serializers.Serializer):
+    results = serializers.ListField(child=RoutePlanBatchResultSerializer())
+    stats = serializers.DictField()
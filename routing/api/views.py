@@ -1,19 +1,126 @@
+import bisect
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.settings import api_settings
 from django.utils.decorators import method_decorator
 from django.views.decorators.cache import cache_page
 from drf_spectacular.utils import extend_schema
 
-from .serializers import RoutePlanRequestSerializer, RoutePlanResponseSerializer
+from .profiling import ProfilingMixin
+from .renderers import NDJSONRenderer
+from .serializers import (
+    RoutePlanRequestSerializer, RoutePlanResponseSerializer,
+    BatchTripSerializer, RoutePlanBatchRequestSerializer, RoutePlanBatchResponseSerializer,
+    RouteReplanRequestSerializer, RouteReplanResponseSerializer,
+)
 
+from routing.services import lanes, plan_context, timing, traces
+from routing.services.bulkhead import stage
+from routing.services.deadline import Deadline
 from routing.services.osrm_client import OSRMClient
+from routing.services.timing import timed
 from routing.services.geometry import GeometryService
-from routing.services.fuel_planner import FuelPlanner
+from routing.services.fuel_planner import FuelPlanner, Scenario
+from routing.services.batch_planner import BatchRoutePlanner
+
+def route_plan_payload(start_coords, finish_coords, route_data, stops, stats):
+    """Response body shared by the sync and async route-plan views."""
+    return {
+        "start": {"lat": start_coords[0], "lon": start_coords[1]},
+        "finish": {"lat": finish_coords[0], "lon": finish_coords[1]},
+        "route_distance_miles": GeometryService.meters_to_miles(route_data['distance']),
+        "bbox": [0,0,0,0], # TODO: Extract bbox from OSRM if available or calc
+        "polyline": route_data['geometry'],
+        "fuel_plan": stops,
+        "total_cost": stats['total_cost'],
+        "total_gallons": stats['total_gallons']
+    }
+
+
+def alternatives_payload(start_coords, finish_coords, routes, plans):
+    """
+    Response body for a trip planned over several routes: the cheapest feasible plan,
+    with every route summarized under "alternatives". None if no route is feasible.
+    """
+    feasible = [i for i, (stops, _) in enumerate(plans) if stops is not None]
+    if not feasible:
+        return None
+    best = min(feasible, key=lambda i: plans[i][1]['total_cost'])
+    body = route_plan_payload(start_coords, finish_coords, routes[best], *plans[best])
+    body["alternatives"] = []
+    for i, (route, (stops, stats)) in enumerate(zip(routes, plans)):
+        summary = {
+            "index": i,
+            "selected": i == best,
+            "route_distance_miles": GeometryService.meters_to_miles(route['distance']),
+            "duration_s": route.get('duration'),
+            "total_cost": stats['total_cost'] if stops is not None else None,
+            "total_gallons": stats['total_gallons'] if stops is not None else None,
+            "stops": len(stops) if stops is not None else None,
+        }
+        if stops is None:
+            summary["error"] = stats
+        body["alternatives"].append(summary)
+    return body
+
+
+def lane_payload(lane):
+    """Response body from a precomputed lane (repriced if stale), or None if its plan is infeasible."""
+    lane = lanes.serve(lane)
+    if lane["stops"] is None:
+        return None
+    body = route_plan_payload(lane["start"], lane["finish"], lane["route"], lane["stops"], lane["stats"])
+    body["plan_id"] = lane["plan_id"]
+    return body
+
+
+def corridor_report(planner):
+    """The "corridor" entry of an adaptive-corridor plan."""
+    return {
+        "mode": "adaptive",
+        "fetches": planner.corridor_fetches,
+        "candidates": len(planner.candidates),
+        "segments": planner.corridor_segments,
+    }
+
+
+def corridor_widths(planner):
+    """Per-segment widths of an adaptive plan, part of its plan_id."""
+    return [segment["width_miles"] for segment in planner.corridor_segments]
+
 
-class RoutePlanView(APIView):
+def scenarios_payload(start_coords, finish_coords, route_data, scenarios, results):
+    """
+    Response body for one route planned under several scenarios: every plan under
+    "scenarios", with the first feasible one as the body. None if none is feasible.
+    """
+    feasible = [i for i, (_, (stops, _)) in enumerate(results) if stops is not None]
+    if not feasible:
+        return None
+    body = route_plan_payload(start_coords, finish_coords, route_data, *results[feasible[0]][1])
+    body["scenarios"] = []
+    for i, (scenario, (candidates, (stops, stats))) in enumerate(zip(scenarios, results)):
+        entry = {**scenario, "index": i, "selected": i == feasible[0], "candidates": candidates}
+        if stops is None:
+            entry["error"] = stats
+        else:
+            entry.update(fuel_plan=stops, total_cost=stats['total_cost'], total_gallons=stats['total_gallons'])
+        body["scenarios"].append(entry)
+    return body
+
+
+def scenario_tuples(scenarios):
+    """Validated scenario dicts as FuelPlanner Scenarios."""
+    return [Scenario(**{field: s[field] for field in Scenario._fields}) for s in scenarios]
+
+
+class RoutePlanView(ProfilingMixin, APIView):
     
-    def resolve_location(self, value):
+    def resolve_location(self, value, deadline=None):
         """Resolves string address to (lat, lon) or returns tuple if already coord."""
         if isinstance(value, tuple):
             return value
@@ -22,16 +129,30 @@ class RoutePlanView(APIView):
         from routing.services.geocoding import GeocodingRouter
         router = GeocodingRouter(provider_priority="smart")
         
-        loc, debug = router.geocode_string(value)
+        loc, debug = router.geocode_string(value, deadline=deadline)
         if not loc:
              # Provide a helpful error message if possible
              err = f"Could not geocode location: {value}."
-             if not router.is_google_viable():
+             if debug.get("reason") == "deadline_exceeded":
+                 err += " (Geocoding providers did not answer within the latency budget.)"
+             elif not router.is_google_viable():
                  err += " (Google Maps API Key not configured, and Census API failed for this input)."
              raise ValueError(err)
              
         return (loc.y, loc.x) # (lat, lon)
 
+    def route(self, start_coords, finish_coords):
+        """OSRM route between (lat, lon) pairs; replay serves it from a trace instead."""
+        return OSRMClient.get_route(start_coords, finish_coords)
+
+    def routes(self, start_coords, finish_coords, alternatives):
+        """The OSRM route plus up to `alternatives` alternatives."""
+        return OSRMClient.get_routes(start_coords, finish_coords, alternatives)
+
+    def lane(self, data):
+        """The precomputed lane for this request, if any (see lanes)."""
+        return lanes.lookup(data)
+
     @extend_schema(
         request=RoutePlanRequestSerializer,
         responses={200: RoutePlanResponseSerializer}
@@ -41,12 +162,25 @@ class RoutePlanView(APIView):
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-        data = serializer.validated_data
-        
+        with traces.recording(request.data) as trace:
+            response = self.plan(serializer.validated_data)
+            if trace is not None:
+                trace.finish(response.status_code, response.data)
+        return response
+
+    def plan(self, data, deadline=None):
+        """Plan one validated trip; also used to run queued plan jobs (under the job's deadline)."""
+        # Request budget for stage admission; geocoding has its own tighter budget
+        deadline = deadline or Deadline(settings.ROUTE_PLAN_BUDGET_SECONDS)
         try:
-            # 1. Resolve Locations
-            start_coords = self.resolve_location(data['start'])
-            finish_coords = self.resolve_location(data['finish'])
+            response = self.lane_response(data)
+            if response is not None:
+                return response
+
+            # 1. Resolve Locations (one geocoding budget shared by both ends)
+            geocode_deadline = Deadline(min(settings.GEOCODE_BUDGET_SECONDS, deadline.remaining()))
+            start_coords = self.geocode(data['start'], geocode_deadline, deadline)
+            finish_coords = self.geocode(data['finish'], geocode_deadline, deadline)
             
             # Validate within USA (Basic Lat/Lon Box for sanity)
             # USA roughly: Lat 24-50, Lon -125 to -66
@@ -58,46 +192,266 @@ class RoutePlanView(APIView):
                      pass 
 
             # 2. Get Route
-            route_data = OSRMClient.get_route(start_coords, finish_coords)
-            
-            # route_data has 'geometry' (polyline), 'distance' (meters), 'legs' etc.
-            polyline_str = route_data['geometry']
-            distance_meters = route_data['distance']
-            
-            # Decode for algorithm
-            route_points = GeometryService.decode_polyline(polyline_str)
-            
+            with stage("route", deadline):
+                if data.get('alternatives'):
+                    routes = self.routes(start_coords, finish_coords, data['alternatives'])
+                else:
+                    routes = [self.route(start_coords, finish_coords)]
+            self.record_routes(data, routes)
+
             # 3. Plan Fuel
-            planner = FuelPlanner(
-                route_points_lat_lon=route_points,
-                total_distance_meters=distance_meters,
-                corridor_miles=data['corridor_miles']
+            return self.plan_routes(data, start_coords, finish_coords, routes, deadline)
+
+        except Exception as e:
+            return self.error_response(e)
+
+    @staticmethod
+    def error_response(e):
+        """Response for an exception raised while planning a trip."""
+        if isinstance(e, ValueError):
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if isinstance(e, ConnectionError):
+            # Upstream routing unavailable (including open circuit breakers) or load shed: fail fast
+            retry_after = getattr(e, "retry_after", 30)
+            return Response({"error": str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={"Retry-After": str(retry_after)})
+        return Response({"error": "Internal Server Error", "details": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    def lane_response(self, data):
+        """The answer from a precomputed lane (see lanes), or None to plan the trip."""
+        lane = self.lane(data)
+        if lane is None:
+            return None
+        with timed("lane"):
+            body = lane_payload(lane)
+        if body is None:
+            return None
+        traces.record_geocode(data['start'], (body["start"]["lat"], body["start"]["lon"]))
+        traces.record_geocode(data['finish'], (body["finish"]["lat"], body["finish"]["lon"]))
+        traces.record_route(lane["route"])
+        return Response(body)
+
+    def geocode(self, value, geocode_deadline, deadline):
+        """Resolve one end of the trip inside the geocode bulkhead."""
+        with stage("geocode", deadline):
+            coords = self.resolve_location(value, geocode_deadline)
+        traces.record_geocode(value, coords)
+        return coords
+
+    @staticmethod
+    def record_routes(data, routes):
+        if data.get('alternatives'):
+            traces.record_routes(routes)
+        else:
+            traces.record_route(routes[0])
+
+    def plan_routes(self, data, start_coords, finish_coords, routes, deadline):
+        """
+        Decode, corridor query and solve for the fetched route(s), as a Response.
+        The async view runs this same step on its DB pool.
+        """
+        if data.get('alternatives'):
+            return self.plan_alternatives(data, start_coords, finish_coords, routes, deadline)
+
+        # route_data has 'geometry' (polyline), 'distance' (meters), 'legs' etc.
+        route_data = routes[0]
+        polyline_str = route_data['geometry']
+        distance_meters = route_data['distance']
+        
+        # Decode for algorithm
+        with timed("decode"):
+            route_points = GeometryService.decode_polyline(polyline_str)
+
+        if data.get('scenarios'):
+            return self.plan_scenarios(data, start_coords, finish_coords, route_data, route_points, deadline)
+        
+        planner = FuelPlanner(
+            route_points_lat_lon=route_points,
+            total_distance_meters=distance_meters,
+            corridor_miles=data['corridor_miles'],
+            deadline=deadline
+        )
+        
+        adaptive = data.get('corridor_mode') == "adaptive"
+        stops, stats = planner.plan_adaptive() if adaptive else planner.plan_fuel_stops()
+        
+        if stops is None:
+            # Error in planning
+            return Response(
+                {"error": stats, "detail": "Try increasing corridor_miles or check route feasibility."},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY
             )
-            
-            stops, stats = planner.plan_fuel_stops()
-            
+        
+        # 4. Construct Response
+        body = route_plan_payload(start_coords, finish_coords, route_data, stops, stats)
+        if adaptive:
+            body["corridor"] = corridor_report(planner)
+        if planner.candidates is not None:
+            body["plan_id"] = plan_context.save(route_data, data['corridor_miles'], planner.candidates, route_points,
+                                                corridor_widths(planner) if adaptive else None)
+        return Response(body)
+
+    def plan_alternatives(self, data, start_coords, finish_coords, routes, deadline):
+        """Plan every OSRM alternative against one shared corridor fetch; respond with the cheapest."""
+        with timed("decode"):
+            decoded = [(GeometryService.decode_polyline(r['geometry']), r['distance']) for r in routes]
+        planners, plans = FuelPlanner.plan_alternatives(decoded, corridor_miles=data['corridor_miles'], deadline=deadline)
+
+        body = alternatives_payload(start_coords, finish_coords, routes, plans)
+        if body is None:
+            return Response(
+                {"error": plans[0][1], "detail": "Try increasing corridor_miles or check route feasibility."},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY
+            )
+        best = next(a["index"] for a in body["alternatives"] if a["selected"])
+        body["plan_id"] = plan_context.save(routes[best], data['corridor_miles'], planners[best].candidates, planners[best].route_points)
+        return Response(body)
+
+    def plan_scenarios(self, data, start_coords, finish_coords, route_data, route_points, deadline):
+        """Plan the route once per requested scenario over one corridor fetch at the widest width."""
+        results = FuelPlanner.plan_scenarios(
+            route_points, route_data['distance'], scenario_tuples(data['scenarios']), deadline=deadline
+        )
+        body = scenarios_payload(start_coords, finish_coords, route_data, data['scenarios'], results)
+        if body is None:
+            return Response(
+                {"error": results[0][1][1], "detail": "No scenario is feasible; try wider corridors or more fuel."},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY
+            )
+        return Response(body)
+
+
+class RouteReplanView(ProfilingMixin, APIView):
+    """
+    Replan a trip mid-route from the vehicle's position and fuel level. The route
+    and candidate stations come from the plan context saved with the original plan
+    (its plan_id), so no geocoding, routing or corridor query is repeated.
+    """
+
+    @extend_schema(
+        request=RouteReplanRequestSerializer,
+        responses={200: RouteReplanResponseSerializer}
+    )
+    def post(self, request):
+        serializer = RouteReplanRequestSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+        deadline = Deadline(settings.ROUTE_PLAN_BUDGET_SECONDS)
+        try:
+            with timed("context"):
+                context = plan_context.load(data['plan_id'])
+            if context is None:
+                return Response(
+                    {"error": "Unknown or expired plan_id.", "detail": "Plan the trip again with /route-plan/."},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+
+            lat, lon = data['position']['lat'], data['position']['lon']
+            with timed("snap"):
+                snapped = context.snap(lat, lon, settings.REPLAN_MAX_OFF_ROUTE_MILES)
+            if snapped is None:
+                return Response(
+                    {"error": f"Position is more than {settings.REPLAN_MAX_OFF_ROUTE_MILES} miles off the planned route.",
+                     "detail": "Plan the trip again with /route-plan/."},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                )
+            position_miles, off_route_miles = snapped
+
+            # Candidates are ordered by 'dist'; only those ahead of the truck matter
+            ahead = bisect.bisect_right([c['dist'] for c in context.candidates], position_miles)
+            planner = FuelPlanner(context.points, context.distance_meters, context.corridor_miles, deadline=deadline)
+            with stage("plan", deadline):
+                stops, stats = planner.solve(
+                    context.candidates[ahead:], start_miles=position_miles, start_fuel_gallons=data['fuel_gallons']
+                )
             if stops is None:
-                # Error in planning
                 return Response(
-                    {"error": stats, "detail": "Try increasing corridor_miles or check route feasibility."},
+                    {"error": stats, "detail": "Not enough fuel to reach a station on the planned route."},
                     status=status.HTTP_422_UNPROCESSABLE_ENTITY
                 )
-            
-            # 4. Construct Response
-            response_data = {
-                "start": {"lat": start_coords[0], "lon": start_coords[1]},
-                "finish": {"lat": finish_coords[0], "lon": finish_coords[1]},
-                "route_distance_miles": GeometryService.meters_to_miles(distance_meters),
-                "bbox": [0,0,0,0], # TODO: Extract bbox from OSRM if available or calc
-                "polyline": polyline_str,
-                "fuel_plan": stops,
-                "total_cost": stats['total_cost'],
-                "total_gallons": stats['total_gallons']
-            }
-            
-            return Response(response_data)
 
-        except ValueError as e:
-            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            route_data = {"geometry": context.geometry, "distance": context.distance_meters}
+            body = route_plan_payload((lat, lon), context.points[-1], route_data, stops, stats)
+            body.update(
+                plan_id=context.plan_id,
+                position={"lat": lat, "lon": lon, "miles_from_start": round(position_miles, 1),
+                          "off_route_miles": round(off_route_miles, 2)},
+                remaining_miles=round(context.total_miles - position_miles, 1),
+            )
+            return Response(body)
+
+        except ConnectionError as e:
+            retry_after = getattr(e, "retry_after", 30)
+            return Response({"error": str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={"Retry-After": str(retry_after)})
         except Exception as e:
             return Response({"error": "Internal Server Error", "details": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class RoutePlanBatchView(ProfilingMixin, APIView):
+    """
+    Plan many trips in one call. Geocoding and routing are shared across trips and
+    run in parallel; results come back in input order with per-trip status.
+
+    With `Accept: application/x-ndjson` the results are streamed one line per trip
+    as each window of trips is planned, followed by a final `{"stats": ...}` line.
+    """
+    renderer_classes = list(api_settings.DEFAULT_RENDERER_CLASSES) + [NDJSONRenderer]
+
+    @extend_schema(
+        request=RoutePlanBatchRequestSerializer,
+        responses={200: RoutePlanBatchResponseSerializer}
+    )
+    def post(self, request):
+        serializer = RoutePlanBatchRequestSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        trips = serializer.validated_data['trips']
+        if isinstance(request.accepted_renderer, NDJSONRenderer):
+            planner = BatchRoutePlanner(resolve=RoutePlanView().resolve_location)
+            results = self.iter_results(trips, planner, window=settings.ROUTE_PLAN_STREAM_WINDOW)
+            return StreamingHttpResponse(self.ndjson_lines(results, planner), content_type=NDJSONRenderer.media_type)
+        return self.plan(trips)
+
+    def plan(self, trips, deadline=None):
+        """Plan validated trips into one JSON response; also used to run queued plan jobs (until their deadline)."""
+        planner = BatchRoutePlanner(resolve=RoutePlanView().resolve_location, deadline=deadline)
+        results = list(self.iter_results(trips, planner))
+        return Response({"results": results, "stats": planner.stats})
+
+    @staticmethod
+    def iter_results(trips, planner, window=None):
+        """Result entries in input order; invalid trips are reported without planning."""
+        invalid, valid_trips = {}, []
+        for i, trip in enumerate(trips):
+            trip_serializer = BatchTripSerializer(data=trip)
+            if trip_serializer.is_valid():
+                valid_trips.append(trip_serializer.validated_data)
+            else:
+                invalid[i] = {"index": i, "status": status.HTTP_400_BAD_REQUEST, "error": trip_serializer.errors}
+
+        planned = planner.iter_plan(valid_trips, window)
+        for i in range(len(trips)):
+            if i in invalid:
+                yield invalid[i]
+                continue
+            _, outcome = next(planned)
+            if outcome.status == status.HTTP_200_OK:
+                body = route_plan_payload(outcome.start, outcome.finish, outcome.route, outcome.stops, outcome.stats)
+                yield {"index": i, "status": outcome.status, "result": body}
+            else:
+                yield {"index": i, "status": outcome.status, "error": outcome.error}
+
+    @staticmethod
+    def ndjson_lines(results, planner):
+        # Planning runs as the body is sent, after ServerTimingMiddleware is done with
+        # the response, so the stage timings go in the closing stats line instead
+        timings = timing.StageTimings()
+        while True:
+            with timing.collecting(timings):
+                entry = next(results, None)
+            if entry is None:
+                break
+            yield NDJSONRenderer.line(entry)
+        stages_ms = {t.stage: round(t.seconds * 1000, 1) for t in timings.items() if t.calls}
+        yield NDJSONRenderer.line({"stats": {**planner.stats, "stages_ms": stages_ms}})
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 class RoutingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'routing'
+
+    def ready(self):
+        from routing.services import query_accounting
+        query_accounting.enable()
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from routing.models import FuelStation
+from routing.services.station_feed import export_stations_parquet
+
+
+class Command(BaseCommand):
+    help = (
+        "Export the FuelStation table (with locations and geocode_source) to Parquet. "
+        "Re-import with: import_fuel_prices --format parquet --path <file> to seed an environment without geocoding."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--out", type=str, required=True, help="Output .parquet path")
+        parser.add_argument("--located_only", action="store_true", help="Only export stations that have a location")
+        parser.add_argument("--chunk_size", type=int, default=50000, help="Rows per Parquet row group")
+
+    def handle(self, *args, **options):
+        qs = FuelStation.objects.all()
+        if options["located_only"]:
+            qs = qs.filter(location__isnull=False)
+
+        t0 = time.perf_counter()
+        try:
+            written = export_stations_parquet(options["out"], qs, chunk_size=options["chunk_size"])
+        except ImportError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Exported {written} stations to {options['out']} in {time.perf_counter() - t0:.2f}s"
+        ))
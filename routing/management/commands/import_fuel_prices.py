@@ -1,13 +1,27 @@
-import csv
 import time
 import logging
 import concurrent.futures
 import os
-from django.core.management.base import BaseCommand
+from django.contrib.gis.geos import Point
+from django.core.management.base import BaseCommand, CommandError
 from routing.models import FuelStation
+from routing.services.geocode_journal import (
+    GeocodeJournal,
+    count_cached_lookups,
+    count_provider_calls,
+    parse_shard,
+    shard_for_key,
+)
+from routing.services import station_feed
+from routing.services.station_clusters import rebuild_station_clusters
+from routing.services.address_parser import parse_stations_batch
+from routing.services.metrics import GEOCODE_PROVIDER_SECONDS
+from routing.services.rate_limiter import BULK
+from routing.services import timing
+from routing.services.timing import timed
+from routing.services.station_feed import iter_feed_batches
 from routing.services.geocoding import (
     GeocodingRouter, 
-    normalize_address_components, 
     clean_piece
 )
 
@@ -20,20 +34,118 @@ class Command(BaseCommand):
     help = "Import fuel prices and geocode with smart multi-provider routing (Census + Google Maps). Requires GOOGLE_MAPS_API_KEY."
 
     def add_arguments(self, parser):
-        parser.add_argument("--csv", type=str, default="/app/data/fuel-prices-for-be-assessment.csv", help="Path to CSV file")
-        parser.add_argument("--sleep", type=float, default=0.1, help="Sleep seconds between requests")
+        parser.add_argument("--csv", "--path", dest="csv", type=str, default="/app/data/fuel-prices-for-be-assessment.csv", help="Path to the price feed file")
+        parser.add_argument("--format", type=str, default="csv", choices=station_feed.FORMATS, help="Feed format (parquet/arrow require pyarrow)")
+        parser.add_argument("--sleep", type=float, default=0.0, help="Extra sleep seconds between requests (provider quotas are enforced by OUTBOUND_RATE_LIMITS)")
         parser.add_argument("--max", type=int, default=0, help="Max stations to geocode (0 = no limit)")
         parser.add_argument("--concurrent", type=int, default=5, help="Number of worker threads")
         parser.add_argument("--skip_attempted", action="store_true", help="Skip stations that already have geocode_source set")
         parser.add_argument("--provider", type=str, default="smart", choices=["smart", "google_then_census"], help="Provider priority strategy")
+        parser.add_argument("--run_id", type=str, default=None, help="Geocode run journal id. Reusing an id resumes that run.")
+        parser.add_argument("--shard", type=str, default="0/1", help="Process only shard K of N of the run (K/N)")
+        parser.add_argument("--checkpoint_every", type=int, default=50, help="Stations per journal checkpoint")
+        parser.add_argument("--parse_workers", type=int, default=0, help="Processes for address normalization (0/1 = in-process)")
+        parser.add_argument("--geocode_only", action="store_true", help="Skip CSV load; only geocode (use for shards after a single load)")
+        parser.add_argument("--skip_clusters", action="store_true", help="Do not rebuild co-located station clusters (e.g. all but the last shard)")
+
+    def load_stations(self, path, fmt="csv", parse_workers=0):
+        """
+        Stream the feed in column batches and bulk insert stations not yet in the DB.
+        Rows carrying Latitude/Longitude (see `export_fuel_stations`) are inserted
+        already located, so they skip geocoding. Returns False on read errors.
+        """
+        self.stdout.write(f"Reading {fmt} feed from {path}...")
+        existing_ids = set(FuelStation.objects.values_list("opis_id", flat=True))
+        seen_ids = set()
+        inserted = 0
+        seeded = 0
+
+        try:
+            for batch in iter_feed_batches(path, fmt):
+                n = len(batch[station_feed.OPIS_ID])
+                empty = [None] * n
+                rows = []
+                for i, raw_id in enumerate(batch[station_feed.OPIS_ID]):
+                    opis_id = int(raw_id)
+                    if opis_id in seen_ids:
+                        continue
+                    seen_ids.add(opis_id)
+                    if opis_id not in existing_ids:
+                        rows.append(i)
+
+                if not rows:
+                    continue
+
+                addresses = batch.get(station_feed.ADDRESS, empty)
+                cities = batch.get(station_feed.CITY, empty)
+                states = batch.get(station_feed.STATE, empty)
+                names = batch.get(station_feed.NAME, empty)
+                racks = batch.get(station_feed.RACK_ID, empty)
+                prices = batch.get(station_feed.RETAIL_PRICE, empty)
+                lats = batch.get(station_feed.LATITUDE, empty)
+                lons = batch.get(station_feed.LONGITUDE, empty)
+                sources = batch.get(station_feed.GEOCODE_SOURCE, empty)
+
+                # Normalize + classify every distinct address once, across a process pool
+                parsed = parse_stations_batch(
+                    ((addresses[i], cities[i], states[i]) for i in rows),
+                    workers=parse_workers,
+                )
+
+                to_insert = []
+                for i, p in zip(rows, parsed):
+                    station = FuelStation(
+                        opis_id=int(batch[station_feed.OPIS_ID][i]),
+                        name=clean_piece(names[i]),
+                        address=p.address,
+                        city=p.city,
+                        state=p.state,
+                        rack_id=int(racks[i]) if racks[i] not in (None, "") else None,
+                        retail_price=str(prices[i]) if prices[i] is not None else None,
+                    )
+                    if lats[i] not in (None, "") and lons[i] not in (None, ""):
+                        station.location = Point(float(lons[i]), float(lats[i]), srid=4326)
+                        station.geocode_source = sources[i] or "seeded"
+                        seeded += 1
+                    elif sources[i]:
+                        station.geocode_source = sources[i]
+                    to_insert.append(station)
+
+                FuelStation.objects.bulk_create(to_insert, batch_size=2000)
+                inserted += len(to_insert)
+        except Exception as e:
+            self.stderr.write(f"Error reading {fmt} feed: {e}")
+            return False
+
+        if inserted:
+            self.stdout.write(f"Inserted {inserted} new records ({seeded} with seeded locations).")
+        else:
+            self.stdout.write("No new records to insert.")
+        return True
 
     def handle(self, *args, **options):
+        # Per-phase wall time, query counts and DB time, printed however the run ends
+        with timing.recording() as timings:
+            try:
+                if not self.run(**options):
+                    self.stdout.write(self.style.WARNING("Import failed; station clusters were not rebuilt."))
+                elif not options["skip_clusters"]:
+                    with timed("import_clusters"):
+                        clusters, clustered = rebuild_station_clusters()
+                    self.stdout.write(f"Station clusters: {clustered} co-located stations in {clusters} clusters.")
+            finally:
+                if timings.items():
+                    self.stdout.write("Phases:\n" + timings.summary())
+
+    def run(self, **options):
+        """Load and geocode stations; False if the feed could not be loaded."""
         csv_path = options["csv"]
         sleep_s = options["sleep"]
         max_n = options["max"]
         max_workers = options["concurrent"]
         skip_attempted = options["skip_attempted"]
         provider_strategy = options["provider"]
+        checkpoint_every = max(1, options["checkpoint_every"])
         
         # Security Verification & User Notification
         api_key = os.environ.get("GOOGLE_MAPS_API_KEY")
@@ -47,84 +159,73 @@ class Command(BaseCommand):
              self.stdout.write(self.style.SUCCESS("✓ GOOGLE_MAPS_API_KEY found. Google Maps Platform enabled."))
 
         # Initialize Router
-        router = GeocodingRouter(provider_priority=provider_strategy)
+        router = GeocodingRouter(provider_priority=provider_strategy, traffic=BULK)
 
-        self.stdout.write(f"Reading CSV from {csv_path}...")
-        stations_to_create = []
-        seen_ids = set()
+        if not options["geocode_only"]:
+            with timed("import_load"):
+                if not self.load_stations(csv_path, options["format"], options["parse_workers"]):
+                    return False
 
-        # 1) Parse CSV
+        # 3) Geocode
         try:
-            with open(csv_path, "r", encoding="utf-8") as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    opis_id = int(row["OPIS Truckstop ID"])
-                    if opis_id in seen_ids:
-                        continue
-                    seen_ids.add(opis_id)
-
-                    address, city, state = normalize_address_components(
-                        row.get("Address", ""),
-                        row.get("City", ""),
-                        row.get("State", ""),
-                    )
+            shard_index, shard_count = parse_shard(options["shard"])
+            journal, resumed = GeocodeJournal.open(
+                options["run_id"], provider_strategy, shard=shard_index, shard_count=shard_count
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
 
-                    station = FuelStation(
-                        opis_id=opis_id,
-                        name=clean_piece(row.get("Truckstop Name", "")),
-                        address=address,
-                        city=city,
-                        state=state,
-                        rack_id=int(row["Rack ID"]) if row.get("Rack ID") else None,
-                        retail_price=row.get("Retail Price"),
-                    )
-                    stations_to_create.append(station)
-        except Exception as e:
-            self.stderr.write(f"Error reading CSV: {e}")
-            return
+        completed_ids = journal.completed_station_ids()
+        self.stdout.write(
+            f"{'Resuming' if resumed else 'Starting'} geocode run {journal.run.run_id} "
+            f"(shard {shard_index}/{shard_count}, {len(completed_ids)} stations already journaled)."
+        )
 
-        # 2) Bulk Insert
-        existing_ids = set(FuelStation.objects.values_list("opis_id", flat=True))
-        to_insert = [s for s in stations_to_create if s.opis_id not in existing_ids]
-
-        if to_insert:
-            FuelStation.objects.bulk_create(to_insert, batch_size=2000)
-            self.stdout.write(f"Inserted {len(to_insert)} new records.")
-        else:
-            self.stdout.write("No new records to insert.")
-
-        # 3) Geocode
         qs = FuelStation.objects.filter(location__isnull=True)
         if skip_attempted:
             qs = qs.filter(geocode_source__isnull=True)
             
         qs = qs.order_by('opis_id')
-        station_ids = list(qs.values_list('id', flat=True))
+        with timed("import_select"):
+            station_rows = [row for row in qs.values_list('id', 'address', 'city', 'state') if row[0] not in completed_ids]
         
         if max_n and max_n > 0:
-            station_ids = station_ids[:max_n]
-        
-        total = len(station_ids)
-        self.stdout.write(f"Geocoding {total} stations with {max_workers} workers (Strategy: {provider_strategy})...")
+            station_rows = station_rows[:max_n]
+
+        # Group stations by the exact query plan the strategy would run, so each
+        # distinct plan hits the providers once and is fanned out to its members.
+        # Units are sharded by plan key, so members of a unit never span two workers.
+        units = {}
+        for sid, address, city, state in station_rows:
+            key = router.plan_key(router.plan_station(address, city, state))
+            if shard_for_key(key, shard_count) != shard_index:
+                continue
+            unit = units.setdefault(key, {"address": address, "city": city, "state": state, "station_ids": []})
+            unit["station_ids"].append(sid)
+        work_units = list(units.values())
+        total = sum(len(u["station_ids"]) for u in work_units)
+
+        self.stdout.write(
+            f"Geocoding {total} stations as {len(work_units)} work units "
+            f"with {max_workers} workers (Strategy: {provider_strategy})..."
+        )
 
         if total == 0:
-            return
+            return True
 
         successes = 0
         unresolved = 0
         attempted = 0
+        provider_calls = 0
+        shared_lookups = 0  # stations answered by their unit's single lookup
+        cached_lookups = 0  # lookups answered by the router cache or a concurrent identical call
         
-        def process_station(sid):
+        def process_unit(unit):
             try:
-                # Re-fetch only necessary fields if possible, or full object
-                s = FuelStation.objects.get(id=sid)
                 if sleep_s > 0:
                     time.sleep(sleep_s)
                 
-                loc, debug = router.geocode_station(s.address, s.city, s.state)
-                
-                result_source = ""
-                success = False
+                loc, debug = router.geocode_station(unit["address"], unit["city"], unit["state"])
                 
                 if loc:
                     success = True
@@ -133,60 +234,73 @@ class Command(BaseCommand):
                     success = False
                     result_source = f"unresolved:{debug['classification']}:{debug.get('reason')}"
 
-                return (sid, loc, result_source, debug, success)
+                return (unit, loc, result_source, debug, success)
             except Exception as e:
-                return (sid, None, f"error:{str(e)}", {}, False)
+                return (unit, None, f"error:{str(e)}", {}, False)
 
-        batch_size = 50
         updated_batch = []
 
-        def save_batch(batch):
-            objs = []
-            for item in batch:
-                sid, loc, src, dbg, _ = item
-                s = FuelStation(id=sid)
-                s.geocode_source = src
-                if loc:
-                    s.location = loc
-                if hasattr(s, "geocode_meta"):
-                    s.geocode_meta = dbg
-                objs.append(s)
-            
-            if objs:
-                fields = ["geocode_source", "location"]
-                if hasattr(objs[0], "geocode_meta"):
-                    fields.append("geocode_meta")
-                FuelStation.objects.bulk_update(objs, fields=fields)
-
         with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            future_to_sid = {executor.submit(process_station, sid): sid for sid in station_ids}
+            futures = [executor.submit(process_unit, unit) for unit in work_units]
             
-            for future in concurrent.futures.as_completed(future_to_sid):
-                attempted += 1
-                try:
-                    res = future.result()
-                    sid, loc, src, dbg, success = res
-                    
-                    if success:
-                        successes += 1
-                        self.stdout.write(self.style.SUCCESS(f"✓ {src}"))
-                    else:
-                        unresolved += 1
-                        self.stdout.write(self.style.WARNING(f"✗ {src}"))
-
-                    updated_batch.append(res)
-
-                    if len(updated_batch) >= batch_size:
-                        save_batch(updated_batch)
-                        updated_batch = []
-                    
-                    if attempted % 100 == 0:
-                        self.stdout.write(f"Progress: {attempted}/{total}")
-
-                except Exception as exc:
-                    self.stdout.write(self.style.ERROR(f"Exception: {exc}"))
-
-            if updated_batch:
-                save_batch(updated_batch)
+            try:
+                for future in concurrent.futures.as_completed(futures):
+                    try:
+                        unit, loc, src, dbg, success = future.result()
+                        members = unit["station_ids"]
+                        attempted += len(members)
+
+                        unit_calls = count_provider_calls(dbg)
+                        calls = sum(unit_calls.values())
+                        provider_calls += calls
+                        shared_lookups += len(members) - 1
+                        cached_lookups += count_cached_lookups(dbg)
+                        
+                        if success:
+                            successes += len(members)
+                            self.stdout.write(self.style.SUCCESS(f"✓ {src} (x{len(members)})"))
+                        else:
+                            unresolved += len(members)
+                            self.stdout.write(self.style.WARNING(f"✗ {src} (x{len(members)})"))
+
+                        # Calls are attributed to the unit's first member only, so journal sums stay exact.
+                        for n, sid in enumerate(members):
+                            updated_batch.append((sid, loc, src, dbg, success, unit_calls if n == 0 else {}))
+
+                        if len(updated_batch) >= checkpoint_every:
+                            with timed("import_checkpoint"):
+                                journal.checkpoint(updated_batch)
+                            updated_batch = []
+                        
+                        if attempted // 100 != (attempted - len(members)) // 100:
+                            self.stdout.write(f"Progress: {attempted}/{total}")
+
+                    except Exception as exc:
+                        self.stdout.write(self.style.ERROR(f"Exception: {exc}"))
+            except KeyboardInterrupt:
+                for f in futures:
+                    f.cancel()
+                self.stdout.write(self.style.WARNING(
+                    f"Interrupted. Checkpointing and exiting; resume with --run_id {journal.run.run_id}"
+                ))
+                raise
+            finally:
+                if updated_batch:
+                    with timed("import_checkpoint"):
+                        journal.checkpoint(updated_batch)
 
         self.stdout.write(self.style.SUCCESS(f"Done. Attempted: {attempted}, Success: {successes}, Unresolved: {unresolved}"))
+        self.stdout.write(
+            f"Dedup: {total} stations -> {len(work_units)} work units "
+            f"(ratio {total / len(work_units):.2f}x), lookups saved: {shared_lookups + cached_lookups} "
+            f"({shared_lookups} shared by a work unit, {cached_lookups} answered by the geocode cache). "
+            f"Provider calls: {provider_calls}"
+        )
+        summary = journal.summary()
+        self.stdout.write(f"Run {summary['run_id']}: states={summary['states']} provider_calls={summary['provider_calls']}")
+        for provider in (router.google, router.census, router.osm):
+            p50 = GEOCODE_PROVIDER_SECONDS.percentile(50, provider=provider.name)
+            p99 = GEOCODE_PROVIDER_SECONDS.percentile(99, provider=provider.name)
+            if p99 is not None:
+                self.stdout.write(f"  {provider.name}: p50 {p50 * 1000:.0f} ms, p99 {p99 * 1000:.0f} ms")
+        return True
@@ -0,0 +1,309 @@
+import csv
+import json
+import logging
+import multiprocessing
+import os
+import time
+import concurrent.futures
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from routing.services.batch_planner import RoutePair, location_key
+from routing.services.geocoding import GeocodingRouter
+from routing.services.geometry import GeometryService
+from routing.services.osrm_client import OSRMClient
+from routing.services.rate_limiter import BULK
+from routing.services.station_feed import require_pyarrow
+from routing.services.stations import station_snapshot
+
+logger = logging.getLogger(__name__)
+
+TRIP_FORMATS = ("csv", "parquet")
+
+# Station snapshot seen by planning workers (inherited on fork, else set by _init_worker)
+_SNAPSHOT = None
+
+
+def _init_worker(snapshot=None):
+    global _SNAPSHOT
+    if snapshot is not None:
+        _SNAPSHOT = snapshot
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+
+def _plan_trip(job):
+    """Worker: (position, polyline, distance_m, corridor_miles) -> (position, stops, stats, plan_seconds)."""
+    from routing.services.fuel_planner import FuelPlanner
+
+    position, geometry, distance, corridor = job
+    t0 = time.perf_counter()
+    try:
+        planner = FuelPlanner(
+            route_points_lat_lon=GeometryService.decode_polyline(geometry),
+            total_distance_meters=distance,
+            corridor_miles=corridor
+        )
+        stops, stats = planner.plan_with_grid(_SNAPSHOT)
+    except Exception as e:
+        stops, stats = None, f"{e.__class__.__name__}: {e}"
+    return position, stops, stats, time.perf_counter() - t0
+
+
+def _coords_or_text(row, prefix):
+    lat, lon = row.get(f"{prefix}_lat"), row.get(f"{prefix}_lon")
+    if lat not in (None, "") and lon not in (None, ""):
+        return (float(lat), float(lon))
+    value = (row.get(prefix) or "").strip()
+    if not value:
+        raise ValueError(f"Missing {prefix} (address or {prefix}_lat/{prefix}_lon)")
+    return value
+
+
+def read_trips(path, fmt):
+    """
+    Trips as dicts. Columns: trip_id (optional), start/finish (address strings) or
+    start_lat/start_lon/finish_lat/finish_lon, corridor_miles (optional, default 10).
+    """
+    if fmt == "parquet":
+        require_pyarrow()
+        import pyarrow.parquet as pq
+        rows = pq.read_table(path).to_pylist()
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+
+    trips = []
+    for i, row in enumerate(rows):
+        trip = {"trip_id": str(row.get("trip_id") or i), "error": None}
+        try:
+            trip["start"] = _coords_or_text(row, "start")
+            trip["finish"] = _coords_or_text(row, "finish")
+            trip["corridor_miles"] = int(row.get("corridor_miles") or 10)
+        except (TypeError, ValueError) as e:
+            trip["error"] = str(e)
+        trips.append(trip)
+    return trips
+
+
+class Command(BaseCommand):
+    help = (
+        "Plan fuel stops for many trips offline. Locations go through the shared geocode cache, routes through "
+        "the OSRM cache, and planning runs on a process pool against one read-only station snapshot. "
+        "Writes one row per trip (with stage timings) to Parquet."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--trips", type=str, required=True, help="Trips file (CSV or Parquet)")
+        parser.add_argument("--format", type=str, default="csv", choices=TRIP_FORMATS, help="Trips file format")
+        parser.add_argument("--out", type=str, required=True, help="Output .parquet path")
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Planning processes (0 = in-process)")
+        parser.add_argument("--geocode_workers", type=int, default=8, help="Threads for geocoding distinct locations")
+        parser.add_argument("--route_workers", type=int, default=8, help="Threads for fetching distinct OSRM routes")
+        parser.add_argument("--window", type=int, default=2000, help="Trips routed and planned per window (bounds memory)")
+
+    def handle(self, *args, **options):
+        try:
+            pa = require_pyarrow()
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise CommandError(str(e))
+
+        t_start = time.perf_counter()
+        trips = read_trips(options["trips"], options["format"])
+        self.stdout.write(f"Loaded {len(trips)} trips from {options['trips']}")
+
+        t0 = time.perf_counter()
+        snapshot = station_snapshot()
+        snapshot_s = time.perf_counter() - t0
+        self.stdout.write(f"Station snapshot: {len(snapshot)} located stations in {snapshot_s:.2f}s")
+
+        self.router = GeocodingRouter(provider_priority="smart", traffic=BULK)
+        self.locations = {}
+        totals = {"geocode": 0.0, "route": 0.0, "plan": 0.0, "plan_cpu": 0.0}
+        ok = 0
+
+        workers = options["workers"]
+        pool = self._start_pool(snapshot, workers)
+        writer = None
+        try:
+            for offset in range(0, len(trips), options["window"]):
+                window = trips[offset:offset + options["window"]]
+                rows = self._run_window(window, pool, options, totals)
+                ok += sum(1 for r in rows if r["status"] == "ok")
+                table = pa.Table.from_pylist(rows, schema=_output_schema(pa))
+                if writer is None:
+                    writer = pq.ParquetWriter(options["out"], table.schema, compression="zstd")
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+            if pool is not None:
+                pool.shutdown()
+
+        elapsed = time.perf_counter() - t_start
+        cores = max(1, workers)
+        rate = len(trips) / elapsed if elapsed else 0.0
+        self.stdout.write(self.style.SUCCESS(
+            f"Planned {len(trips)} trips ({ok} ok, {len(trips) - ok} failed) in {elapsed:.2f}s -> {options['out']}"
+        ))
+        self.stdout.write(
+            f"Stages (wall): snapshot {snapshot_s:.2f}s, geocode {totals['geocode']:.2f}s, "
+            f"route {totals['route']:.2f}s, plan {totals['plan']:.2f}s (planner CPU {totals['plan_cpu']:.2f}s)"
+        )
+        self.stdout.write(
+            f"Throughput: {rate:.1f} trips/s overall, {rate / cores:.1f} trips/s per core ({cores} planning "
+            f"{'process' if cores == 1 else 'processes'}); "
+            f"planner only: {len(trips) / totals['plan_cpu'] if totals['plan_cpu'] else 0.0:.1f} trips/s per core"
+        )
+
+    def _start_pool(self, snapshot, workers):
+        global _SNAPSHOT
+        _SNAPSHOT = snapshot
+        if workers <= 0:
+            return None
+        # Workers never touch the DB; don't let them inherit open connections
+        connections.close_all()
+        if "fork" in multiprocessing.get_all_start_methods():
+            # The snapshot is inherited copy-on-write instead of pickled per worker
+            return concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("fork"), initializer=_init_worker
+            )
+        return concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(snapshot,))
+
+    def _resolve(self, value):
+        if isinstance(value, tuple):
+            return value
+        loc, debug = self.router.geocode_string(value)
+        if not loc:
+            raise ValueError(f"Could not geocode location: {value}.")
+        return (loc.y, loc.x)
+
+    def _parallel(self, func, items, workers):
+        results = {}
+        if not items:
+            return results
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(workers, len(items))) as pool:
+            futures = {item: pool.submit(self._timed, func, item) for item in items}
+            for item, future in futures.items():
+                results[item] = future.result()
+        return results
+
+    @staticmethod
+    def _timed(func, item):
+        t0 = time.perf_counter()
+        try:
+            value = func(item)
+        except Exception as e:
+            value = e
+        finally:
+            connections.close_all()
+        return value, time.perf_counter() - t0
+
+    def _run_window(self, trips, pool, options, totals):
+        # 1. Geocode distinct locations (cached across windows and in the shared geocode cache)
+        t0 = time.perf_counter()
+        pending = {}
+        for trip in trips:
+            if trip["error"]:
+                continue
+            for end in ("start", "finish"):
+                key = location_key(trip[end])
+                if key not in self.locations:
+                    pending.setdefault(key, trip[end])
+        resolved = self._parallel(lambda key: self._resolve(pending[key]), list(pending), options["geocode_workers"])
+        self.locations.update(resolved)
+        totals["geocode"] += time.perf_counter() - t0
+
+        # 2. Fetch distinct routes (OSRM cache first)
+        t0 = time.perf_counter()
+        pairs = {}
+        for trip in trips:
+            if trip["error"]:
+                continue
+            start, _ = self.locations[location_key(trip["start"])]
+            finish, _ = self.locations[location_key(trip["finish"])]
+            if not isinstance(start, Exception) and not isinstance(finish, Exception):
+                pairs.setdefault(RoutePair(start, finish), None)
+        routes = self._parallel(lambda pair: OSRMClient.get_route(pair.start, pair.finish), list(pairs), options["route_workers"])
+        totals["route"] += time.perf_counter() - t0
+
+        # 3. Plan on the process pool
+        rows, jobs = [], []
+        for position, trip in enumerate(trips):
+            row = _empty_row(trip)
+            rows.append(row)
+            if trip["error"]:
+                continue
+            (start, start_s), (finish, finish_s) = (self.locations[location_key(trip[end])] for end in ("start", "finish"))
+            row["geocode_ms"] = round(max(start_s, finish_s) * 1000, 2)
+            for coords in (start, finish):
+                if isinstance(coords, Exception):
+                    row["status"], row["error"] = "geocode_failed", str(coords)
+                    break
+            if row["status"]:
+                continue
+            row["start_lat"], row["start_lon"] = start
+            row["finish_lat"], row["finish_lon"] = finish
+            route, route_s = routes[RoutePair(start, finish)]
+            row["route_ms"] = round(route_s * 1000, 2)
+            if isinstance(route, Exception):
+                row["status"], row["error"] = "route_failed", str(route)
+                continue
+            row["distance_miles"] = round(GeometryService.meters_to_miles(route["distance"]), 1)
+            jobs.append((position, route["geometry"], route["distance"], trip["corridor_miles"]))
+
+        t0 = time.perf_counter()
+        if pool is None:
+            results = map(_plan_trip, jobs)
+        else:
+            results = pool.map(_plan_trip, jobs, chunksize=max(1, len(jobs) // (options["workers"] * 4) or 1))
+        for position, stops, stats, plan_s in results:
+            row = rows[position]
+            row["plan_ms"] = round(plan_s * 1000, 2)
+            totals["plan_cpu"] += plan_s
+            if stops is None:
+                row["status"], row["error"] = "plan_failed", str(stats)
+                continue
+            row["status"] = "ok"
+            row["total_cost"] = stats["total_cost"]
+            row["total_gallons"] = stats["total_gallons"]
+            row["stop_count"] = len(stops)
+            row["stops_json"] = json.dumps(stops, separators=(",", ":"))
+        totals["plan"] += time.perf_counter() - t0
+
+        for row in rows:
+            row["status"] = row["status"] or "invalid"
+        return rows
+
+
+def _empty_row(trip):
+    return {
+        "trip_id": trip["trip_id"], "status": "" if not trip["error"] else "invalid", "error": trip["error"],
+        "start_lat": None, "start_lon": None, "finish_lat": None, "finish_lon": None,
+        "distance_miles": None, "total_cost": None, "total_gallons": None, "stop_count": None, "stops_json": None,
+        "geocode_ms": None, "route_ms": None, "plan_ms": None,
+    }
+
+
+def _output_schema(pa):
+    return pa.schema([
+        ("trip_id", pa.string()),
+        ("status", pa.string()),
+        ("error", pa.string()),
+        ("start_lat", pa.float64()),
+        ("start_lon", pa.float64()),
+        ("finish_lat", pa.float64()),
+        ("finish_lon", pa.float64()),
+        ("distance_miles", pa.float64()),
+        ("total_cost", pa.float64()),
+        ("total_gallons", pa.float64()),
+        ("stop_count", pa.int32()),
+        ("stops_json", pa.string()),
+        ("geocode_ms", pa.float64()),
+        ("route_ms", pa.float64()),
+        ("plan_ms", pa.float64()),
+    ])
@@ -0,0 +1,121 @@
+import concurrent.futures
+import glob
+import os
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from routing.api.views import RoutePlanView
+from routing.management.commands.plan_trips import TRIP_FORMATS, read_trips
+from routing.services import lanes
+from routing.services.stations import cached_station_version
+from routing.services.traces import read_traces
+
+
+def _in_thread(func, *args):
+    try:
+        return func(*args)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        "Precompute recurring lanes so their route-plan requests skip geocoding, OSRM and the corridor query. "
+        "Lanes come from a trips file (as for plan_trips) or are mined from recorded traces. Every pass builds "
+        "missing or old lanes and, when station data changed, reprices the others without re-routing them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lanes", type=str, default=None, help="Lanes file (CSV or Parquet, plan_trips columns)")
+        parser.add_argument("--format", type=str, default="csv", choices=TRIP_FORMATS, help="Lanes file format")
+        parser.add_argument("--from_traces", nargs="+", default=None, help="Trace files or directories to mine lanes from")
+        parser.add_argument("--top", type=int, default=300, help="Most requested lanes to keep when mining traces")
+        parser.add_argument("--workers", type=int, default=4, help="Threads building lanes (geocoding, OSRM, corridor)")
+        parser.add_argument("--full", action="store_true", help="Rebuild every lane, not only missing or old ones")
+        parser.add_argument("--interval", type=float, default=0, help="Repeat every N seconds (0 = one pass)")
+
+    def handle(self, *args, **options):
+        lane_list = self.load_lanes(options)
+        if not lane_list:
+            raise CommandError("No lanes to precompute.")
+        self.stdout.write(f"{len(lane_list)} lanes.")
+
+        full = options["full"]
+        while True:
+            self.run_pass(lane_list, full, max(1, options["workers"]))
+            if not options["interval"]:
+                return
+            full = False
+            time.sleep(options["interval"])
+
+    def load_lanes(self, options):
+        if options["lanes"]:
+            lane_list = []
+            for trip in read_trips(options["lanes"], options["format"]):
+                if trip["error"]:
+                    self.stdout.write(self.style.WARNING(f"Skipping lane {trip['trip_id']}: {trip['error']}"))
+                else:
+                    lane_list.append((trip["start"], trip["finish"], trip["corridor_miles"]))
+            return lane_list
+        if options["from_traces"]:
+            paths = []
+            for path in options["from_traces"]:
+                paths.extend(sorted(glob.glob(os.path.join(path, "*.jsonl*"))) if os.path.isdir(path) else [path])
+            mined = lanes.mine_lanes(read_traces(paths), options["top"])
+            if mined:
+                share = sum(n for *_, n in mined)
+                self.stdout.write(f"Mined {len(mined)} lanes covering {share} traced requests.")
+            return [(start, finish, corridor) for start, finish, corridor, _ in mined]
+        raise CommandError("Pass --lanes or --from_traces.")
+
+    def run_pass(self, lane_list, full, workers):
+        t0 = time.perf_counter()
+        counts = {"built": 0, "repriced": 0, "fresh": 0, "failed": 0, "infeasible": 0}
+        resolve = RoutePlanView().resolve_location
+        cached_station_version()  # versions every lane of the pass (and build threads) against one read
+
+        to_build = []
+        for start, finish, corridor in lane_list:
+            entry = cache.get(lanes.lane_key(start, finish, corridor))
+            if full or entry is None or time.time() - entry.get("built_at", 0) > settings.LANE_REBUILD_S:
+                to_build.append((start, finish, corridor))
+                continue
+            try:
+                state, entry = lanes.refresh(entry)
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"Repricing {start} -> {finish} failed: {e}"))
+                counts["failed"] += 1
+                continue
+            counts[state] += 1
+            counts["infeasible"] += entry["stops"] is None
+
+        def built(start, finish, build):
+            try:
+                entry = build()
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"Building {start} -> {finish} failed: {e}"))
+                counts["failed"] += 1
+                return
+            lanes.store(entry)
+            counts["built"] += 1
+            counts["infeasible"] += entry["stops"] is None
+
+        if workers == 1:
+            # Run inline: keeps the caller's DB connection (and transaction, in tests)
+            for start, finish, corridor in to_build:
+                built(start, finish, lambda: lanes.build(start, finish, corridor, resolve))
+        else:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = {
+                    pool.submit(_in_thread, lanes.build, start, finish, corridor, resolve): (start, finish)
+                    for start, finish, corridor in to_build
+                }
+                for future in concurrent.futures.as_completed(futures):
+                    built(*futures[future], future.result)
+
+        summary = ", ".join(f"{n} {state}" for state, n in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Lanes: {summary} in {time.perf_counter() - t0:.1f}s."))
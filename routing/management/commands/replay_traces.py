@@ -0,0 +1,168 @@
+import glob
+import json
+import os
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from routing.api.serializers import RoutePlanRequestSerializer
+from routing.api.views import RoutePlanView
+from routing.services import timing
+from routing.services.stations import station_version
+from routing.services.traces import plan_summary, read_traces
+
+# Stages served from the trace on replay; their replay timings are local overhead only
+UPSTREAM_STAGES = ("geocode", "route")
+
+
+class ReplayRoutePlanView(RoutePlanView):
+    """RoutePlanView answering geocoding and routing from one trace entry."""
+
+    def __init__(self, entry, **kwargs):
+        super().__init__(**kwargs)
+        self.entry = entry
+
+    def resolve_location(self, value, deadline=None):
+        if isinstance(value, tuple):
+            return value
+        coords = self.entry["geocodes"].get(value)
+        if coords is None:
+            raise ValueError(self.entry["result"].get("error") or f"Could not geocode location: {value}.")
+        return tuple(coords)
+
+    def route(self, start_coords, finish_coords):
+        if self.entry["route"] is None:
+            raise ConnectionError(self.entry["result"].get("error") or "No route recorded.")
+        return self.entry["route"]
+
+    def routes(self, start_coords, finish_coords, alternatives):
+        if not self.entry.get("routes"):
+            raise ConnectionError(self.entry["result"].get("error") or "No routes recorded.")
+        return self.entry["routes"]
+
+    def lane(self, data):
+        # Replays always run the corridor query and the planner
+        return None
+
+
+def replay_entry(entry):
+    """(result summary, stage ms, elapsed ms) of planning one trace entry with the current code."""
+    serializer = RoutePlanRequestSerializer(data=entry["input"])
+    if not serializer.is_valid():
+        return {"status": 400, "error": serializer.errors}, {}, 0.0
+    view = ReplayRoutePlanView(entry)
+    with timing.recording() as timings:
+        t0 = time.perf_counter()
+        response = view.plan(serializer.validated_data)
+        elapsed_ms = (time.perf_counter() - t0) * 1000
+    stages = {t.stage: t.seconds * 1000 for t in timings.items() if t.calls}
+    return plan_summary(response.status_code, response.data), stages, elapsed_ms
+
+
+def _p(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else None
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay recorded /route-plan/ traces (TRACE_RECORDING_ENABLED) against the current code. Geocoding and "
+        "OSRM are answered from the trace; the corridor query and planning run for real against this database. "
+        "Reports per-stage latency against the recording (or a previous replay) and any plan differences."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+", help="Trace files or directories (.jsonl / .jsonl.gz)")
+        parser.add_argument("--repeat", type=int, default=1, help="Replays per trace; the median is reported")
+        parser.add_argument("--baseline", type=str, default=None, help="Compare timings with a previous replay's --json output")
+        parser.add_argument("--json", type=str, default=None, help="Write per-trace replay results to this file")
+        parser.add_argument("--show_diffs", type=int, default=10, help="Plan differences to print")
+        parser.add_argument("--fail_on_diff", action="store_true", help="Exit with an error if any plan differs")
+
+    def handle(self, *args, **options):
+        paths = []
+        for path in options["paths"]:
+            paths.extend(sorted(glob.glob(os.path.join(path, "*.jsonl*"))) if os.path.isdir(path) else [path])
+        if not paths:
+            raise CommandError("No trace files found.")
+
+        current_version = station_version()
+        baseline = None
+        if options["baseline"]:
+            with open(options["baseline"], "r", encoding="utf-8") as f:
+                baseline = {r["id"]: r for r in json.load(f)["traces"]}
+
+        results, diffs = [], []
+        for entry in read_traces(paths):
+            runs = [replay_entry(entry) for _ in range(max(1, options["repeat"]))]
+            summary = runs[0][0]
+            stages = {
+                stage: statistics.median(run[1].get(stage, 0.0) for run in runs)
+                for stage in runs[0][1]
+            }
+            result = {
+                "id": entry["id"],
+                "start": entry["input"].get("start"),
+                "finish": entry["input"].get("finish"),
+                "stations_changed": entry.get("station_version") != current_version,
+                "recorded": entry["result"],
+                "replayed": summary,
+                "recorded_stages_ms": entry.get("stages_ms", {}),
+                "recorded_elapsed_ms": entry.get("elapsed_ms"),
+                "stages_ms": stages,
+                "elapsed_ms": statistics.median(run[2] for run in runs),
+            }
+            results.append(result)
+            if summary != entry["result"]:
+                diffs.append(result)
+
+        if not results:
+            raise CommandError("No replayable traces in the given files.")
+        self.report(results, diffs, baseline, options["show_diffs"])
+
+        if options["json"]:
+            with open(options["json"], "w", encoding="utf-8") as f:
+                json.dump({"station_version": current_version, "traces": results}, f, indent=2)
+        if diffs and options["fail_on_diff"]:
+            raise CommandError(f"{len(diffs)} plan(s) differ from the recording.")
+
+    def report(self, results, diffs, baseline, show_diffs):
+        changed = sum(r["stations_changed"] for r in results)
+        self.stdout.write(
+            f"Replayed {len(results)} traces ({changed} recorded against different station data than this database)."
+        )
+
+        against = "baseline replay" if baseline is not None else "recording"
+        self.stdout.write(f"\n{'stage':<10}{'then p50':>10}{'now p50':>10}{'then p90':>10}{'now p90':>10}  (ms, vs {against})")
+        stages = []
+        for r in results:
+            stages.extend(s for s in r["stages_ms"] if s not in stages)
+        for stage in stages + ["total"]:
+            before, after = [], []
+            for r in results:
+                if baseline is not None:
+                    reference = baseline.get(r["id"])
+                    if reference is None:
+                        continue
+                    then = reference["elapsed_ms"] if stage == "total" else reference["stages_ms"].get(stage)
+                else:
+                    then = r["recorded_elapsed_ms"] if stage == "total" else r["recorded_stages_ms"].get(stage)
+                now = r["elapsed_ms"] if stage == "total" else r["stages_ms"].get(stage)
+                if then is not None and now is not None:
+                    before.append(then)
+                    after.append(now)
+            if not before:
+                continue
+            note = "  (served from trace)" if stage in UPSTREAM_STAGES else ""
+            self.stdout.write(
+                f"{stage:<10}{_p(before, 0.5):>10.1f}{_p(after, 0.5):>10.1f}{_p(before, 0.9):>10.1f}{_p(after, 0.9):>10.1f}{note}"
+            )
+
+        style = self.style.WARNING if diffs else self.style.SUCCESS
+        self.stdout.write(style(f"\n{len(diffs)} plan difference(s)"))
+        for r in diffs[:show_diffs]:
+            reason = " [station data changed]" if r["stations_changed"] else ""
+            self.stdout.write(f"  {r['id']} {r['start']} -> {r['finish']}{reason}")
+            self.stdout.write(f"    recorded: {json.dumps(r['recorded'])}")
+            self.stdout.write(f"    replayed: {json.dumps(r['replayed'])}")
@@ -0,0 +1,108 @@
+import logging
+import os
+import socket
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from routing.api.jobs import execute_job
+from routing.services import plan_jobs
+
+logger = logging.getLogger(__name__)
+
+
+def _recycle_connections():
+    """Drop broken/expired DB connections between jobs, never inside a caller's transaction."""
+    if not connection.in_atomic_block:
+        close_old_connections()
+
+
+class Command(BaseCommand):
+    help = (
+        "Consume queued plan jobs (route-plan/jobs/). Any number of workers can run against the same "
+        "database; jobs are claimed with FOR UPDATE SKIP LOCKED, highest priority first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=4, help="Jobs executed in parallel by this process")
+        parser.add_argument("--poll_interval", type=float, default=0.5, help="Seconds to sleep when the queue is empty")
+        parser.add_argument("--maintenance_every", type=float, default=10.0, help="Seconds between timeout/expiry sweeps")
+        parser.add_argument("--once", action="store_true", help="Exit once the queue is empty (drain mode)")
+        parser.add_argument("--worker_id", type=str, default=None, help="Name recorded on claimed jobs (default host:pid)")
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.stop = threading.Event()
+        self.last_maintenance = 0.0
+        self.maintenance_lock = threading.Lock()
+        self.processed = 0
+        worker_id = options["worker_id"] or f"{socket.gethostname()}:{os.getpid()}"
+        concurrency = max(1, options["concurrency"])
+
+        self.stdout.write(f"Plan worker {worker_id} started (concurrency={concurrency})")
+        if concurrency == 1:
+            # Run inline: keeps the caller's DB connection (and transaction, in tests)
+            self.work(worker_id)
+        else:
+            threads = [
+                threading.Thread(target=self.work, args=(f"{worker_id}/{i}",), name=f"plan-worker-{i}", daemon=True)
+                for i in range(concurrency)
+            ]
+            for t in threads:
+                t.start()
+            try:
+                while any(t.is_alive() for t in threads):
+                    for t in threads:
+                        t.join(timeout=0.5)
+            except KeyboardInterrupt:
+                self.stdout.write("Stopping after running jobs finish...")
+                self.stop.set()
+                for t in threads:
+                    t.join()
+
+        self.stdout.write(self.style.SUCCESS(f"Plan worker {worker_id} processed {self.processed} job(s)"))
+
+    def maintenance(self):
+        now = time.monotonic()
+        if now - self.last_maintenance < self.options["maintenance_every"]:
+            return
+        with self.maintenance_lock:
+            if now - self.last_maintenance < self.options["maintenance_every"]:
+                return
+            self.last_maintenance = now
+        plan_jobs.fail_timed_out()
+        purged = plan_jobs.purge_expired()
+        if purged:
+            logger.info(f"Purged {purged} expired plan job(s)")
+
+    def work(self, worker_id):
+        try:
+            while not self.stop.is_set():
+                _recycle_connections()
+                self.maintenance()
+                job = plan_jobs.claim(worker_id)
+                if job is None:
+                    if self.options["once"]:
+                        return
+                    self.stop.wait(self.options["poll_interval"])
+                    continue
+                self.run_job(job)
+        finally:
+            _recycle_connections()
+
+    def run_job(self, job):
+        t0 = time.perf_counter()
+        try:
+            status_code, result = execute_job(job)
+        except Exception as e:
+            logger.exception(f"Plan job {job.id} crashed")
+            status_code, result = 500, {"error": "Internal Server Error", "details": str(e)}
+        stored = plan_jobs.finish(job, status_code, result)
+        self.processed += 1
+        elapsed = time.perf_counter() - t0
+        if stored:
+            logger.info(f"Plan job {job.id} ({job.kind}) -> {status_code} in {elapsed:.2f}s")
+        else:
+            logger.warning(f"Plan job {job.id} finished after its {job.timeout_s}s timeout ({elapsed:.1f}s); result dropped")
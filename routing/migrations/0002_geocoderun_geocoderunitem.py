@@ -0,0 +1,81 @@
+# Generated by Django 5.0.14 on 2026-10-19 09:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("routing", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="GeocodeRun",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("run_id", models.CharField(max_length=64, unique=True)),
+                ("strategy", models.CharField(max_length=50)),
+                ("shard_count", models.IntegerField(default=1)),
+                ("last_checkpoint_at", models.DateTimeField(blank=True, null=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="GeocodeRunItem",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("station_id", models.BigIntegerField()),
+                ("shard", models.IntegerField(default=0)),
+                ("state", models.CharField(max_length=20)),
+                ("geocode_source", models.TextField(blank=True, default="")),
+                (
+                    "provider_calls",
+                    models.JSONField(
+                        blank=True,
+                        default=dict,
+                        help_text="Provider calls issued for this unit (representative only)",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "run",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="items",
+                        to="routing.geocoderun",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["run", "state"], name="geocode_run_item_state_idx"
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("run", "station_id"), name="uniq_geocode_run_station"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 5.0.14 on 2026-10-19 07:31
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("routing", "0002_geocoderun_geocoderunitem"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PlanJob",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("route_plan", "Route plan"),
+                            ("batch", "Batch route plan"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("payload", models.JSONField()),
+                (
+                    "priority",
+                    models.SmallIntegerField(default=5, help_text="Higher runs first"),
+                ),
+                ("state", models.CharField(default="queued", max_length=20)),
+                (
+                    "timeout_s",
+                    models.IntegerField(
+                        help_text="Run time after which the job is failed with 504"
+                    ),
+                ),
+                (
+                    "result_ttl_s",
+                    models.IntegerField(
+                        help_text="How long the result is kept once finished"
+                    ),
+                ),
+                (
+                    "status_code",
+                    models.IntegerField(
+                        blank=True,
+                        help_text="HTTP status the synchronous endpoint would have returned",
+                        null=True,
+                    ),
+                ),
+                ("result", models.JSONField(blank=True, null=True)),
+                ("worker", models.CharField(blank=True, default="", max_length=100)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("started_at", models.DateTimeField(blank=True, null=True)),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+                ("expires_at", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["state", "-priority", "created_at"],
+                        name="plan_job_queue_idx",
+                    ),
+                    models.Index(fields=["expires_at"], name="plan_job_expiry_idx"),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-19 18:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("routing", "0003_planjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="fuelstation",
+            name="cluster_id",
+            field=models.BigIntegerField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -1,3 +1,4 @@
+import uuid
 from django.contrib.gis.db import models
 
 class FuelStation(models.Model):
@@ -13,6 +14,8 @@ class FuelStation(models.Model):
     location = models.PointField(geography=True, null=True, blank=True) # geography=True for better distance calcs
     
     geocode_source = models.CharField(max_length=50, default='census', null=True, blank=True)
+    # Co-located stations (same interchange) share the id of their cluster's seed station; see station_clusters
+    cluster_id = models.BigIntegerField(null=True, blank=True, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -39,3 +42,79 @@ class GeocodeCache(models.Model):
 
     def __str__(self):
         return f"{self.query_text} -> {self.location}"
+
+
+class GeocodeRun(models.Model):
+    """Journal header for a (possibly sharded) geocoding pass of the import command."""
+    run_id = models.CharField(max_length=64, unique=True)
+    strategy = models.CharField(max_length=50)
+    shard_count = models.IntegerField(default=1)
+    last_checkpoint_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.run_id} ({self.strategy}, {self.shard_count} shards)"
+
+
+class GeocodeRunItem(models.Model):
+    """Per-station outcome recorded at each checkpoint of a GeocodeRun."""
+    STATE_GEOCODED = "geocoded"
+    STATE_UNRESOLVED = "unresolved"
+    STATE_ERROR = "error"
+
+    run = models.ForeignKey(GeocodeRun, on_delete=models.CASCADE, related_name="items")
+    station_id = models.BigIntegerField()
+    shard = models.IntegerField(default=0)
+    state = models.CharField(max_length=20)
+    geocode_source = models.TextField(blank=True, default="")
+    provider_calls = models.JSONField(default=dict, blank=True, help_text="Provider calls issued for this unit (representative only)")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["run", "station_id"], name="uniq_geocode_run_station"),
+        ]
+        indexes = [
+            models.Index(fields=["run", "state"], name="geocode_run_item_state_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.run.run_id}:{self.station_id} -> {self.state}"
+
+
+class PlanJob(models.Model):
+    """Queued route-plan or batch request, consumed by `run_plan_worker` (FOR UPDATE SKIP LOCKED)."""
+    KIND_ROUTE_PLAN = "route_plan"
+    KIND_BATCH = "batch"
+    KINDS = [(KIND_ROUTE_PLAN, "Route plan"), (KIND_BATCH, "Batch route plan")]
+
+    STATE_QUEUED = "queued"
+    STATE_RUNNING = "running"
+    STATE_SUCCEEDED = "succeeded"
+    STATE_FAILED = "failed"
+    FINISHED_STATES = (STATE_SUCCEEDED, STATE_FAILED)
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(max_length=20, choices=KINDS)
+    payload = models.JSONField()
+    priority = models.SmallIntegerField(default=5, help_text="Higher runs first")
+    state = models.CharField(max_length=20, default=STATE_QUEUED)
+    timeout_s = models.IntegerField(help_text="Run time after which the job is failed with 504")
+    result_ttl_s = models.IntegerField(help_text="How long the result is kept once finished")
+    status_code = models.IntegerField(null=True, blank=True, help_text="HTTP status the synchronous endpoint would have returned")
+    result = models.JSONField(null=True, blank=True)
+    worker = models.CharField(max_length=100, blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["state", "-priority", "created_at"], name="plan_job_queue_idx"),
+            models.Index(fields=["expires_at"], name="plan_job_expiry_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.kind}:{self.id} ({self.state})"
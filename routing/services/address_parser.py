@@ -0,0 +1,200 @@
+"""
+Single-pass station address parsing.
+
+Fuses `normalize_address_components`, `extract_roads` and `classify_address`
+(see routing.services.geocoding) so every regex runs at most once per address,
+memoizes results per unique (address, city, state), and offers a batch API that
+fans distinct rows out over a process pool.
+
+This module deliberately has no Django imports so pool workers start cheaply.
+"""
+import re
+import concurrent.futures
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+# ----------------------------
+# Regex
+# ----------------------------
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_EXIT_RE = re.compile(r"\bEXIT\s*\d+\b", re.IGNORECASE)
+_MILE_MARKER_RE = re.compile(r"\b(MM|MILE\s*MARKER)\s*\d+\b", re.IGNORECASE)
+_COMMA_SPACING_RE = re.compile(r"\s*,\s*")
+_INTERSECTION_SEP_RE = re.compile(r"\s*(&| AND )\s*", re.IGNORECASE)
+_COMMA_EXIT_RE = re.compile(r",\s*(EXIT\s*\d+)\b", re.IGNORECASE)
+
+# Postal-ish heuristic
+_HAS_STREET_NUMBER_RE = re.compile(r"\b\d{1,6}\b")
+
+# Road extraction
+ROAD_RE = re.compile(r"\b(I-\d{1,3}|US-\d{1,3}|SR-\d{1,4})\b", re.IGNORECASE)
+
+# Postal street suffix cues
+_STREET_SUFFIX_RE = re.compile(
+    r"\b("
+    r"ST|STREET|AVE|AVENUE|RD|ROAD|DR|DRIVE|LN|LANE|BLVD|BOULEVARD|"
+    r"HWY|HIGHWAY|PKWY|PARKWAY|CT|COURT|PL|PLACE|CIR|CIRCLE|WAY|TER|TERRACE|"
+    r"PLZ|PLAZA|TRL|TRAIL|PIKE|SQ|SQUARE"
+    r")\b",
+    re.IGNORECASE
+)
+
+# Typical "123 Something" pattern
+_NUMBER_THEN_WORD_RE = re.compile(r"\b\d{1,6}\s+[A-Za-z]", re.IGNORECASE)
+
+
+class AddrType:
+    POSTAL_ADDRESS = "POSTAL_ADDRESS"
+    HIGHWAY_INTERSECTION_2 = "HIGHWAY_INTERSECTION_2"
+    HIGHWAY_INTERSECTION_MULTI = "HIGHWAY_INTERSECTION_MULTI"
+    SINGLE_ROUTE = "SINGLE_ROUTE"
+    MILE_MARKER = "MILE_MARKER"
+    UNKNOWN = "UNKNOWN"
+
+
+class ParsedAddress(NamedTuple):
+    address: str
+    city: str
+    state: str
+    roads: Tuple[str, ...]
+    addr_type: str
+    reason: str
+
+    def classification(self) -> Tuple[str, Dict[str, Any]]:
+        """Same shape as `classify_address(address)`; a fresh dict on every call."""
+        return self.addr_type, _info(self.address, self.roads, self.addr_type, self.reason)
+
+
+def _info(raw: str, roads: Tuple[str, ...], addr_type: str, reason: str) -> Dict[str, Any]:
+    info: Dict[str, Any] = {"raw": raw}
+    if addr_type != AddrType.MILE_MARKER:
+        info["roads"] = list(roads)
+    info["reason"] = reason
+    return info
+
+
+# ----------------------------
+# Single pass
+# ----------------------------
+
+def _clean(s: Optional[str]) -> str:
+    if not s:
+        return ""
+    return _WHITESPACE_RE.sub(" ", s.strip())
+
+
+def _normalize(address: str, city: str, state: str) -> Tuple[str, str, str]:
+    address = _clean(address)
+    address = _COMMA_SPACING_RE.sub(", ", address)
+    address = _INTERSECTION_SEP_RE.sub(" & ", address)
+    address = _COMMA_EXIT_RE.sub(r" \1", address)
+    return address, _clean(city), _clean(state).upper()
+
+
+def _roads(a: str) -> Tuple[str, ...]:
+    # dict preserves first-seen order while de-duping
+    return tuple(dict.fromkeys(m.group(1).upper() for m in ROAD_RE.finditer(a)))
+
+
+def _classify(a: str) -> Tuple[Tuple[str, ...], str, str]:
+    """
+    Returns (roads, addr_type, reason). Mirrors classify_address ->
+    looks_like_highway_reference -> is_postal_address, but evaluates each
+    pattern (and the EXIT/MM-stripped string) at most once.
+    """
+    # Mile markers are never geocodable
+    if _MILE_MARKER_RE.search(a):
+        return _roads(a), AddrType.MILE_MARKER, "mile_marker_detected"
+
+    roads = _roads(a)
+    stripped = None
+    number_then_word = None
+
+    if roads:
+        has_suffix = _STREET_SUFFIX_RE.search(a) is not None
+        if _EXIT_RE.search(a):
+            highway = True
+        elif len(roads) == 1 and " " not in a and not has_suffix:
+            highway = True
+        elif not has_suffix:
+            stripped = _WHITESPACE_RE.sub(" ", _MILE_MARKER_RE.sub("", _EXIT_RE.sub("", a))).strip()
+            number_then_word = _NUMBER_THEN_WORD_RE.search(stripped) is not None
+            highway = not number_then_word
+        else:
+            highway = False
+
+        if highway:
+            if len(roads) == 1:
+                return roads, AddrType.SINGLE_ROUTE, "highway_single_route"
+            if len(roads) == 2:
+                return roads, AddrType.HIGHWAY_INTERSECTION_2, "highway_two_roads"
+            return roads, AddrType.HIGHWAY_INTERSECTION_MULTI, "highway_multi_roads"
+
+    if stripped is None:
+        stripped = _WHITESPACE_RE.sub(" ", _MILE_MARKER_RE.sub("", _EXIT_RE.sub("", a))).strip()
+    if number_then_word is None:
+        number_then_word = _NUMBER_THEN_WORD_RE.search(stripped) is not None
+
+    if number_then_word or (_STREET_SUFFIX_RE.search(stripped) and _HAS_STREET_NUMBER_RE.search(stripped)):
+        return roads, AddrType.POSTAL_ADDRESS, "postal_cues_detected"
+
+    return roads, AddrType.UNKNOWN, "unable_to_classify"
+
+
+@lru_cache(maxsize=65536)
+def classify(address: str) -> Tuple[Tuple[str, ...], str, str]:
+    """Memoized (roads, addr_type, reason) for an already-normalized address."""
+    return _classify(address or "")
+
+
+def classify_cached(address: str) -> Tuple[str, Dict[str, Any]]:
+    """Drop-in for `classify_address` backed by the memoized single pass."""
+    roads, addr_type, reason = classify(address)
+    return addr_type, _info(address, roads, addr_type, reason)
+
+
+@lru_cache(maxsize=65536)
+def extract_roads_cached(address: str) -> Tuple[str, ...]:
+    return _roads(address or "")
+
+
+@lru_cache(maxsize=65536)
+def parse_station(address: str, city: str, state: str) -> ParsedAddress:
+    """Normalize raw OPIS pieces and classify the resulting address, memoized."""
+    address, city, state = _normalize(address, city, state)
+    roads, addr_type, reason = classify(address)
+    return ParsedAddress(address, city, state, roads, addr_type, reason)
+
+
+# ----------------------------
+# Batch API
+# ----------------------------
+
+def _parse_chunk(rows: List[Tuple[str, str, str]]) -> List[ParsedAddress]:
+    return [parse_station(*row) for row in rows]
+
+
+def parse_stations_batch(
+    rows: Iterable[Tuple[Optional[str], Optional[str], Optional[str]]],
+    workers: int = 0,
+    chunksize: int = 2000,
+) -> List[ParsedAddress]:
+    """
+    Parse (address, city, state) rows, returning results in input order.
+
+    Only distinct rows are parsed. With workers > 1 they are spread over a
+    process pool in chunks; otherwise parsing runs in-process.
+    """
+    rows = [(a or "", c or "", s or "") for a, c, s in rows]
+    unique = list(dict.fromkeys(rows))
+
+    if workers and workers > 1 and len(unique) > chunksize:
+        chunks = [unique[i:i + chunksize] for i in range(0, len(unique), chunksize)]
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            parsed = [p for chunk in pool.map(_parse_chunk, chunks) for p in chunk]
+    else:
+        parsed = _parse_chunk(unique)
+
+    by_row = dict(zip(unique, parsed))
+    return [by_row[row] for row in rows]
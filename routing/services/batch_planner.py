@@ -0,0 +1,200 @@
+"""
+Fleet batch planning: many trips in one call, with the shared work done once.
+
+  1. Every distinct location string is geocoded once, in parallel.
+  2. Every distinct (start, finish) pair is routed once, in parallel.
+  3. One station-candidate query covers the union of all route corridors; each
+     trip is then linear-referenced against it in memory.
+
+Total latency therefore tracks the slowest geocode/route rather than the sum.
+Failures are reported per trip and never fail the batch. For streaming, trips
+can be planned in windows so results are produced (and released) window by window.
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from django.conf import settings
+from django.db import connections
+
+from routing.services.deadline import Deadline
+from routing.services.timing import timed
+from routing.services.osrm_client import OSRMClient
+from routing.services.geometry import GeometryService
+from routing.services.fuel_planner import FuelPlanner
+
+logger = logging.getLogger(__name__)
+
+Coords = Tuple[float, float]
+
+
+class RoutePair(NamedTuple):
+    start: Coords
+    finish: Coords
+
+
+class TripOutcome(NamedTuple):
+    status: int
+    start: Optional[Coords] = None
+    finish: Optional[Coords] = None
+    route: Optional[dict] = None
+    stops: Optional[list] = None
+    stats: Optional[dict] = None
+    error: Optional[str] = None
+
+
+def error_status(exc: Exception) -> int:
+    """HTTP status the single-trip view would use for this exception."""
+    if isinstance(exc, ValueError):
+        return 400
+    if isinstance(exc, ConnectionError):
+        return 503
+    return 500
+
+
+def location_key(value):
+    """Dedup key: coordinates as-is, strings case- and whitespace-insensitive."""
+    if isinstance(value, tuple):
+        return value
+    return " ".join(value.split()).lower()
+
+
+def _in_thread(func, *args):
+    try:
+        return func(*args)
+    finally:
+        connections.close_all()
+
+
+class BatchRoutePlanner:
+    def __init__(self, resolve: Callable, geocode_workers: Optional[int] = None, route_workers: Optional[int] = None,
+                 deadline: Optional[Deadline] = None):
+        """
+        resolve(value, deadline) -> (lat, lon), raising ValueError/ConnectionError (RoutePlanView.resolve_location).
+        Past `deadline` (e.g. a plan job's timeout) the trips not yet planned fail with 503.
+        """
+        self.resolve = resolve
+        self.deadline = deadline or Deadline(None)
+        self.geocode_workers = geocode_workers or settings.ROUTE_PLAN_BATCH_GEOCODE_WORKERS
+        self.route_workers = route_workers or settings.ROUTE_PLAN_BATCH_ROUTE_WORKERS
+        self.stats: Dict[str, object] = {}
+
+    def _run_parallel(self, func, items, workers) -> Dict[object, object]:
+        """{item: func(item) or the exception it raised} for each distinct item."""
+        results = {}
+        if not items:
+            return results
+        with ThreadPoolExecutor(max_workers=min(workers, len(items))) as pool:
+            futures = {item: pool.submit(_in_thread, func, item) for item in items}
+            for item, future in futures.items():
+                try:
+                    results[item] = future.result()
+                except Exception as e:
+                    results[item] = e
+        return results
+
+    def plan(self, trips: List[dict]) -> List[TripOutcome]:
+        """trips: validated BatchTripSerializer data. Outcomes are in input order."""
+        return [outcome for _, outcome in self.iter_plan(trips)]
+
+    def iter_plan(self, trips: List[dict], window: Optional[int] = None) -> Iterator[Tuple[int, TripOutcome]]:
+        """
+        Yield (position, outcome) in input order, planning `window` trips at a time
+        (default: all at once). Only one window of routes and candidates is held in
+        memory; geocoded coordinates are reused across windows.
+        """
+        started = time.monotonic()
+        window = window or max(1, len(trips))
+        self.stats = {"trips": len(trips), "windows": 0, "distinct_locations": 0, "distinct_routes": 0, "candidate_stations": 0}
+        locations: Dict[object, object] = {}
+        for offset in range(0, len(trips), window):
+            batch = trips[offset:offset + window]
+            if self.deadline.expired():
+                outcomes = [TripOutcome(status=503, error="Deadline exceeded before planning.")] * len(batch)
+            else:
+                outcomes = self._plan_window(batch, locations)
+            self.stats["windows"] += 1
+            self.stats["elapsed_ms"] = round((time.monotonic() - started) * 1000, 1)
+            for i, outcome in enumerate(outcomes):
+                yield offset + i, outcome
+        self.stats["elapsed_ms"] = round((time.monotonic() - started) * 1000, 1)
+
+    def _plan_window(self, trips: List[dict], locations: Dict[object, object]) -> List[TripOutcome]:
+        # 1. Geocode each distinct location once
+        originals = {}
+        for trip in trips:
+            for end in ('start', 'finish'):
+                key = location_key(trip[end])
+                if key not in locations:
+                    originals.setdefault(key, trip[end])
+        with timed("geocode"):
+            locations.update(self._run_parallel(
+                lambda key: self.resolve(originals[key], Deadline(min(settings.GEOCODE_BUDGET_SECONDS, self.deadline.remaining()))),
+                list(originals), self.geocode_workers
+            ))
+
+        # 2. Route each distinct (start, finish) pair once
+        pairs = {}
+        for trip in trips:
+            start, finish = locations[location_key(trip['start'])], locations[location_key(trip['finish'])]
+            if not isinstance(start, Exception) and not isinstance(finish, Exception):
+                pairs.setdefault(RoutePair(start, finish), None)
+        with timed("route"):
+            routes = self._run_parallel(
+                lambda pair: self._route(pair),
+                list(pairs), self.route_workers
+            )
+
+        # 3. One candidate fetch for the union of all corridors
+        decoded = {}
+        for pair, route in routes.items():
+            if isinstance(route, Exception):
+                continue
+            try:
+                decoded[pair] = GeometryService.decode_polyline(route['geometry'])
+            except Exception as e:
+                routes[pair] = e
+        if decoded and self.deadline.expired():
+            expired = ConnectionError("Deadline exceeded before the corridor query.")
+            routes.update({pair: expired for pair in decoded})
+            decoded = {}
+        corridor = max((trip['corridor_miles'] for trip in trips), default=0)
+        grid = FuelPlanner.fetch_union_grid(list(decoded.values()), corridor) if decoded else None
+
+        self.stats["distinct_locations"] = len(locations)
+        self.stats["distinct_routes"] += len(pairs)
+        self.stats["candidate_stations"] += len(grid) if grid is not None else 0
+        return [self._plan_trip(trip, locations, routes, decoded, grid) for trip in trips]
+
+    def _route(self, pair: RoutePair) -> dict:
+        if self.deadline.expired():
+            raise ConnectionError("Deadline exceeded before routing.")
+        return OSRMClient.get_route(pair.start, pair.finish)
+
+    def _plan_trip(self, trip, locations, routes, decoded, grid) -> TripOutcome:
+        start = locations[location_key(trip['start'])]
+        finish = locations[location_key(trip['finish'])]
+        for coords in (start, finish):
+            if isinstance(coords, Exception):
+                return TripOutcome(status=error_status(coords), error=str(coords))
+
+        pair = RoutePair(start, finish)
+        route = routes[pair]
+        if isinstance(route, Exception):
+            return TripOutcome(status=error_status(route), start=start, finish=finish, error=str(route))
+
+        try:
+            planner = FuelPlanner(
+                route_points_lat_lon=decoded[pair],
+                total_distance_meters=route['distance'],
+                corridor_miles=trip['corridor_miles']
+            )
+            stops, stats = planner.plan_with_grid(grid)
+        except Exception as e:
+            logger.exception("Batch trip planning failed")
+            return TripOutcome(status=error_status(e), start=start, finish=finish, error=str(e))
+
+        if stops is None:
+            return TripOutcome(status=422, start=start, finish=finish, error=stats)
+        return TripOutcome(status=200, start=start, finish=finish, route=route, stops=stops, stats=stats)
@@ -0,0 +1,192 @@
+"""
+Per-stage concurrency bulkheads with admission control.
+
+Each planning stage (geocode, route, corridor, plan) gets its own concurrency
+limit per worker process, so a slow dependency can only tie up its own slots
+instead of every request thread. A request waits for a slot for at most the
+stage's queue budget, and never longer than its deadline allows; if the stage's
+recent service time no longer fits in what is left of the deadline, or the
+queue is already full, the request is shed at once with a 503 instead of
+timing out later.
+"""
+import contextvars
+import math
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from routing.services.metrics import REGISTRY
+from routing.services.timing import timed
+
+IN_FLIGHT = REGISTRY.gauge("bulkhead_in_flight", "Requests currently executing a stage")
+QUEUE_DEPTH = REGISTRY.gauge("bulkhead_queue_depth", "Requests waiting for a stage slot")
+SHED = REGISTRY.counter("bulkhead_shed_total", "Requests rejected by stage admission control")
+QUEUE_WAIT_SECONDS = REGISTRY.histogram("bulkhead_queue_wait_seconds", "Time spent waiting for a stage slot")
+SERVICE_SECONDS = REGISTRY.histogram("bulkhead_service_seconds", "Time spent executing a stage once admitted")
+
+SHED_QUEUE_FULL = "queue_full"
+SHED_QUEUE_TIMEOUT = "queue_timeout"
+SHED_DEADLINE = "deadline"
+
+
+class LoadShedError(ConnectionError):
+    """A stage refused the request; the view answers 503 with Retry-After."""
+
+    def __init__(self, message: str, stage: str, reason: str, retry_after: int):
+        super().__init__(message)
+        self.stage = stage
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Bulkhead:
+    def __init__(self, name: str, max_concurrent: int = 8, max_queue: int = 32, max_wait_s: float = 2.0,
+                 retry_after_s: int = 2):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait_s = max_wait_s
+        self.retry_after_s = retry_after_s
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._running = 0
+
+    def expected_service_s(self) -> float:
+        """Median recent service time of this stage (0 until there is data)."""
+        return SERVICE_SECONDS.percentile(50, stage=self.name) or 0.0
+
+    def _shed(self, reason: str, detail: str):
+        SHED.inc(stage=self.name, reason=reason)
+        retry_after = max(1, math.ceil(self.retry_after_s))
+        raise LoadShedError(
+            f"Service is overloaded ({self.name}: {detail}). Retry in {retry_after}s.",
+            stage=self.name, reason=reason, retry_after=retry_after,
+        )
+
+    def _admit(self, deadline=None):
+        wait_budget = self.max_wait_s
+        if deadline is not None:
+            spare = deadline.remaining() - self.expected_service_s()
+            if spare <= 0:
+                self._shed(SHED_DEADLINE, "not enough time left in the request deadline")
+            wait_budget = min(wait_budget, spare)
+
+        # Fast path: a free slot, no queueing
+        if self._slots.acquire(blocking=False):
+            QUEUE_WAIT_SECONDS.observe(0.0, stage=self.name)
+            return
+
+        with self._lock:
+            if self._waiting >= self.max_queue:
+                full = True
+            else:
+                full = False
+                self._waiting += 1
+                QUEUE_DEPTH.set(self._waiting, stage=self.name)
+        if full:
+            self._shed(SHED_QUEUE_FULL, "queue full")
+
+        started = time.monotonic()
+        try:
+            admitted = self._slots.acquire(timeout=max(0.0, wait_budget))
+        finally:
+            with self._lock:
+                self._waiting -= 1
+                QUEUE_DEPTH.set(self._waiting, stage=self.name)
+        QUEUE_WAIT_SECONDS.observe(time.monotonic() - started, stage=self.name)
+        if not admitted:
+            self._shed(SHED_QUEUE_TIMEOUT, "no slot within the queue budget")
+
+    @contextmanager
+    def slot(self, deadline=None):
+        self._admit(deadline)
+        with self._lock:
+            self._running += 1
+            IN_FLIGHT.set(self._running, stage=self.name)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            SERVICE_SECONDS.observe(time.monotonic() - started, stage=self.name)
+            with self._lock:
+                self._running -= 1
+                IN_FLIGHT.set(self._running, stage=self.name)
+            self._slots.release()
+
+
+_bulkheads: Dict[str, Optional[Bulkhead]] = {}
+_bulkheads_lock = threading.Lock()
+_exempt: contextvars.ContextVar = contextvars.ContextVar("bulkhead_exempt", default=False)
+
+
+def get_bulkhead(stage: str) -> Optional[Bulkhead]:
+    """Process-wide bulkhead for a stage, or None if settings.STAGE_BULKHEADS has no entry for it."""
+    with _bulkheads_lock:
+        if stage not in _bulkheads:
+            conf = getattr(settings, "STAGE_BULKHEADS", {}).get(stage)
+            _bulkheads[stage] = Bulkhead(stage, **conf) if conf else None
+        return _bulkheads[stage]
+
+
+@contextmanager
+def exempt():
+    """
+    Skip admission for the stages run in this block (queued plan jobs, bounded by
+    the worker's own concurrency). A stage entered after the deadline still fails.
+    """
+    token = _exempt.set(True)
+    try:
+        yield
+    finally:
+        _exempt.reset(token)
+
+
+def _admission(name: str, deadline) -> Optional[Bulkhead]:
+    """The bulkhead that admits a stage, or None to run it at once."""
+    if not _exempt.get():
+        return get_bulkhead(name)
+    if deadline is not None and deadline.expired():
+        SHED.inc(stage=name, reason=SHED_DEADLINE)
+        raise LoadShedError(f"Deadline exceeded before the {name} stage.", stage=name, reason=SHED_DEADLINE,
+                            retry_after=1)
+    return None
+
+
+@contextmanager
+def stage(name: str, deadline=None):
+    """
+    Run a block inside the stage's bulkhead (no admission control for unconfigured
+    stages or inside exempt()). Either way the block is timed as stage `name`,
+    queue wait included.
+    """
+    bulkhead = _admission(name, deadline)
+    with timed(name):
+        if bulkhead is None:
+            yield
+            return
+        with bulkhead.slot(deadline):
+            yield
+
+
+@asynccontextmanager
+async def astage(name: str, deadline=None):
+    """
+    stage() for coroutines (the async view's OSRM call): the wait for a slot
+    happens on a worker thread, so a full bulkhead never blocks the event loop.
+    """
+    bulkhead = _admission(name, deadline)
+    with timed(name):
+        if bulkhead is None:
+            yield
+            return
+        slot = bulkhead.slot(deadline)
+        await sync_to_async(slot.__enter__, thread_sensitive=False)()
+        try:
+            yield
+        finally:
+            slot.__exit__(None, None, None)
@@ -0,0 +1,167 @@
+"""
+Per-provider circuit breakers (closed / open / half-open).
+
+State lives in the Django cache (Redis in deployment), so every API worker and
+import process sees the same breaker. Failures are counted in short time buckets
+and the breaker opens once the failure rate over the window crosses the
+threshold. After `open_s` a single probe call is let through (half-open):
+success closes the breaker, failure re-opens it.
+
+If the cache itself is unavailable the breaker fails open (calls are allowed).
+"""
+import time
+import logging
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+from routing.services.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+_STATE_VALUES = {CLOSED: 0, OPEN: 1, HALF_OPEN: 2}
+
+BREAKER_STATE = REGISTRY.gauge(
+    "circuit_breaker_state", "Last observed breaker state in this process (0=closed, 1=open, 2=half_open)"
+)
+BREAKER_TRANSITIONS = REGISTRY.counter(
+    "circuit_breaker_transitions_total", "Breaker state changes made by this process"
+)
+BREAKER_SHORT_CIRCUITS = REGISTRY.counter(
+    "circuit_breaker_short_circuits_total", "Calls skipped because the breaker was open"
+)
+BREAKER_SAVED_SECONDS = REGISTRY.counter(
+    "circuit_breaker_saved_seconds_total", "Upper bound of wait time avoided by failing fast (timeout of each skipped call)"
+)
+
+
+class CircuitOpenError(ConnectionError):
+    pass
+
+
+class CircuitBreaker:
+    BUCKETS = 6
+
+    def __init__(self, name: str, failure_rate: float = 0.5, min_calls: int = 10,
+                 window_s: float = 60, open_s: float = 30, timeout_hint_s: float = 0):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window_s = window_s
+        self.open_s = open_s
+        # Typical time a call to this provider burns when it is down (for savings metrics)
+        self.timeout_hint_s = timeout_hint_s
+        self.bucket_s = max(1.0, window_s / self.BUCKETS)
+
+    # --- keys ---
+
+    def _key(self, suffix: str) -> str:
+        return f"cb:{self.name}:{suffix}"
+
+    def _bucket_keys(self, now: float):
+        current = int(now // self.bucket_s)
+        return [(self._key(f"ok:{b}"), self._key(f"fail:{b}")) for b in range(current - self.BUCKETS + 1, current + 1)]
+
+    # --- state ---
+
+    def state(self) -> str:
+        try:
+            opened_at = cache.get(self._key("opened_at"))
+        except Exception:
+            return CLOSED
+        if opened_at is None:
+            return CLOSED
+        if time.time() - opened_at < self.open_s:
+            return OPEN
+        return HALF_OPEN
+
+    def allow(self) -> bool:
+        state = self.state()
+        BREAKER_STATE.set(_STATE_VALUES[state], breaker=self.name)
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN:
+            # Exactly one probe across all processes; it expires if the prober dies.
+            try:
+                if cache.add(self._key("probe"), 1, timeout=max(1, int(self.timeout_hint_s or self.open_s))):
+                    return True
+            except Exception:
+                return True
+        BREAKER_SHORT_CIRCUITS.inc(breaker=self.name)
+        if self.timeout_hint_s:
+            BREAKER_SAVED_SECONDS.inc(self.timeout_hint_s, breaker=self.name)
+        return False
+
+    def _incr(self, key: str):
+        ttl = int(self.window_s + self.bucket_s) + 1
+        cache.add(key, 0, timeout=ttl)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Expired between add and incr
+            cache.set(key, 1, timeout=ttl)
+
+    def _transition(self, to: str):
+        BREAKER_TRANSITIONS.inc(breaker=self.name, to=to)
+        BREAKER_STATE.set(_STATE_VALUES[to], breaker=self.name)
+        logger.warning(f"Circuit breaker '{self.name}' -> {to}")
+
+    def record_success(self):
+        try:
+            now = time.time()
+            self._incr(self._bucket_keys(now)[-1][0])
+            if cache.get(self._key("opened_at")) is not None:
+                cache.delete_many([self._key("opened_at"), self._key("probe")])
+                self._reset_window(now)
+                self._transition(CLOSED)
+        except Exception as e:
+            logger.debug(f"Circuit breaker '{self.name}' unavailable: {e}")
+
+    def record_failure(self):
+        try:
+            now = time.time()
+            self._incr(self._bucket_keys(now)[-1][1])
+            state = self.state()
+            if state == HALF_OPEN:
+                self._open(now)
+            elif state == CLOSED:
+                ok, failed = self.window_counts(now)
+                total = ok + failed
+                if total >= self.min_calls and failed / total >= self.failure_rate:
+                    self._open(now)
+        except Exception as e:
+            logger.debug(f"Circuit breaker '{self.name}' unavailable: {e}")
+
+    def _open(self, now: float):
+        cache.set(self._key("opened_at"), now, timeout=int(self.open_s * 10))
+        cache.delete(self._key("probe"))
+        self._transition(OPEN)
+
+    def _reset_window(self, now: float):
+        cache.delete_many([k for pair in self._bucket_keys(now) for k in pair])
+
+    def window_counts(self, now: Optional[float] = None):
+        keys = self._bucket_keys(now or time.time())
+        values = cache.get_many([k for pair in keys for k in pair])
+        ok = sum(values.get(k_ok, 0) for k_ok, _ in keys)
+        failed = sum(values.get(k_fail, 0) for _, k_fail in keys)
+        return ok, failed
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(name: str, timeout_hint_s: float = 0) -> CircuitBreaker:
+    """Process-wide breaker instance for `name`, configured from settings.CIRCUIT_BREAKERS."""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        conf = dict(getattr(settings, "CIRCUIT_BREAKER_DEFAULTS", {}))
+        conf.update(getattr(settings, "CIRCUIT_BREAKERS", {}).get(name, {}))
+        conf.setdefault("timeout_hint_s", timeout_hint_s)
+        breaker = _breakers.setdefault(name, CircuitBreaker(name, **conf))
+    return breaker
@@ -0,0 +1,154 @@
+"""
+In-memory linear referencing of stations against a decoded route.
+
+Mirrors what the planner's PostGIS query does per request (ST_DWithin +
+ST_LineLocatePoint) for stations that are already in memory, e.g. one candidate
+fetch shared by several routes. Route segments are bucketed in a lat/lon grid so
+each station is only compared with nearby segments. Distances use a local
+equirectangular approximation, which is accurate well within corridor widths.
+
+No Django imports: usable from benchmarks and worker processes.
+"""
+import bisect
+import math
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+EARTH_RADIUS_MILES = 3958.7613
+MILES_PER_DEG_LAT = math.pi * EARTH_RADIUS_MILES / 180.0
+
+
+def haversine_miles(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dlat = p2 - p1
+    dlon = math.radians(lon2 - lon1)
+    a = math.sin(dlat / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * math.asin(min(1.0, math.sqrt(a)))
+
+
+class RouteIndex:
+    def __init__(self, route_points: Sequence[Tuple[float, float]], cell_deg: float = 0.25):
+        """route_points: (lat, lon) vertices as returned by GeometryService.decode_polyline."""
+        points = list(route_points)
+        if len(points) == 1:
+            points = points * 2
+        self.lats = [p[0] for p in points]
+        self.lons = [p[1] for p in points]
+        self.cell_deg = cell_deg
+
+        # Cumulative distance (miles) at each vertex
+        self.cum = [0.0]
+        for i in range(1, len(points)):
+            self.cum.append(self.cum[-1] + haversine_miles(self.lats[i - 1], self.lons[i - 1], self.lats[i], self.lons[i]))
+        self.length_miles = self.cum[-1]
+
+        self._grid: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        for i in range(len(points) - 1):
+            for cell in self._cells(min(self.lats[i], self.lats[i + 1]), max(self.lats[i], self.lats[i + 1]),
+                                    min(self.lons[i], self.lons[i + 1]), max(self.lons[i], self.lons[i + 1])):
+                self._grid[cell].append(i)
+
+    def _cells(self, lat_min, lat_max, lon_min, lon_max):
+        c = self.cell_deg
+        for ci in range(math.floor(lat_min / c), math.floor(lat_max / c) + 1):
+            for cj in range(math.floor(lon_min / c), math.floor(lon_max / c) + 1):
+                yield ci, cj
+
+    def locate(self, lat: float, lon: float, max_off_miles: float) -> Optional[Tuple[float, float]]:
+        """
+        (miles along the route, miles off the route) for the closest point of the
+        route, or None if the route never comes within max_off_miles.
+        """
+        kx = MILES_PER_DEG_LAT * math.cos(math.radians(lat))
+        dlat = max_off_miles / MILES_PER_DEG_LAT
+        dlon = max_off_miles / max(kx, 1e-6)
+
+        segments = set()
+        for cell in self._cells(lat - dlat, lat + dlat, lon - dlon, lon + dlon):
+            segments.update(self._grid.get(cell, ()))
+        if not segments:
+            return None
+
+        best_off = None
+        best_along = 0.0
+        for i in segments:
+            # Segment endpoints in miles, relative to the station
+            ax = (self.lons[i] - lon) * kx
+            ay = (self.lats[i] - lat) * MILES_PER_DEG_LAT
+            bx = (self.lons[i + 1] - lon) * kx
+            by = (self.lats[i + 1] - lat) * MILES_PER_DEG_LAT
+            dx, dy = bx - ax, by - ay
+            seg2 = dx * dx + dy * dy
+            t = 0.0 if seg2 == 0 else max(0.0, min(1.0, -(ax * dx + ay * dy) / seg2))
+            px, py = ax + t * dx, ay + t * dy
+            off = math.hypot(px, py)
+            if best_off is None or off < best_off:
+                best_off = off
+                best_along = self.cum[i] + t * (self.cum[i + 1] - self.cum[i])
+
+        if best_off is None or best_off > max_off_miles:
+            return None
+        return best_along, best_off
+
+    def fraction(self, along_miles: float) -> float:
+        """Position along the route as a 0..1 fraction (like ST_LineLocatePoint)."""
+        return along_miles / self.length_miles if self.length_miles else 0.0
+
+    def slice(self, start_fraction: float, end_fraction: float) -> List[Tuple[float, float]]:
+        """(lat, lon) vertices of the part of the route between two fractions, endpoints interpolated."""
+        points = [self._point_at(start_fraction * self.length_miles)]
+        start = bisect.bisect_right(self.cum, start_fraction * self.length_miles)
+        end = bisect.bisect_left(self.cum, end_fraction * self.length_miles)
+        points.extend((self.lats[i], self.lons[i]) for i in range(start, end))
+        points.append(self._point_at(end_fraction * self.length_miles))
+        return points
+
+    def _point_at(self, along_miles: float) -> Tuple[float, float]:
+        i = min(max(bisect.bisect_right(self.cum, along_miles) - 1, 0), len(self.cum) - 2)
+        span = self.cum[i + 1] - self.cum[i]
+        t = 0.0 if span == 0 else max(0.0, min(1.0, (along_miles - self.cum[i]) / span))
+        return (self.lats[i] + t * (self.lats[i + 1] - self.lats[i]),
+                self.lons[i] + t * (self.lons[i + 1] - self.lons[i]))
+
+
+def locate_stations(index: RouteIndex, stations: Iterable[dict], max_off_miles: float) -> List[Tuple[dict, float, float]]:
+    """
+    (station, fraction along route, miles off route) for stations with 'lat'/'lon'
+    inside the corridor, ordered by position along the route.
+    """
+    located = []
+    for station in stations:
+        hit = index.locate(station['lat'], station['lon'], max_off_miles)
+        if hit is not None:
+            along, off = hit
+            located.append((station, index.fraction(along), off))
+    located.sort(key=lambda item: item[1])
+    return located
+
+
+class StationGrid:
+    """Stations (dicts with 'lat'/'lon') bucketed in the same grid as RouteIndex."""
+
+    def __init__(self, stations: Iterable[dict], cell_deg: float = 0.25):
+        self.cell_deg = cell_deg
+        self.stations = list(stations)
+        self._cells: Dict[Tuple[int, int], List[dict]] = defaultdict(list)
+        for station in self.stations:
+            self._cells[(math.floor(station['lat'] / cell_deg), math.floor(station['lon'] / cell_deg))].append(station)
+
+    def __len__(self):
+        return len(self.stations)
+
+    def near(self, index: RouteIndex, max_off_miles: float) -> List[dict]:
+        """Stations in grid cells within max_off_miles of the route (a superset of the corridor)."""
+        if index.cell_deg != self.cell_deg:
+            raise ValueError("RouteIndex and StationGrid must use the same cell size")
+        max_lat = max(abs(v) for v in index.lats)
+        reach_lat = math.ceil(max_off_miles / MILES_PER_DEG_LAT / self.cell_deg)
+        reach_lon = math.ceil(max_off_miles / (MILES_PER_DEG_LAT * max(math.cos(math.radians(max_lat)), 0.01)) / self.cell_deg)
+        cells = set()
+        for ci, cj in index._grid:
+            for di in range(-reach_lat, reach_lat + 1):
+                for dj in range(-reach_lon, reach_lon + 1):
+                    cells.add((ci + di, cj + dj))
+        return [s for cell in cells for s in self._cells.get(cell, ())]
@@ -0,0 +1,37 @@
+import time
+from typing import Optional
+
+
+class Deadline:
+    """
+    A latency budget that flows down into every outbound call.
+    Callers derive per-call timeouts from it instead of using fixed ones.
+    """
+    # Below this there is no point starting a network call
+    MIN_TIMEOUT_S = 0.05
+
+    def __init__(self, budget_s: Optional[float]):
+        self.budget_s = budget_s
+        self.started = time.monotonic()
+        self.expires_at = None if budget_s is None else self.started + budget_s
+
+    def remaining(self) -> float:
+        if self.expires_at is None:
+            return float("inf")
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def expired(self) -> bool:
+        return self.remaining() < self.MIN_TIMEOUT_S
+
+    def timeout(self, cap: Optional[float] = None) -> Optional[float]:
+        """Per-call timeout: the remaining budget, capped by the call's own limit."""
+        remaining = self.remaining()
+        if cap is None:
+            return None if remaining == float("inf") else remaining
+        return min(cap, remaining)
+
+    def __repr__(self):
+        return f"Deadline(budget_s={self.budget_s}, remaining={self.remaining():.3f})"
@@ -1,20 +1,75 @@
+import math
+from bisect import bisect_right
+from collections import defaultdict
 from decimal import Decimal
-from django.contrib.gis.geos import LineString
+from functools import cached_property
+from typing import NamedTuple, Optional
+from django.contrib.gis.db.models.functions import Distance
+from django.contrib.gis.geos import LineString, MultiLineString
 from django.contrib.gis.measure import D
 from routing.models import FuelStation
+from routing.services.bulkhead import stage
+from routing.services.metrics import PLAN_CANDIDATES
+from routing.services.corridor import RouteIndex, StationGrid, locate_stations
 from routing.services.geometry import GeometryService
+from routing.services.stations import SNAPSHOT_FIELDS, snapshot_row
+
+MILES_PER_METER = 1 / 1609.344
+
+
+class Scenario(NamedTuple):
+    """One what-if for plan_scenarios: a vehicle profile, its fuel on board and a corridor width."""
+    mpg: float = 10
+    tank_gallons: float = 50
+    start_fuel_gallons: Optional[float] = None  # None: full tank
+    reserve_gallons: float = 0  # never planned below this
+    corridor_miles: float = 10
+
 
 class FuelPlanner:
     VEHICLE_MPG = 10
     MAX_RANGE_MILES = 500
     TANK_CAPACITY_GALLONS = MAX_RANGE_MILES / VEHICLE_MPG  # 50 gallons
 
-    def __init__(self, route_points_lat_lon, total_distance_meters, corridor_miles=10):
+    def __init__(self, route_points_lat_lon, total_distance_meters, corridor_miles=10, deadline=None,
+                 mpg=None, tank_gallons=None, reserve_gallons=0):
         self.route_points = route_points_lat_lon
         self.total_distance_meters = total_distance_meters
         self.corridor_miles = corridor_miles
-        # Precompute route line
-        self.route_linestring = GeometryService.point_to_linestring(self.route_points)
+        # Request deadline used for stage admission control (see bulkhead.stage)
+        self.deadline = deadline
+        # Located stations the last plan was solved over (kept for plan contexts)
+        self.candidates = None
+        # Adaptive corridor report (see plan_adaptive)
+        self.corridor_segments = None
+        self.corridor_fetches = 0
+        # (from, to) miles of the stretch the last solve() could not get across
+        self.dead_end = None
+        # Vehicle profile; the reserve is never burned, so the usable range excludes it
+        self.mpg = mpg or self.VEHICLE_MPG
+        self.reserve_gallons = reserve_gallons
+        tank_gallons = tank_gallons or self.TANK_CAPACITY_GALLONS
+        self.max_range_miles = max(0.0, tank_gallons - reserve_gallons) * self.mpg
+
+    @cached_property
+    def route_linestring(self):
+        # Only the PostGIS path needs a GEOS line; in-memory planning skips building it
+        return GeometryService.point_to_linestring(self.route_points)
+
+    # Stations are planned from plain dicts (see station_entry) so candidates can
+    # come from the per-route PostGIS query or from a shared, prefetched set.
+    STATION_FIELDS = SNAPSHOT_FIELDS
+
+    # Shared corridor fetches query a simplified union of the routes; the
+    # simplification tolerance (degrees) is covered by padding the radius.
+    UNION_SIMPLIFY_DEG = 0.01
+    UNION_PAD_MILES = 1.0
+
+    # Adaptive corridors (plan_adaptive): the route is split into segments that
+    # start this narrow and double, up to corridor_miles, only where the solver
+    # hits a dead end (a stretch longer than one tank between stations).
+    ADAPTIVE_START_MILES = 5
+    ADAPTIVE_SEGMENT_MILES = 100
 
     def plan_fuel_stops(self):
         """
@@ -23,54 +78,282 @@ class FuelPlanner:
             - stops: List of stop details
             - stats: total_cost, total_gallons
         """
-        
-        # 1. Fetch Candidate Stations
-        # This can be heavy, but ST_DWithin is efficient locally.
-        # Ensure we cover the whole route corridor.
-        candidates = FuelStation.objects.filter(
-            location__dwithin=(self.route_linestring, D(mi=self.corridor_miles))
-        ).values(
-            'id', 'opis_id', 'name', 'address', 'city', 'state', 'retail_price', 'location'
-        )
-
-        # 2. Map candidates to "distance from start"
-        # We need to project each station onto the route to know "where" it is linearly.
-        # PostGIS ST_LineLocatePoint gives a fraction (0.0 to 1.0).
-        # We can do this in Python or DB. DB is cleaner but we already have objects.
-        # Let's do a hybrid or DB query annotation for 'fraction'.
-        
-        # Re-query with annotation is better for accuracy
-        candidates_with_pos = FuelStation.objects.filter(
-            location__dwithin=(self.route_linestring, D(mi=self.corridor_miles))
+        with stage("corridor", self.deadline):
+            self.candidates = self.fetch_candidates()
+        with stage("plan", self.deadline):
+            return self.solve(self.candidates)
+
+    def plan_adaptive(self):
+        """
+        plan_fuel_stops with a corridor that is only as wide as each stretch of the
+        route needs (corridor_miles is the widest it may get): segments are widened
+        only while the plan dead-ends on them, and fetched again on their own. Per-segment widths and candidate counts are left in
+        self.corridor_segments, the number of corridor queries in self.corridor_fetches.
+        """
+        total_dist_miles = GeometryService.meters_to_miles(self.total_distance_meters)
+        count = max(1, math.ceil(total_dist_miles / self.ADAPTIVE_SEGMENT_MILES))
+        bounds = [total_dist_miles * i / count for i in range(count + 1)]
+        widths = [min(self.ADAPTIVE_START_MILES, self.corridor_miles)] * count
+
+        with stage("corridor", self.deadline):
+            candidates = self.fetch_candidates(widths[0])
+        self.corridor_fetches = 1
+        while True:
+            with stage("plan", self.deadline):
+                stops, stats = self.solve(candidates)
+            counts = [0] * count
+            for c in candidates:
+                counts[min(count - 1, int(c['dist'] / total_dist_miles * count) if total_dist_miles else 0)] += 1
+            if stops is not None:
+                break
+            # Sparse but crossable segments keep their width; only the dead end's do not
+            widen = self._gap_segments(candidates, bounds)
+            if self.dead_end is not None:
+                a, b = self.dead_end
+                widen.update(i for i in range(count) if bounds[i] < b and bounds[i + 1] > a)
+            widen = sorted(i for i in widen if widths[i] < self.corridor_miles)
+            if not widen:
+                break
+
+            by_width = defaultdict(list)
+            for i in widen:
+                widths[i] = min(self.corridor_miles, widths[i] * 2)
+                by_width[widths[i]].append(i)
+            known = {c['id'] for c in candidates}
+            with stage("corridor", self.deadline):
+                for width, segments in by_width.items():
+                    spans = []
+                    for i in segments:
+                        if spans and spans[-1][1] == bounds[i]:
+                            spans[-1] = (spans[-1][0], bounds[i + 1])
+                        else:
+                            spans.append((bounds[i], bounds[i + 1]))
+                    for c in self.fetch_span_candidates(spans, width):
+                        if c['id'] not in known:
+                            known.add(c['id'])
+                            candidates.append(c)
+                    self.corridor_fetches += 1
+            candidates.sort(key=lambda c: c['dist'])
+
+        self.candidates = candidates
+        self.corridor_segments = [
+            {"from_miles": round(bounds[i], 1), "to_miles": round(bounds[i + 1], 1),
+             "width_miles": widths[i], "candidates": counts[i]}
+            for i in range(count)
+        ]
+        return stops, stats
+
+    def _gap_segments(self, candidates, bounds):
+        """Segments overlapping a stretch between stations (or the trip ends) longer than the range."""
+        positions = [0.0] + [c['dist'] for c in candidates] + [bounds[-1]]
+        gaps = [(a, b) for a, b in zip(positions, positions[1:]) if b - a > self.max_range_miles]
+        return {i for i in range(len(bounds) - 1) for a, b in gaps if bounds[i] < b and bounds[i + 1] > a}
+
+    def plan_with_grid(self, grid):
+        """Plan against a prefetched StationGrid (see fetch_union_grid) instead of querying."""
+        self.candidates = self.candidates_from_grid(grid)
+        return self.solve(self.candidates)
+
+    @staticmethod
+    def station_entry(row, dist_from_start, off_route_miles=None):
+        """row: a FuelStation .values() row, or a snapshot row with 'lat'/'lon'."""
+        if 'lat' in row:
+            lat, lon = row['lat'], row['lon']
+        else:
+            lat, lon = row['location'].y, row['location'].x
+        return {
+            'id': row['opis_id'],
+            'dist': dist_from_start,
+            'price': float(row['retail_price']),
+            'name': row['name'],
+            'address': row['address'],
+            'city': row['city'],
+            'state': row['state'],
+            'lat': lat,
+            'lon': lon,
+            'off': off_route_miles,
+            'cluster': row.get('cluster_id'),
+        }
+
+    def off_route(self, station, max_off_miles):
+        """Miles off the route of a candidate, located against the route if its 'off' is unknown."""
+        if station.get('off') is not None:
+            return station['off']
+        hit = self.route_index.locate(station['lat'], station['lon'], max_off_miles)
+        # It was fetched within max_off_miles, so at worst it sits on the corridor's edge
+        return hit[1] if hit is not None else max_off_miles
+
+    @staticmethod
+    def compact_clusters(stations):
+        """
+        Stations (ordered by 'dist') with each cluster (see station_clusters)
+        reduced to its nearest member and the members cheaper than every nearer
+        one, and all members by cluster. However far the truck can reach into a
+        cluster, its cheapest reachable member is kept.
+        """
+        kept, members, lowest = [], defaultdict(list), {}
+        for s in stations:
+            cluster = s.get('cluster')
+            if cluster is None:
+                kept.append(s)
+                continue
+            members[cluster].append(s)
+            if cluster not in lowest or s['price'] < lowest[cluster]:
+                lowest[cluster] = s['price']
+                kept.append(s)
+        return kept, {cluster: group for cluster, group in members.items() if len(group) > 1}
+
+    @cached_property
+    def route_index(self):
+        return RouteIndex(self.route_points)
+
+    def fetch_candidates(self, corridor_miles=None):
+        """Stations within the corridor, ordered by position along the route (one query)."""
+        return self._located_stations(self.route_linestring, corridor_miles or self.corridor_miles)
+
+    def fetch_span_candidates(self, spans, corridor_miles):
+        """Like fetch_candidates, for only the given (from, to) mile ranges of the route."""
+        total_dist_miles = GeometryService.meters_to_miles(self.total_distance_meters)
+        lines = [
+            GeometryService.point_to_linestring(self.route_index.slice(a / total_dist_miles, b / total_dist_miles))
+            for a, b in spans
+        ]
+        return self._located_stations(MultiLineString(lines, srid=4326), corridor_miles)
+
+    def _located_stations(self, near, corridor_miles):
+        # PostGIS ST_LineLocatePoint gives a fraction (0.0 to 1.0) of the route
+        # for each station inside the ST_DWithin corridor, and ST_Distance how far
+        # off the route it is (so narrower corridors can be filtered in Python).
+        rows = FuelStation.objects.filter(
+            location__dwithin=(near, D(mi=corridor_miles))
         ).annotate(
             fraction=models.Func(
                 models.Value(self.route_linestring.wkt),
                 models.F('location'),
                 function='ST_LineLocatePoint',
                 output_field=models.FloatField()
-            )
-        ).order_by('fraction')
+            ),
+            off_route=Distance('location', self.route_linestring),
+        ).order_by('fraction').values(*self.STATION_FIELDS, 'fraction', 'off_route')
 
-        # Convert queryset to list of dicts for processing
-        stations = []
         total_dist_miles = GeometryService.meters_to_miles(self.total_distance_meters)
-        
-        for cand in candidates_with_pos:
-            dist_from_start = cand.fraction * total_dist_miles
-            stations.append({
-                'obj': cand,
-                'dist': dist_from_start,
-                'price': float(cand.retail_price),
-                'id': cand.opis_id,
-            })
-            
+        return [
+            self.station_entry(row, row['fraction'] * total_dist_miles, row['off_route'].m * MILES_PER_METER)
+            for row in rows
+        ]
+
+    def candidates_from_grid(self, grid):
+        """Same candidates as fetch_candidates, linear-referenced in Python."""
+        index = RouteIndex(self.route_points, cell_deg=grid.cell_deg)
+        total_dist_miles = GeometryService.meters_to_miles(self.total_distance_meters)
+        return [
+            self.station_entry(row, fraction * total_dist_miles, off)
+            for row, fraction, off in locate_stations(index, grid.near(index, self.corridor_miles), self.corridor_miles)
+        ]
+
+    @classmethod
+    def fetch_union_grid(cls, routes_points, corridor_miles):
+        """
+        One candidate fetch for several routes: stations within corridor_miles of any
+        of them, bucketed in a StationGrid that each planner then filters in Python.
+        """
+        lines = []
+        for points in routes_points:
+            line = GeometryService.point_to_linestring(points if len(points) > 1 else list(points) * 2)
+            simplified = line.simplify(cls.UNION_SIMPLIFY_DEG, preserve_topology=False)
+            lines.append(line if simplified.empty else simplified)
+        if not lines:
+            return StationGrid([])
+        union = MultiLineString(lines, srid=4326)
+        rows = FuelStation.objects.filter(
+            location__dwithin=(union, D(mi=corridor_miles + cls.UNION_PAD_MILES))
+        ).values(*cls.STATION_FIELDS)
+        return StationGrid(snapshot_row(row) for row in rows)
+
+    @classmethod
+    def plan_alternatives(cls, routes, corridor_miles=10, deadline=None):
+        """
+        Plan several candidate routes for one trip with a single corridor query.
+        routes: [(route_points_lat_lon, total_distance_meters)].
+        Returns the planners and their [(stops, stats)] in route order; infeasible
+        routes have stops None.
+        """
+        planners = [cls(points, distance, corridor_miles, deadline) for points, distance in routes]
+        with stage("corridor", deadline):
+            grid = cls.fetch_union_grid([points for points, _ in routes], corridor_miles)
+        with stage("plan", deadline):
+            return planners, [planner.plan_with_grid(grid) for planner in planners]
+
+    @classmethod
+    def plan_scenarios(cls, route_points, total_distance_meters, scenarios, deadline=None):
+        """
+        Plan one route for several Scenarios with a single corridor query at the
+        widest corridor; each scenario keeps the candidates within its own width.
+        Returns the candidate count and (stops, stats) of each scenario, in order.
+        """
+        widest = max(scenario.corridor_miles for scenario in scenarios)
+        with stage("corridor", deadline):
+            fetcher = cls(route_points, total_distance_meters, widest, deadline)
+            candidates = fetcher.fetch_candidates()
+            offs = [fetcher.off_route(c, widest) for c in candidates]
+        results = []
+        with stage("plan", deadline):
+            for scenario in scenarios:
+                planner = cls(
+                    route_points, total_distance_meters, scenario.corridor_miles, deadline,
+                    mpg=scenario.mpg, tank_gallons=scenario.tank_gallons, reserve_gallons=scenario.reserve_gallons,
+                )
+                stations = [c for c, off in zip(candidates, offs) if off <= scenario.corridor_miles]
+                results.append((len(stations), planner.solve(stations, start_fuel_gallons=scenario.start_fuel_gallons)))
+        return results
+
+    def solve(self, stations, start_miles=0.0, start_fuel_gallons=None):
+        """
+        Greedy plan over candidate station dicts ordered by 'dist'.
+        A replan starts `start_miles` into the route with `start_fuel_gallons` in
+        the tank (default: at the start, full); stop distances stay measured from
+        the start of the route.
+        """
+        # Co-located stations only differ in price: stops are picked among the cheapest
+        # reachable of each cluster. A dropped member stands in for the member kept
+        # instead of it (the nearer, cheaper one) when that one is behind the truck or
+        # has no next stop in range.
+        compacted, co_located = self.compact_clusters(stations)
+        PLAN_CANDIDATES.observe(len(compacted))
+        kept = {s['id'] for s in compacted}
+        keeper_of = {}
+        for members in co_located.values():
+            keeper = None
+            for member in members:
+                if member['id'] in kept:
+                    keeper = member
+                else:
+                    keeper_of[member['id']] = keeper
+        return self._greedy(stations, kept, keeper_of, co_located, start_miles, start_fuel_gallons)
+
+    def _greedy(self, stations, kept, keeper_of, co_located, start_miles, start_fuel_gallons):
+        self.dead_end = None
+        total_dist_miles = GeometryService.meters_to_miles(self.total_distance_meters)
+
         # 3. Greedy Algorithm
-        current_pos = 0.0
-        current_fuel_miles = self.MAX_RANGE_MILES # Start full
+        current_pos = start_miles
+        current_fuel_miles = self.max_range_miles # Start full
+        if start_fuel_gallons is not None:
+            usable_gallons = max(0.0, start_fuel_gallons - self.reserve_gallons)
+            current_fuel_miles = min(self.max_range_miles, usable_gallons * self.mpg)
         stops = []
         
         # Destination is the conceptual last "station"
         destination_dist = total_dist_miles
+        dists = [s['dist'] for s in stations]
+
+        def has_next_hop(cand):
+            # The destination, or ANY station after cand, within range of a full tank at cand
+            cand_reach = cand['dist'] + self.max_range_miles
+            if cand_reach >= destination_dist:
+                return True
+            i = bisect_right(dists, cand['dist'])
+            return i < len(dists) and dists[i] <= cand_reach
         
         while True:
             # Check if we can reach destination
@@ -82,10 +365,11 @@ class FuelPlanner:
             max_reach = current_pos + current_fuel_miles
             
             # Find reachable stations AHEAD of current_pos
-            reachable = [s for s in stations if s['dist'] > current_pos and s['dist'] <= max_reach]
+            reachable = stations[bisect_right(dists, current_pos):bisect_right(dists, max_reach)]
             
             if not reachable:
                 # Dead end
+                self.dead_end = (current_pos, max_reach)
                 return None, "No stations within range to continue trip."
                 
             # Filter reachable to ensure they are not dead ends themselves.
@@ -94,21 +378,20 @@ class FuelPlanner:
             
             safe_choices = []
             for cand in reachable:
-                # Check feasibility from 'cand'
-                cand_reach = cand['dist'] + self.MAX_RANGE_MILES
-                if cand_reach >= destination_dist:
-                    safe_choices.append(cand)
-                    continue
-                
-                # Check if ANY station exists after cand within range
-                next_hop_exists = any(s for s in stations if s['dist'] > cand['dist'] and s['dist'] <= cand_reach)
-                if next_hop_exists:
+                if cand['id'] not in kept:
+                    # A dropped cluster member only stands in for its keeper
+                    keeper = keeper_of[cand['id']]
+                    if current_pos < keeper['dist'] and has_next_hop(keeper):
+                        continue
+                if has_next_hop(cand):
                     safe_choices.append(cand)
             
             if not safe_choices:
                  # If no safe choice, we might still have to pick the furthest one and hope, 
                  # or fail. Requirement says "avoids dead-ends".
                  # If we are strictly blocked, return error.
+                 last = max(s['dist'] for s in reachable)
+                 self.dead_end = (last, last + self.max_range_miles)
                  return None, "No safe reachable stations found (dead-end detected)."
                  
             # Strategy: "Find the next reachable station ahead with price lower than current"
@@ -137,8 +420,8 @@ class FuelPlanner:
             # "reachable" here means reachable from THIS stop with a FULL tank (max potential).
             
             # Refetch reachable from NEW current_pos (the stop)
-            future_reach_limit = current_pos + self.MAX_RANGE_MILES
-            future_stations = [s for s in stations if s['dist'] > current_pos and s['dist'] <= future_reach_limit]
+            future_reach_limit = current_pos + self.max_range_miles
+            future_stations = stations[bisect_right(dists, current_pos):bisect_right(dists, future_reach_limit)]
             
             cheaper_target = None
             for fs in future_stations:
@@ -155,7 +438,7 @@ class FuelPlanner:
                 # Buy diff.
                 if needed_miles > current_fuel_miles:
                     buy_miles = needed_miles - current_fuel_miles
-                    gallons_needed = buy_miles / self.VEHICLE_MPG
+                    gallons_needed = buy_miles / self.mpg
                 else:
                     gallons_needed = 0 # We have enough to reach the cheaper one
             else:
@@ -163,16 +446,16 @@ class FuelPlanner:
                 # Fill up to reach success or full.
                 # If destination within range of full tank:
                 dist_to_dest = destination_dist - current_pos
-                if dist_to_dest <= self.MAX_RANGE_MILES:
+                if dist_to_dest <= self.max_range_miles:
                      # Buy enough for destination
                      if dist_to_dest > current_fuel_miles:
                          buy_miles = dist_to_dest - current_fuel_miles
-                         gallons_needed = buy_miles / self.VEHICLE_MPG
+                         gallons_needed = buy_miles / self.mpg
                      else:
                          gallons_needed = 0
                 else:
                     # Fill to max
-                    space_in_tank = self.TANK_CAPACITY_GALLONS - (current_fuel_miles / self.VEHICLE_MPG)
+                    space_in_tank = (self.max_range_miles - current_fuel_miles) / self.mpg
                     gallons_needed = space_in_tank
             
             # Execute purchase
@@ -180,20 +463,25 @@ class FuelPlanner:
             
             stops.append({
                 "station_id": best_stop['id'],
-                "name": best_stop['obj'].name,
-                "address": best_stop['obj'].address,
-                "city": best_stop['obj'].city,
-                "state": best_stop['obj'].state,
-                "lat": best_stop['obj'].location.y,
-                "lon": best_stop['obj'].location.x,
+                "name": best_stop['name'],
+                "address": best_stop['address'],
+                "city": best_stop['city'],
+                "state": best_stop['state'],
+                "lat": best_stop['lat'],
+                "lon": best_stop['lon'],
                 "price_per_gallon": best_stop['price'],
                 "miles_from_start": round(current_pos, 1),
                 "gallons_purchased": round(gallons_needed, 2),
                 "stop_cost": round(cost, 2),
             })
+            if best_stop.get('cluster') in co_located:
+                stops[-1]["co_located"] = [
+                    {"station_id": s['id'], "name": s['name'], "address": s['address'], "price_per_gallon": s['price']}
+                    for s in sorted(co_located[best_stop['cluster']], key=lambda s: s['price']) if s is not best_stop
+                ]
             
             # Update state
-            current_fuel_miles += (gallons_needed * self.VEHICLE_MPG)
+            current_fuel_miles += (gallons_needed * self.mpg)
         
         # Calculate totals
         total_cost = sum(s['stop_cost'] for s in stops)
@@ -0,0 +1,133 @@
+import time
+import uuid
+import zlib
+import logging
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from django.db import transaction
+from django.utils import timezone
+
+from routing.models import FuelStation, GeocodeRun, GeocodeRunItem
+
+logger = logging.getLogger(__name__)
+
+
+def new_run_id() -> str:
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+
+def parse_shard(spec: str) -> Tuple[int, int]:
+    """Parse "K/N" into (K, N) with 0 <= K < N."""
+    try:
+        index, count = (int(p) for p in spec.split("/", 1))
+    except ValueError:
+        raise ValueError(f"Invalid shard spec '{spec}', expected K/N (e.g. 0/4).")
+    if count < 1 or not (0 <= index < count):
+        raise ValueError(f"Invalid shard spec '{spec}', expected 0 <= K < N.")
+    return index, count
+
+
+def shard_for_key(key: Any, shard_count: int) -> int:
+    """Stable across processes and machines (unlike hash(), which is salted per process)."""
+    if shard_count <= 1:
+        return 0
+    return zlib.crc32(repr(key).encode("utf-8")) % shard_count
+
+
+def count_provider_calls(debug: Dict[str, Any]) -> Dict[str, int]:
+    """Count real (non-cached) provider calls from a router debug payload."""
+    calls: Counter = Counter()
+    for attempt in debug.get("attempts", []):
+        label = attempt.get("label", "")
+        if label.endswith("_query"):
+            calls[label[: -len("_query")]] += 1
+    return dict(calls)
+
+
+def count_cached_lookups(debug: Dict[str, Any]) -> int:
+    """Lookups in a router debug payload answered without a provider call (cache or a concurrent identical call)."""
+    return sum(1 for attempt in debug.get("attempts", []) if attempt.get("label", "").endswith("_cached"))
+
+
+class GeocodeJournal:
+    """
+    Durable journal of a geocoding run.
+
+    Station updates and journal items are written in the same transaction, so a
+    crash loses at most the pending (un-checkpointed) batch, and a resumed run
+    skips every station recorded here without touching the DB per station.
+    """
+
+    def __init__(self, run: GeocodeRun, shard: int = 0):
+        self.run = run
+        self.shard = shard
+
+    @classmethod
+    def open(cls, run_id: Optional[str], strategy: str, shard: int = 0, shard_count: int = 1) -> Tuple["GeocodeJournal", bool]:
+        """Create or resume a run. Returns (journal, resumed)."""
+        run_id = run_id or new_run_id()
+        run, created = GeocodeRun.objects.get_or_create(
+            run_id=run_id,
+            defaults={"strategy": strategy, "shard_count": shard_count},
+        )
+        if run.shard_count != shard_count:
+            raise ValueError(
+                f"Run {run_id} was started with {run.shard_count} shards, not {shard_count}."
+            )
+        if run.strategy != strategy:
+            logger.warning(f"Resuming run {run_id} with strategy {strategy} (started with {run.strategy}).")
+        return cls(run, shard=shard), not created
+
+    def completed_station_ids(self) -> Set[int]:
+        return set(self.run.items.values_list("station_id", flat=True))
+
+    def checkpoint(self, batch: Iterable[Tuple[int, Any, str, Dict[str, Any], bool, Dict[str, int]]]):
+        """
+        Persist a batch of (station_id, location, source, debug, success, provider_calls)
+        results to FuelStation and the journal atomically.
+        """
+        stations: List[FuelStation] = []
+        items: List[GeocodeRunItem] = []
+        for sid, loc, src, _dbg, success, calls in batch:
+            s = FuelStation(id=sid)
+            s.geocode_source = src
+            s.location = loc
+            stations.append(s)
+
+            if success:
+                state = GeocodeRunItem.STATE_GEOCODED
+            elif src.startswith("error:"):
+                state = GeocodeRunItem.STATE_ERROR
+            else:
+                state = GeocodeRunItem.STATE_UNRESOLVED
+            items.append(GeocodeRunItem(
+                run=self.run,
+                station_id=sid,
+                shard=self.shard,
+                state=state,
+                geocode_source=src,
+                provider_calls=calls,
+            ))
+
+        if not items:
+            return
+
+        with transaction.atomic():
+            # Only overwrite location on success so a failed retry never clears a point.
+            located = [s for s in stations if s.location is not None]
+            missing = [s for s in stations if s.location is None]
+            if located:
+                FuelStation.objects.bulk_update(located, fields=["geocode_source", "location"])
+            if missing:
+                FuelStation.objects.bulk_update(missing, fields=["geocode_source"])
+            GeocodeRunItem.objects.bulk_create(items, ignore_conflicts=True)
+            GeocodeRun.objects.filter(pk=self.run.pk).update(last_checkpoint_at=timezone.now())
+
+    def summary(self) -> Dict[str, Any]:
+        states = Counter()
+        calls = Counter()
+        for state, item_calls in self.run.items.values_list("state", "provider_calls"):
+            states[state] += 1
+            calls.update(item_calls or {})
+        return {"run_id": self.run.run_id, "states": dict(states), "provider_calls": dict(calls)}
@@ -1,6 +1,7 @@
 import requests
 import time
 import logging
+from django.conf import settings
 from django.contrib.gis.geos import Point
 from routing.models import GeocodeCache
 from django.db import IntegrityError
@@ -8,15 +9,18 @@ from django.db import IntegrityError
 logger = logging.getLogger(__name__)
 
 class CensusGeocoder:
-    BASE_URL = "https://geocoding.geo.census.gov/geocoder/locations/onelineaddress"
+    BASE_URL = settings.CENSUS_GEOCODER_URL
+
+    TIMEOUT_S = 30
 
     @classmethod
-    def geocode(cls, address_str: str, max_retries=3):
+    def geocode(cls, address_str: str, max_retries=3, deadline=None):
         """
         Geocode an address string.
         1. Check DB cache.
         2. Call API.
         3. Save to DB.
+        An optional Deadline bounds every attempt's timeout and the retry backoff.
         """
         normalized_query = address_str.strip().lower()
         
@@ -32,19 +36,31 @@ class CensusGeocoder:
             "format": "json"
         }
         
+        last_error = None
         for attempt in range(max_retries):
             try:
                 # Throttling handled by caller or basic sleep here if needed for bulk
                 # For single request, minimal delay is fine. But for retry, we backoff.
                 if attempt > 0:
-                    time.sleep(2 * attempt) # increased backoff
+                    backoff = 2 * attempt # increased backoff
+                    if deadline is not None and deadline.remaining() <= backoff + deadline.MIN_TIMEOUT_S:
+                        logger.warning(f"Geocoder budget exhausted for {address_str} after {attempt} attempts.")
+                        break
+                    time.sleep(backoff)
+
+                if deadline is not None and deadline.expired():
+                    if attempt == 0:
+                        return None, {"error": "deadline_exceeded", "deadline_exceeded": True}
+                    break
 
                 # Increase timeout to 30s to handle slow Census API
-                response = requests.get(cls.BASE_URL, params=params, timeout=30)
+                timeout = cls.TIMEOUT_S if deadline is None else deadline.timeout(cls.TIMEOUT_S)
+                response = requests.get(cls.BASE_URL, params=params, timeout=timeout)
                 
                 # Check for 5xx or 429
                 if response.status_code in [429, 502, 503, 504]:
                     logger.warning(f"Geocoder API Status {response.status_code} for {address_str}. Retrying...")
+                    last_error = f"HTTP {response.status_code}"
                     continue
 
                 
@@ -55,6 +71,7 @@ class CensusGeocoder:
                 except ValueError:
                     # JSONDecodeError
                     logger.warning(f"Geocoder API returned invalid JSON for {address_str}. Content: {response.text[:100]}...")
+                    last_error = "invalid JSON"
                     # This might be a transient error or a hard failure. Retrying might help if it's an HTML error page.
                     continue
 
@@ -90,7 +107,9 @@ class CensusGeocoder:
 
             except requests.RequestException as e:
                 logger.error(f"Geocoding network error for {address_str}: {e}")
+                last_error = str(e)
                 # Retry on connection errors
                 continue
                 
-        return None, None
+        # Distinguish "service unavailable" from "no match" for callers (circuit breakers)
+        return None, {"error": last_error or "Census geocoder unavailable after retries"}
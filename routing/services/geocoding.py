@@ -3,12 +3,21 @@ import json
 import logging
 import itertools
 import os
+import time
+import threading
+import concurrent.futures
 from abc import ABC, abstractmethod
 from typing import Optional, Tuple, Dict, Any, List
 
 import requests
+from django.conf import settings
 from django.contrib.gis.geos import Point
+from django.db import connections
+from routing.services.circuit_breaker import get_breaker
+from routing.services.deadline import Deadline
 from routing.services.geocoder import CensusGeocoder
+from routing.services.rate_limiter import INTERACTIVE, get_rate_limiter
+from routing.services.metrics import CACHE_REQUESTS, GEOCODE_HEDGES, GEOCODE_PROVIDER_SECONDS, GEOCODE_SECONDS
 
 from dotenv import load_dotenv
 load_dotenv()
@@ -19,40 +28,23 @@ logger = logging.getLogger(__name__)
 # Regex + Helpers
 # ----------------------------
 
-_WHITESPACE_RE = re.compile(r"\s+")
-_EXIT_RE = re.compile(r"\bEXIT\s*\d+\b", re.IGNORECASE)
-_MILE_MARKER_RE = re.compile(r"\b(MM|MILE\s*MARKER)\s*\d+\b", re.IGNORECASE)
-_COMMA_SPACING_RE = re.compile(r"\s*,\s*")
-_INTERSECTION_SEP_RE = re.compile(r"\s*(&| AND )\s*", re.IGNORECASE)
-
-# Postal-ish heuristic
-_HAS_STREET_NUMBER_RE = re.compile(r"\b\d{1,6}\b")
-
-# Road extraction
-ROAD_RE = re.compile(r"\b(I-\d{1,3}|US-\d{1,3}|SR-\d{1,4})\b", re.IGNORECASE)
-
-# Postal street suffix cues
-_STREET_SUFFIX_RE = re.compile(
-    r"\b("
-    r"ST|STREET|AVE|AVENUE|RD|ROAD|DR|DRIVE|LN|LANE|BLVD|BOULEVARD|"
-    r"HWY|HIGHWAY|PKWY|PARKWAY|CT|COURT|PL|PLACE|CIR|CIRCLE|WAY|TER|TERRACE|"
-    r"PLZ|PLAZA|TRL|TRAIL|PIKE|SQ|SQUARE"
-    r")\b",
-    re.IGNORECASE
+# Patterns and AddrType live in the Django-free parser module so process pool
+# workers can import them; the functions below remain the reference behaviour.
+from routing.services.address_parser import (  # noqa: E402
+    _WHITESPACE_RE,
+    _EXIT_RE,
+    _MILE_MARKER_RE,
+    _COMMA_SPACING_RE,
+    _INTERSECTION_SEP_RE,
+    _HAS_STREET_NUMBER_RE,
+    ROAD_RE,
+    _STREET_SUFFIX_RE,
+    _NUMBER_THEN_WORD_RE,
+    AddrType,
+    classify_cached,
+    extract_roads_cached,
 )
 
-# Typical "123 Something" pattern
-_NUMBER_THEN_WORD_RE = re.compile(r"\b\d{1,6}\s+[A-Za-z]", re.IGNORECASE)
-
-
-class AddrType:
-    POSTAL_ADDRESS = "POSTAL_ADDRESS"
-    HIGHWAY_INTERSECTION_2 = "HIGHWAY_INTERSECTION_2"
-    HIGHWAY_INTERSECTION_MULTI = "HIGHWAY_INTERSECTION_MULTI"
-    SINGLE_ROUTE = "SINGLE_ROUTE"
-    MILE_MARKER = "MILE_MARKER"
-    UNKNOWN = "UNKNOWN"
-
 
 def clean_piece(s: Optional[str]) -> str:
     if not s:
@@ -217,7 +209,8 @@ def summarize_meta(meta: Any) -> Dict[str, Any]:
 
 class BaseGeocodingProvider(ABC):
     @abstractmethod
-    def geocode(self, query: str) -> Tuple[Optional[Point], Dict[str, Any]]:
+    def geocode(self, query: str, deadline: Optional[Deadline] = None) -> Tuple[Optional[Point], Dict[str, Any]]:
+        """Providers must derive their network timeouts from `deadline` when given."""
         pass
 
     @property
@@ -225,19 +218,32 @@ class BaseGeocodingProvider(ABC):
     def name(self) -> str:
         pass
 
+    # Longest a single call can block; used to report fail-fast savings
+    timeout = 10
+
+    @property
+    def rate_limit_key(self) -> str:
+        """Identity whose quota a call consumes (e.g. the API key); limits are per provider + key."""
+        return ""
+
+    def is_failure(self, meta: Dict[str, Any]) -> bool:
+        """Whether a result counts against the provider's circuit breaker (outages, not misses)."""
+        return bool(meta) and "error" in meta and not meta.get("deadline_exceeded")
+
 
 class CensusProvider(BaseGeocodingProvider):
     def __init__(self, max_retries: int = 2):
         self.max_retries = max_retries
+        self.timeout = CensusGeocoder.TIMEOUT_S
 
     @property
     def name(self) -> str:
         return "census"
 
-    def geocode(self, query: str) -> Tuple[Optional[Point], Dict[str, Any]]:
+    def geocode(self, query: str, deadline: Optional[Deadline] = None) -> Tuple[Optional[Point], Dict[str, Any]]:
         # CensusGeocoder.geocode returns (Point, dict)
         try:
-            loc, meta = CensusGeocoder.geocode(query, max_retries=self.max_retries)
+            loc, meta = CensusGeocoder.geocode(query, max_retries=self.max_retries, deadline=deadline)
             if meta:
                 meta["provider"] = self.name
             return loc, meta or {}
@@ -253,7 +259,7 @@ class GoogleMapsProvider(BaseGeocodingProvider):
     def __init__(self, timeout: int = 10):
         self.timeout = timeout
         self.api_key = os.environ.get("GOOGLE_MAPS_API_KEY", "")
-        self.base_url = "https://maps.googleapis.com/maps/api/geocode/json"
+        self.base_url = settings.GOOGLE_GEOCODE_URL
         
         if not self.api_key:
              logger.warning("GoogleMapsProvider instantiated without GOOGLE_MAPS_API_KEY. Requests will fail.")
@@ -262,14 +268,25 @@ class GoogleMapsProvider(BaseGeocodingProvider):
     def name(self) -> str:
         return "google_maps"
 
-    def geocode(self, query: str) -> Tuple[Optional[Point], Dict[str, Any]]:
+    @property
+    def rate_limit_key(self) -> str:
+        return self.api_key
+
+    def is_failure(self, meta: Dict[str, Any]) -> bool:
+        # A missing key is configuration, not an outage; quota/server errors are.
+        if meta.get("error") == "Missing API Key":
+            return False
+        return "error" in meta or meta.get("status") in ("OVER_QUERY_LIMIT", "UNKNOWN_ERROR")
+
+    def geocode(self, query: str, deadline: Optional[Deadline] = None) -> Tuple[Optional[Point], Dict[str, Any]]:
         if not self.api_key:
             return None, {"provider": self.name, "error": "Missing API Key"}
 
         params = {"address": query, "key": self.api_key}
+        timeout = self.timeout if deadline is None else deadline.timeout(self.timeout)
         
         try:
-            r = requests.get(self.base_url, params=params, timeout=self.timeout)
+            r = requests.get(self.base_url, params=params, timeout=timeout)
             r.raise_for_status()
             data = r.json()
         except Exception as e:
@@ -317,14 +334,20 @@ class OSMProvider(BaseGeocodingProvider):
     def __init__(self, user_agent="SpotterFuelRouting/1.0", timeout: int = 10):
         self.user_agent = user_agent
         self.timeout = timeout
-        self.base_url = "https://nominatim.openstreetmap.org/search"
+        self.base_url = settings.NOMINATIM_URL
 
     @property
     def name(self) -> str:
         return "osm"
 
-    def geocode(self, query: str) -> Tuple[Optional[Point], Dict[str, Any]]:
+    @property
+    def rate_limit_key(self) -> str:
+        # Nominatim's usage policy is enforced per application (User-Agent)
+        return self.user_agent
+
+    def geocode(self, query: str, deadline: Optional[Deadline] = None) -> Tuple[Optional[Point], Dict[str, Any]]:
         headers = {'User-Agent': self.user_agent}
+        timeout = self.timeout if deadline is None else deadline.timeout(self.timeout)
         params = {
             "q": query,
             "format": "json",
@@ -332,9 +355,8 @@ class OSMProvider(BaseGeocodingProvider):
         }
         
         try:
-            # Respect usage policy: sleep briefly if we were looping, but for single request it's ok.
-            # In a real heavy app, use a rate limiter.
-            r = requests.get(self.base_url, params=params, headers=headers, timeout=self.timeout)
+            # Usage policy (1 req/s) is enforced by the shared outbound rate limiter in GeocodingRouter.
+            r = requests.get(self.base_url, params=params, headers=headers, timeout=timeout)
             r.raise_for_status()
             data = r.json()
         except Exception as e:
@@ -366,24 +388,64 @@ class OSMProvider(BaseGeocodingProvider):
 # ----------------------------
 
 class GeocodingRouter:
-    def __init__(self, provider_priority: str = "smart"):
+    def __init__(self, provider_priority: str = "smart", budget_s: Optional[float] = None, hedge_delay_s: Optional[float] = None, traffic: str = INTERACTIVE):
         self.census = CensusProvider()
         self.google = GoogleMapsProvider()
         self.osm = OSMProvider()
         self.priority = provider_priority
         self.cache: Dict[str, Tuple[Optional[Point], Dict[str, Any]]] = {}
+        # Import workers share one router: the first thread to miss a key queries the
+        # provider, threads missing the same key meanwhile wait for its answer
+        self._cache_lock = threading.Lock()
+        self._in_flight: Dict[str, threading.Event] = {}
         
         # Google Maps always requires a key
         self.has_api_key = bool(self.google.api_key)
 
+        # Latency budget for one geocode_string call, and how long to wait on a
+        # provider before hedging with the next one in parallel.
+        self.budget_s = budget_s if budget_s is not None else getattr(settings, "GEOCODE_BUDGET_SECONDS", 8.0)
+        self.hedge_delay_s = hedge_delay_s if hedge_delay_s is not None else getattr(settings, "GEOCODE_HEDGE_DELAY_SECONDS", 1.5)
+
+        # Outbound rate limit lane: live requests are INTERACTIVE, imports BULK
+        self.traffic = traffic
+
     def get_cached(self, provider_name: str, query: str) -> Optional[Tuple[Optional[Point], Dict[str, Any]]]:
-        return self.cache.get(f"{provider_name}:{query}")
+        with self._cache_lock:
+            return self.cache.get(f"{provider_name}:{query}")
 
     def set_cache(self, provider_name: str, query: str, result: Tuple[Optional[Point], Dict[str, Any]]):
-        self.cache[f"{provider_name}:{query}"] = result
+        with self._cache_lock:
+            self.cache[f"{provider_name}:{query}"] = result
+
+    def _claim(self, key: str) -> Tuple[Optional[Tuple[Optional[Point], Dict[str, Any]]], Optional[threading.Event]]:
+        """
+        (cached result, None) on a hit. On a miss, (None, event): the caller owns the
+        query if it created the event (event not yet in flight), else it may wait on it.
+        """
+        with self._cache_lock:
+            if key in self.cache:
+                return self.cache[key], None
+            event = self._in_flight.get(key)
+            if event is not None:
+                return None, event
+            self._in_flight[key] = threading.Event()
+            return None, None
 
-    def _try(self, provider: BaseGeocodingProvider, query: str, debug_list: List[Dict]) -> Optional[Point]:
-        cached = self.get_cached(provider.name, query)
+    def _release(self, key: str):
+        with self._cache_lock:
+            event = self._in_flight.pop(key, None)
+        if event is not None:
+            event.set()
+
+    def _try(self, provider: BaseGeocodingProvider, query: str, debug_list: List[Dict], deadline: Optional[Deadline] = None) -> Optional[Point]:
+        key = f"{provider.name}:{query}"
+        cached, pending = self._claim(key)
+        if pending is not None:
+            # Another thread is asking the provider the same thing; wait for its answer
+            pending.wait(deadline.remaining() if deadline is not None else provider.timeout)
+            cached = self.get_cached(provider.name, query)
+        CACHE_REQUESTS.inc(cache="geocode", result="hit" if cached else "miss")
         if cached:
             loc, meta = cached
             debug_list.append({
@@ -392,199 +454,235 @@ class GeocodingRouter:
                 "meta_summary": summarize_meta(meta),
             })
             return loc
-
-        loc, meta = provider.geocode(query)
-        self.set_cache(provider.name, query, (loc, meta))
+        if pending is not None:
+            # The other call failed (outages are not cached) or outlived our wait: ask ourselves
+            return self._query(provider, query, debug_list, deadline)
+        try:
+            return self._query(provider, query, debug_list, deadline)
+        finally:
+            self._release(key)
+
+    def _query(self, provider: BaseGeocodingProvider, query: str, debug_list: List[Dict], deadline: Optional[Deadline] = None) -> Optional[Point]:
+        if deadline is not None and deadline.expired():
+            debug_list.append({"label": f"{provider.name}_skipped", "query": query, "reason": "deadline_exceeded"})
+            return None
+
+        breaker = get_breaker(provider.name, timeout_hint_s=provider.timeout)
+        if not breaker.allow():
+            debug_list.append({"label": f"{provider.name}_skipped", "query": query, "reason": "circuit_open"})
+            return None
+
+        limiter = get_rate_limiter(provider.name)
+        if limiter is not None and not limiter.acquire(provider.rate_limit_key, self.traffic, deadline):
+            debug_list.append({"label": f"{provider.name}_skipped", "query": query, "reason": "rate_limited"})
+            return None
+
+        t0 = time.monotonic()
+        loc, meta = provider.geocode(query, deadline=deadline)
+        elapsed = time.monotonic() - t0
+        GEOCODE_PROVIDER_SECONDS.observe(elapsed, provider=provider.name)
+
+        if loc is None and self._is_failure(provider, meta):
+            breaker.record_failure()
+            # Outages are not answers; don't pin them in the per-router cache
+        else:
+            breaker.record_success()
+            self.set_cache(provider.name, query, (loc, meta))
         
         debug_list.append({
             "label": f"{provider.name}_query",
             "query": query,
+            "elapsed_ms": round(elapsed * 1000, 1),
             "meta_summary": summarize_meta(meta),
         })
         return loc
 
+    @staticmethod
+    def _is_failure(provider: BaseGeocodingProvider, meta: Any) -> bool:
+        try:
+            return provider.is_failure(meta or {})
+        except Exception:
+            return False
+
     def is_google_viable(self) -> bool:
         return self.has_api_key
 
-    def geocode_string(self, query: str) -> Tuple[Optional[Point], Dict[str, Any]]:
+    def _try_in_thread(self, provider: BaseGeocodingProvider, query: str, deadline: Deadline) -> Tuple[Optional[Point], List[Dict]]:
+        attempts: List[Dict] = []
+        try:
+            return self._try(provider, query, attempts, deadline), attempts
+        finally:
+            # Provider calls may touch the DB (Census cache); don't leak per-thread connections
+            connections.close_all()
+
+    def geocode_string(self, query: str, deadline: Optional[Deadline] = None) -> Tuple[Optional[Point], Dict[str, Any]]:
         """
-        Simple geocode strategy for a single string.
-        1. Try Google if available (Smart/Place).
-        2. Try Census.
+        Hedged geocode strategy for a single string, in priority order:
+        1. Google if available (Smart/Place).
+        2. Census.
+        3. OSM (Fallback for City/State).
+        The next provider starts as soon as the previous one fails, or in parallel
+        once it has been running for `hedge_delay_s`. The first good answer wins;
+        calls still queued are cancelled and running ones are abandoned (their
+        timeouts already derive from the same deadline).
         """
-        debug = {"attempts": []}
-        
-        # 1. Try Google
-        if self.is_google_viable():
-            loc = self._try(self.google, query, debug["attempts"])
-            if loc:
-                return loc, debug
-
-        # 2. Try Census
-        loc = self._try(self.census, query, debug["attempts"])
-        if loc:
-            return loc, debug
-            
-        # 3. Try OSM (Fallback for City/State)
-        loc = self._try(self.osm, query, debug["attempts"])
-        if loc:
-            return loc, debug
-
-        return None, debug
-
-    def geocode_station(self, address: str, city: str, state: str) -> Tuple[Optional[Point], Dict[str, Any]]:
-        debug: Dict[str, Any] = {
-            "classification": None,
-            "classification_info": None,
-            "attempts": [],
-            "success": False,
-            "success_label": None,
-            "reason": None,
-        }
-
-        addr_type, info = classify_address(address)
-        debug["classification"] = addr_type
-        debug["classification_info"] = info
+        deadline = deadline or Deadline(self.budget_s)
+        debug: Dict[str, Any] = {"attempts": [], "hedged": [], "abandoned": []}
+        providers = ([self.google] if self.is_google_viable() else []) + [self.census, self.osm]
+
+        # Cached answers need no threads
+        for provider in providers:
+            cached = self.get_cached(provider.name, query)
+            if cached and cached[0]:
+                self._try(provider, query, debug["attempts"], deadline)
+                return self._finish(cached[0], debug, deadline)
+
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=len(providers), thread_name_prefix="geocode-hedge")
+        pending: Dict[concurrent.futures.Future, BaseGeocodingProvider] = {}
+        queue = list(providers)
+        winner: Optional[Point] = None
+
+        def launch(hedge: bool):
+            provider = queue.pop(0)
+            if hedge:
+                debug["hedged"].append(provider.name)
+                GEOCODE_HEDGES.inc(provider=provider.name)
+            pending[executor.submit(self._try_in_thread, provider, query, deadline)] = provider
 
+        try:
+            launch(hedge=False)
+            while pending and winner is None and not deadline.expired():
+                wait_s = deadline.remaining() if not queue else min(self.hedge_delay_s, deadline.remaining())
+                done, _ = concurrent.futures.wait(pending, timeout=wait_s, return_when=concurrent.futures.FIRST_COMPLETED)
+
+                for future in done:
+                    pending.pop(future)
+                    loc, attempts = future.result()
+                    debug["attempts"].extend(attempts)
+                    if loc and winner is None:
+                        winner = loc
+
+                if winner is None and queue and (not done or not pending) and not deadline.expired():
+                    # Either the hedge delay elapsed (hedge) or everything running failed (fallback)
+                    launch(hedge=bool(pending))
+        finally:
+            debug["abandoned"] = [p.name for p in pending.values()]
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        if winner is None and deadline.expired():
+            debug["reason"] = "deadline_exceeded"
+        return self._finish(winner, debug, deadline)
+
+    def _finish(self, loc: Optional[Point], debug: Dict[str, Any], deadline: Deadline) -> Tuple[Optional[Point], Dict[str, Any]]:
+        elapsed = deadline.elapsed()
+        debug["elapsed_ms"] = round(elapsed * 1000, 1)
+        GEOCODE_SECONDS.observe(elapsed, outcome="hit" if loc else "miss")
+        return loc, debug
+
+    def plan_station(self, address: str, city: str, state: str) -> Dict[str, Any]:
+        """
+        Build the ordered list of provider queries the station strategy would issue.
+        Each step is (provider, query, success_label); execution stops at the first hit.
+        """
+        addr_type, info = classify_cached(address)
         no_exit_addr = remove_exit_and_noise(address)
-        
         can_use_google = self.is_google_viable()
 
-        # Helper strategies
-        def try_census_postal():
-            q = f"{address}, {city}, {state}".strip(", ").strip()
-            if loc := self._try(self.census, q, debug["attempts"]):
-                return loc, f"{self.census.name}:postal_full"
-            
-            # Census address fallback
-            q_simple = address
-            if loc := self._try(self.census, q_simple, debug["attempts"]):
-                return loc, f"{self.census.name}:postal_simple"
-            return None, None
+        postal_q = f"{address}, {city}, {state}"
+        no_exit_q = f"{no_exit_addr}, {city}, {state}".strip(", ").strip()
+        place_q = f"{city}, {state}".strip(", ").strip()
 
-        def try_google_smart(query_type: str, specific_query: str = None):
-            if not can_use_google:
-                return None, None
-            q = specific_query or f"{no_exit_addr}, {city}, {state}".strip(", ").strip()
-            if loc := self._try(self.google, q, debug["attempts"]):
-                return loc, f"{self.google.name}:{query_type}"
-            return None, None
+        steps: List[Tuple[BaseGeocodingProvider, str, str]] = []
+        reason = None
 
-        def try_google_place():
-            if not can_use_google:
-                return None, None
-            q = f"{city}, {state}".strip(", ").strip()
-            if loc := self._try(self.google, q, debug["attempts"]):
-                return loc, f"{self.google.name}:place_fallback"
-            return None, None
+        def google(query: str, query_type: str):
+            if can_use_google:
+                steps.append((self.google, query, f"{self.google.name}:{query_type}"))
 
+        def census_postal(full_label: str, simple_label: str):
+            steps.append((self.census, postal_q.strip(", ").strip(), full_label))
+            # Census address fallback
+            steps.append((self.census, address, simple_label))
+
+        def pair_query(a: str, b: str) -> str:
+            return f"{a} & {b}, {city}, {state}".strip(", ").strip()
 
-        # --- Strategy Execution ---
-        
         # 1. POSTAL
         if addr_type == AddrType.POSTAL_ADDRESS:
             if self.priority == "google_then_census" and can_use_google:
-                 if loc := try_google_smart("postal_full", f"{address}, {city}, {state}")[0]:
-                    debug["success"] = True; debug["success_label"] = f"{self.google.name}:postal_full"
-                    return loc, debug
-                 if loc := try_census_postal()[0]:
-                    debug["success"] = True; debug["success_label"] = f"{self.census.name}:postal_full"
-                    return loc, debug
+                google(postal_q, "postal_full")
+                census_postal(f"{self.census.name}:postal_full", f"{self.census.name}:postal_full")
             else:
-                # Default for Postal is Census first
-                loc, label = try_census_postal()
-                if loc:
-                     debug["success"] = True; debug["success_label"] = label
-                     return loc, debug
-                
-                # Fallback to google
-                loc, label = try_google_smart("postal_fallback", f"{address}, {city}, {state}")
-                if loc:
-                     debug["success"] = True; debug["success_label"] = label
-                     return loc, debug
-                
-            debug["reason"] = "postal_no_match"
-            return None, debug
-
-        # 2. HIGHWAY INTERSECTION (2 roads)
-        if addr_type == AddrType.HIGHWAY_INTERSECTION_2:
-            # Google is usually better for intersections
-            loc, label = try_google_smart("no_exit")
-            if loc:
-                 debug["success"] = True; debug["success_label"] = label
-                 return loc, debug
-
-            # Try canonical best pair
-            roads = extract_roads(no_exit_addr or address)
+                # Default for Postal is Census first, then Google
+                census_postal(f"{self.census.name}:postal_full", f"{self.census.name}:postal_simple")
+                google(postal_q, "postal_fallback")
+            reason = "postal_no_match"
+
+        # 2. HIGHWAY INTERSECTION (2 roads): Google is usually better for intersections
+        elif addr_type == AddrType.HIGHWAY_INTERSECTION_2:
+            google(no_exit_q, "no_exit")
+            roads = extract_roads_cached(no_exit_addr or address)
             if len(roads) >= 2:
                 a, b = best_road_pairs(roads, max_pairs=1)[0]
-                q_pair = f"{a} & {b}, {city}, {state}".strip(", ").strip()
-                loc, label = try_google_smart("best_pair", q_pair)
-                if loc:
-                     debug["success"] = True; debug["success_label"] = label
-                     return loc, debug
-
-            # Fallback to place
-            loc, label = try_google_place()
-            if loc:
-                 debug["success"] = True; debug["success_label"] = label
-                 return loc, debug
-            
-            debug["reason"] = "hwy2_no_match"
-            return None, debug
+                google(pair_query(a, b), "best_pair")
+            google(place_q, "place_fallback")
+            reason = "hwy2_no_match"
 
         # 3. HIGHWAY MULTI
-        if addr_type == AddrType.HIGHWAY_INTERSECTION_MULTI:
-             # Try best road pairs
-            roads = extract_roads(no_exit_addr or address)
-            pairs = best_road_pairs(roads, max_pairs=2)
-            
-            for i, (a, b) in enumerate(pairs):
-                q_pair = f"{a} & {b}, {city}, {state}".strip(", ").strip()
-                loc, label = try_google_smart(f"best_pair_{i}", q_pair)
-                if loc:
-                    debug["success"] = True; debug["success_label"] = label
-                    return loc, debug
-
-            # Try plain cleaned
-            loc, label = try_google_smart("no_exit_fallback")
-            if loc:
-                debug["success"] = True; debug["success_label"] = label
-                return loc, debug
-            
-            # Place
-            loc, label = try_google_place()
-            if loc:
-                 debug["success"] = True; debug["success_label"] = label
-                 return loc, debug
-
-            debug["reason"] = "hwy_multi_no_match"
-            return None, debug
+        elif addr_type == AddrType.HIGHWAY_INTERSECTION_MULTI:
+            roads = extract_roads_cached(no_exit_addr or address)
+            for i, (a, b) in enumerate(best_road_pairs(roads, max_pairs=2)):
+                google(pair_query(a, b), f"best_pair_{i}")
+            google(no_exit_q, "no_exit_fallback")
+            google(place_q, "place_fallback")
+            reason = "hwy_multi_no_match"
 
         # 4. SINGLE / MILE MARKER -> Fallback to place instead of skipping
-        if addr_type in (AddrType.SINGLE_ROUTE, AddrType.MILE_MARKER):
-            # Try place fallback
-            loc, label = try_google_place()
-            if loc:
-                 debug["success"] = True; debug["success_label"] = label
-                 return loc, debug
-            
-            debug["reason"] = "unresolvable_single_route_no_place"
-            return None, debug
+        elif addr_type in (AddrType.SINGLE_ROUTE, AddrType.MILE_MARKER):
+            google(place_q, "place_fallback")
+            reason = "unresolvable_single_route_no_place"
 
         # 5. UNKNOWN
-        if addr_type == AddrType.UNKNOWN:
-            loc, label = try_google_smart("unknown_clean")
-            if loc:
-                debug["success"] = True; debug["success_label"] = label
-                return loc, debug
-            
-            loc, label = try_google_place()
-            if loc:
-                debug["success"] = True; debug["success_label"] = label
+        elif addr_type == AddrType.UNKNOWN:
+            google(no_exit_q, "unknown_clean")
+            google(place_q, "place_fallback")
+            reason = "unknown_exhausted"
+
+        return {
+            "classification": addr_type,
+            "classification_info": info,
+            "steps": steps,
+            "reason": reason,
+        }
+
+    @staticmethod
+    def plan_key(plan: Dict[str, Any]) -> Tuple:
+        """
+        Hashable identity of a station plan. Stations with equal keys issue the exact
+        same queries and end with the same outcome, so they can share one geocode.
+        """
+        return (
+            plan["classification"],
+            plan["reason"],
+            tuple((provider.name, query, label) for provider, query, label in plan["steps"]),
+        )
+
+    def geocode_station(self, address: str, city: str, state: str, deadline: Optional[Deadline] = None) -> Tuple[Optional[Point], Dict[str, Any]]:
+        plan = self.plan_station(address, city, state)
+        debug: Dict[str, Any] = {
+            "classification": plan["classification"],
+            "classification_info": plan["classification_info"],
+            "attempts": [],
+            "success": False,
+            "success_label": None,
+            "reason": None,
+        }
+
+        for provider, query, label in plan["steps"]:
+            if loc := self._try(provider, query, debug["attempts"], deadline):
+                debug["success"] = True
+                debug["success_label"] = label
                 return loc, debug
-            
-            debug["reason"] = "unknown_exhausted"
-            return None, debug
 
+        debug["reason"] = plan["reason"]
         return None, debug
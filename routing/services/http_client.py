@@ -0,0 +1,23 @@
+"""
+Shared async HTTP client for outbound calls made from async views.
+
+httpx connection pools are bound to the event loop that created them, so one
+client is kept per running loop (under uvicorn that is one per worker process).
+"""
+import asyncio
+import weakref
+
+import httpx
+
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20)
+
+
+def async_client() -> httpx.AsyncClient:
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(limits=LIMITS, follow_redirects=True)
+        _clients[loop] = client
+    return client
@@ -0,0 +1,157 @@
+"""
+Precomputed plans for recurring lanes (origin/destination pairs).
+
+`manage.py precompute_lanes` geocodes, routes and corridor-queries each lane once
+and stores the result in the default cache: the resolved ends, the OSRM route,
+the candidate stations located along it, and the plan over them. A
+route-plan request for a stored lane, with the same start, finish and corridor,
+is answered from that entry without geocoding, OSRM or a corridor query.
+
+Entries carry the station_version they were priced against. When prices move,
+only the prices of the lane's candidates are reloaded (one query by station id)
+and the plan is solved again; the route and the corridor are kept. The command
+does this in the background on every pass. A request that sees a stale entry
+before the next pass reprices it inline. Routes and corridors themselves are
+rebuilt by the command once an entry is LANE_REBUILD_S old, which picks up new
+stations and road changes.
+
+Only plain plans are served from lanes. Requests asking for alternatives,
+scenarios or an adaptive corridor always take the regular path.
+"""
+import hashlib
+import time
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from routing.services import plan_context
+from routing.services.batch_planner import location_key
+from routing.services.fuel_planner import FuelPlanner
+from routing.services.geometry import GeometryService
+from routing.services.osrm_client import OSRMClient
+from routing.services.stations import cached_station_version
+
+CACHE_PREFIX = "lane:"
+
+
+def lane_key(start, finish, corridor_miles) -> str:
+    """Cache key of a lane; addresses compare case- and whitespace-insensitively."""
+    ends = []
+    for value in (start, finish):
+        key = location_key(value)
+        ends.append(f"{key[0]:.5f},{key[1]:.5f}" if isinstance(key, tuple) else key)
+    raw = f"{corridor_miles}:{ends[0]}|{ends[1]}"
+    return CACHE_PREFIX + hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+
+def eligible(data: Dict[str, Any]) -> bool:
+    """Whether a validated route-plan request can be answered from a lane."""
+    return (
+        settings.PRECOMPUTED_LANES_ENABLED
+        and not data.get('alternatives')
+        and not data.get('scenarios')
+        and data.get('corridor_mode', "fixed") == "fixed"
+    )
+
+
+def lookup(data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """The stored lane for a validated route-plan request, if any."""
+    if not eligible(data):
+        return None
+    return cache.get(lane_key(data['start'], data['finish'], data['corridor_miles']))
+
+
+def store(entry: Dict[str, Any]):
+    cache.set(entry["key"], entry, timeout=settings.LANE_CACHE_TTL_S)
+
+
+def build(start, finish, corridor_miles, resolve) -> Dict[str, Any]:
+    """
+    Precompute a lane: resolve both ends with `resolve` (RoutePlanView.resolve_location),
+    fetch the OSRM route and the corridor candidates, then price and plan it.
+    """
+    start_coords, finish_coords = resolve(start), resolve(finish)
+    route_data = OSRMClient.get_route(start_coords, finish_coords)
+    planner = FuelPlanner(
+        route_points_lat_lon=GeometryService.decode_polyline(route_data['geometry']),
+        total_distance_meters=route_data['distance'],
+        corridor_miles=corridor_miles
+    )
+    entry = {
+        "key": lane_key(start, finish, corridor_miles),
+        "start": start_coords,
+        "finish": finish_coords,
+        "corridor_miles": corridor_miles,
+        "route": {k: route_data[k] for k in ('geometry', 'distance', 'duration') if k in route_data},
+        "candidates": planner.fetch_candidates(),
+        "built_at": time.time(),
+    }
+    return price(entry, cached_station_version(), planner)
+
+
+def price(entry: Dict[str, Any], version: str, planner: Optional[FuelPlanner] = None) -> Dict[str, Any]:
+    """Solve the lane over its candidates at their stored prices and record the plan for `version`."""
+    if planner is None:
+        # solve() only needs the route distance; the geometry stays encoded
+        planner = FuelPlanner(None, entry["route"]['distance'], entry["corridor_miles"])
+    stops, stats = planner.solve(entry["candidates"])
+    plan_id = None
+    if stops is not None:
+        plan_id = plan_context.save(entry["route"], entry["corridor_miles"], entry["candidates"], planner.route_points)
+    entry.update(station_version=version, stops=stops, stats=stats, plan_id=plan_id, priced_at=time.time())
+    return entry
+
+
+def reprice(entry: Dict[str, Any], version: str) -> Dict[str, Any]:
+    """Reload current prices for the lane's candidates (one query) and plan again."""
+    from routing.models import FuelStation
+
+    ids = {c['id'] for c in entry["candidates"]}
+    prices = dict(FuelStation.objects.filter(opis_id__in=ids).values_list('opis_id', 'retail_price'))
+    entry["candidates"] = [
+        {**c, 'price': float(prices[c['id']])} for c in entry["candidates"] if c['id'] in prices
+    ]
+    return price(entry, version)
+
+
+def serve(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """A stored lane ready to answer with, repriced first if station data changed."""
+    version = cached_station_version()
+    if entry.get("station_version") != version:
+        entry = reprice(entry, version)
+        store(entry)
+    return entry
+
+
+def refresh(entry: Optional[Dict[str, Any]]) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """('fresh' | 'repriced', entry) for a stored lane; ('missing', None) if it must be built."""
+    if entry is None:
+        return "missing", None
+    version = cached_station_version()
+    if entry.get("station_version") == version:
+        cache.touch(entry["key"], settings.LANE_CACHE_TTL_S)
+        return "fresh", entry
+    entry = reprice(entry, version)
+    store(entry)
+    return "repriced", entry
+
+
+def mine_lanes(entries: Iterable[Dict[str, Any]], top: int) -> List[Tuple[Any, Any, int, int]]:
+    """The `top` most requested (start, finish, corridor_miles, count) lanes in recorded traces."""
+    counts: Counter = Counter()
+    for entry in entries:
+        request = entry.get("input") or {}
+        if not isinstance(request, dict) or request.get("alternatives") or request.get("scenarios") \
+                or request.get("corridor_mode", "fixed") != "fixed":
+            continue
+        ends = []
+        for value in (request.get("start"), request.get("finish")):
+            if isinstance(value, dict) and 'lat' in value and 'lon' in value:
+                ends.append((float(value['lat']), float(value['lon'])))
+            elif isinstance(value, str) and value.strip():
+                ends.append(" ".join(value.split()))
+        if len(ends) == 2:
+            counts[(ends[0], ends[1], int(request.get("corridor_miles") or 10))] += 1
+    return [(start, finish, corridor, n) for (start, finish, corridor), n in counts.most_common(top)]
@@ -0,0 +1,192 @@
+"""
+Minimal in-process metrics registry (counters, gauges, histograms).
+
+Metrics are per worker process and need no external agent. Histograms keep
+cumulative bucket counts plus a bounded window of recent samples per label
+set, so percentiles such as p99 reflect current behaviour.
+"""
+import bisect
+import math
+import threading
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _label_key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._lock = threading.Lock()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help_text):
+        super().__init__(name, help_text)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0)
+
+    def samples(self) -> List[Tuple[LabelKey, float]]:
+        with self._lock:
+            return list(self._values.items())
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets: Iterable[float] = DEFAULT_LATENCY_BUCKETS, window: int = 2048):
+        super().__init__(name, help_text)
+        self.buckets = tuple(sorted(buckets))
+        self.window = window
+        self._series: Dict[LabelKey, dict] = {}
+
+    def _get(self, key: LabelKey) -> dict:
+        series = self._series.get(key)
+        if series is None:
+            series = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0, "recent": deque(maxlen=self.window)}
+            self._series[key] = series
+        return series
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._get(key)
+            series["counts"][bisect.bisect_left(self.buckets, value)] += 1
+            series["sum"] += value
+            series["count"] += 1
+            series["recent"].append(value)
+
+    def percentile(self, q: float, **labels) -> Optional[float]:
+        """q in [0, 100] over the recent window; None when there are no samples."""
+        with self._lock:
+            series = self._series.get(_label_key(labels))
+            recent = sorted(series["recent"]) if series else []
+        if not recent:
+            return None
+        # nearest-rank
+        idx = min(len(recent) - 1, max(0, math.ceil(q / 100.0 * len(recent)) - 1))
+        return recent[idx]
+
+    def samples(self) -> List[Tuple[LabelKey, dict]]:
+        with self._lock:
+            return [(k, {"counts": list(v["counts"]), "sum": v["sum"], "count": v["count"]}) for k, v in self._series.items()]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, help_text, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, help_text, **kwargs)
+                self._metrics[name] = metric
+            return metric
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        return self._register(Counter, name, help_text)
+
+    def gauge(self, name: str, help_text: str) -> Gauge:
+        return self._register(Gauge, name, help_text)
+
+    def histogram(self, name: str, help_text: str, **kwargs) -> Histogram:
+        return self._register(Histogram, name, help_text, **kwargs)
+
+    def all(self) -> List[_Metric]:
+        with self._lock:
+            return list(self._metrics.values())
+
+    def render_prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in sorted(self.all(), key=lambda m: m.name):
+            lines.append(f"# HELP {metric.name} {_escape_help(metric.help)}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            if isinstance(metric, Histogram):
+                for key, series in sorted(metric.samples()):
+                    cumulative = 0
+                    for bound, count in zip(metric.buckets + (math.inf,), series["counts"]):
+                        cumulative += count
+                        le = "+Inf" if bound == math.inf else _format_value(bound)
+                        lines.append(f"{metric.name}_bucket{_format_labels(key + (('le', le),))} {cumulative}")
+                    lines.append(f"{metric.name}_sum{_format_labels(key)} {_format_value(series['sum'])}")
+                    lines.append(f"{metric.name}_count{_format_labels(key)} {series['count']}")
+            else:
+                for key, value in sorted(metric.samples()):
+                    lines.append(f"{metric.name}{_format_labels(key)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape_help(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: LabelKey) -> str:
+    if not key:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label(value)}"' for name, value in key) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+REGISTRY = Registry()
+
+GEOCODE_SECONDS = REGISTRY.histogram(
+    "geocode_request_seconds", "End-to-end GeocodingRouter.geocode_string latency"
+)
+GEOCODE_PROVIDER_SECONDS = REGISTRY.histogram(
+    "geocode_provider_seconds", "Latency of individual geocoding provider calls"
+)
+GEOCODE_HEDGES = REGISTRY.counter(
+    "geocode_hedged_calls_total", "Provider calls launched as hedges while an earlier provider was still running"
+)
+CACHE_REQUESTS = REGISTRY.counter(
+    "cache_requests_total", "Cache lookups by cache and result (hit/miss)"
+)
+PLAN_CANDIDATES = REGISTRY.histogram(
+    "plan_candidate_stations", "Candidate stations considered per fuel plan",
+    buckets=(0, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000),
+)
@@ -1,50 +1,150 @@
 import requests
+import httpx
 import json
+import time
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.core.cache import cache
 
+from routing.services.circuit_breaker import CircuitOpenError, get_breaker
+from routing.services.http_client import async_client
+from routing.services.metrics import CACHE_REQUESTS, REGISTRY
+
+OSRM_REQUEST_SECONDS = REGISTRY.histogram("osrm_request_seconds", "Latency of OSRM route requests (cache misses)")
+
 class OSRMClient:
-    BASE_URL = "http://router.project-osrm.org/route/v1/driving"
+    BASE_URL = settings.OSRM_BASE_URL
+    TIMEOUT_S = 10
+    CACHE_TTL_S = 60 * 60 * 24
 
     @classmethod
-    def get_route(cls, start_coords: tuple[float, float], end_coords: tuple[float, float]):
+    def _request(cls, start_coords, end_coords, alternatives=0):
         """
-        Get driving route from OSRM.
-        Coords are (lat, lon).
-        OSRM expects {lon},{lat};{lon},{lat}
+        Cache key, URL and query params for a route (or up to `alternatives` routes).
+        Coords are (lat, lon); OSRM expects {lon},{lat};{lon},{lat}
         """
-        # Cache key
         cache_key = f"osrm_route:{start_coords}:{end_coords}"
-        cached = cache.get(cache_key)
-        if cached:
-            return cached
-
-        # Format URL
-        # OSRM expects lon,lat
         start_str = f"{start_coords[1]},{start_coords[0]}"
         end_str = f"{end_coords[1]},{end_coords[0]}"
-        
         url = f"{cls.BASE_URL}/{start_str};{end_str}"
         params = {
             "overview": "full",
             "geometries": "polyline6",
             "steps": "false"
         }
+        if alternatives:
+            cache_key = f"osrm_routes:{alternatives}:{start_coords}:{end_coords}"
+            params["alternatives"] = str(alternatives)
+        return cache_key, url, params
+
+    @staticmethod
+    def _check(data):
+        if data["code"] != "Ok":
+            raise ValueError(f"OSRM Error: {data.get('message')}")
+        return data
+
+    @classmethod
+    def _parse(cls, data):
+        return cls._check(data)["routes"][0]
+
+    @classmethod
+    def _parse_all(cls, data):
+        return cls._check(data)["routes"]
 
+    @classmethod
+    def get_route(cls, start_coords: tuple[float, float], end_coords: tuple[float, float]):
+        """
+        Get driving route from OSRM.
+        Coords are (lat, lon).
+        """
+        cache_key, url, params = cls._request(start_coords, end_coords)
+        return cls._fetch(cache_key, url, params, cls._parse)
+
+    @classmethod
+    def get_routes(cls, start_coords: tuple[float, float], end_coords: tuple[float, float], alternatives: int = 2):
+        """
+        The primary route plus up to `alternatives` alternative routes, fastest first.
+        OSRM may return fewer alternatives than asked (or none).
+        """
+        cache_key, url, params = cls._request(start_coords, end_coords, alternatives)
+        return cls._fetch(cache_key, url, params, cls._parse_all)
+
+    @classmethod
+    def _fetch(cls, cache_key, url, params, parse):
+        cached = cache.get(cache_key)
+        CACHE_REQUESTS.inc(cache="osrm_route", result="hit" if cached else "miss")
+        if cached:
+            return cached
+
+        breaker = get_breaker("osrm", timeout_hint_s=cls.TIMEOUT_S)
+        if not breaker.allow():
+            raise CircuitOpenError("Routing service is temporarily unavailable (circuit open). Retry shortly.")
+
+        t0 = time.monotonic()
         try:
-            response = requests.get(url, params=params, timeout=10)
+            response = requests.get(url, params=params, timeout=cls.TIMEOUT_S)
+            OSRM_REQUEST_SECONDS.observe(time.monotonic() - t0, outcome=str(response.status_code))
+            if response.status_code >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
             response.raise_for_status()
-            data = response.json()
-            
-            if data["code"] != "Ok":
-                raise ValueError(f"OSRM Error: {data.get('message')}")
+            result = parse(response.json())
 
-            result = data["routes"][0]
-            
             # Cache for 24h
-            cache.set(cache_key, result, timeout=60*60*24)
+            cache.set(cache_key, result, timeout=cls.CACHE_TTL_S)
             return result
-            
+
         except requests.RequestException as e:
+            if getattr(e, "response", None) is None:
+                # Connection errors and timeouts; HTTP errors were recorded above
+                breaker.record_failure()
             # In production, log this
             raise ConnectionError(f"Failed to connect to routing service: {str(e)}")
+
+    @classmethod
+    async def aget_route(cls, start_coords: tuple[float, float], end_coords: tuple[float, float]):
+        """
+        Async get_route for ASGI views: same cache, breaker and errors, but the
+        HTTP call goes through the shared httpx client instead of a blocked thread.
+        """
+        cache_key, url, params = cls._request(start_coords, end_coords)
+        return await cls._afetch(cache_key, url, params, cls._parse)
+
+    @classmethod
+    async def aget_routes(cls, start_coords: tuple[float, float], end_coords: tuple[float, float], alternatives: int = 2):
+        """Async get_routes."""
+        cache_key, url, params = cls._request(start_coords, end_coords, alternatives)
+        return await cls._afetch(cache_key, url, params, cls._parse_all)
+
+    @classmethod
+    async def _afetch(cls, cache_key, url, params, parse):
+        cached = await cache.aget(cache_key)
+        CACHE_REQUESTS.inc(cache="osrm_route", result="hit" if cached else "miss")
+        if cached:
+            return cached
+
+        breaker = get_breaker("osrm", timeout_hint_s=cls.TIMEOUT_S)
+        if not await sync_to_async(breaker.allow, thread_sensitive=False)():
+            raise CircuitOpenError("Routing service is temporarily unavailable (circuit open). Retry shortly.")
+
+        t0 = time.monotonic()
+        try:
+            response = await async_client().get(url, params=params, timeout=cls.TIMEOUT_S)
+            OSRM_REQUEST_SECONDS.observe(time.monotonic() - t0, outcome=str(response.status_code))
+        except httpx.HTTPError as e:
+            await sync_to_async(breaker.record_failure, thread_sensitive=False)()
+            raise ConnectionError(f"Failed to connect to routing service: {str(e)}")
+
+        if response.status_code >= 500:
+            await sync_to_async(breaker.record_failure, thread_sensitive=False)()
+        else:
+            await sync_to_async(breaker.record_success, thread_sensitive=False)()
+        try:
+            response.raise_for_status()
+        except httpx.HTTPStatusError as e:
+            raise ConnectionError(f"Failed to connect to routing service: {str(e)}")
+
+        result = parse(response.json())
+        await cache.aset(cache_key, result, timeout=cls.CACHE_TTL_S)
+        return result
@@ -0,0 +1,116 @@
+"""
+Plan contexts: what a route plan was computed from, kept so a truck can be
+replanned mid-trip without geocoding, routing or querying stations again.
+
+A context holds the route polyline and distance, the corridor width and the
+candidate stations already located along the route. Its id (the `plan_id` of
+route-plan responses) is a hash of the route geometry and corridor width (for an
+adaptive corridor, the width of each segment), so identical routes planned the
+same way share one context. Contexts live in the default cache for
+PLAN_CONTEXT_TTL_S. Each process also keeps its most recently used contexts with
+their decoded route and RouteIndex, so replanning a hot plan costs a snap and a
+solve.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import cached_property
+from typing import List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from routing.services.corridor import RouteIndex
+from routing.services.geometry import GeometryService
+
+CACHE_PREFIX = "plan_context:"
+LOCAL_CONTEXTS = 128
+
+_local: "OrderedDict[str, PlanContext]" = OrderedDict()
+_local_lock = threading.Lock()
+
+
+def plan_id_for(geometry: str, corridor_miles: float, widths: Optional[Sequence[float]] = None) -> str:
+    corridor = f"{corridor_miles}" if widths is None else f"{corridor_miles}/" + ",".join(f"{w}" for w in widths)
+    return hashlib.blake2b(f"{corridor}:{geometry}".encode(), digest_size=12).hexdigest()
+
+
+class PlanContext:
+    def __init__(self, plan_id: str, geometry: str, distance_meters: float, corridor_miles: float,
+                 candidates: List[dict], points: Optional[Sequence[Tuple[float, float]]] = None,
+                 widths: Optional[List[float]] = None):
+        self.plan_id = plan_id
+        self.geometry = geometry
+        self.distance_meters = distance_meters
+        self.corridor_miles = corridor_miles
+        self.candidates = candidates
+        # Per-segment corridor widths of an adaptive plan (None for a fixed corridor)
+        self.widths = widths
+        self._points = points
+
+    @property
+    def total_miles(self) -> float:
+        return GeometryService.meters_to_miles(self.distance_meters)
+
+    @cached_property
+    def points(self) -> Sequence[Tuple[float, float]]:
+        return self._points if self._points is not None else GeometryService.decode_polyline(self.geometry)
+
+    @cached_property
+    def route_index(self) -> RouteIndex:
+        return RouteIndex(self.points)
+
+    def snap(self, lat: float, lon: float, max_off_miles: float) -> Optional[Tuple[float, float]]:
+        """(miles from the trip start, miles off the route) of a position, or None if off the route."""
+        hit = self.route_index.locate(lat, lon, max_off_miles)
+        if hit is None:
+            return None
+        along, off = hit
+        return self.route_index.fraction(along) * self.total_miles, off
+
+    def to_cache(self) -> dict:
+        return {
+            "geometry": self.geometry,
+            "distance_meters": self.distance_meters,
+            "corridor_miles": self.corridor_miles,
+            "candidates": self.candidates,
+            "widths": self.widths,
+        }
+
+
+def _remember(context: PlanContext):
+    with _local_lock:
+        _local[context.plan_id] = context
+        _local.move_to_end(context.plan_id)
+        while len(_local) > LOCAL_CONTEXTS:
+            _local.popitem(last=False)
+
+
+def save(route_data: dict, corridor_miles: float, candidates: List[dict], points=None, widths=None) -> str:
+    """
+    Keep the context of a successful plan; returns its plan id. Pass the segment
+    widths of an adaptive corridor, whose candidates differ from a fixed one's.
+    """
+    plan_id = plan_id_for(route_data['geometry'], corridor_miles, widths)
+    context = PlanContext(plan_id, route_data['geometry'], route_data['distance'], corridor_miles, candidates, points,
+                          widths)
+    cache.set(CACHE_PREFIX + plan_id, context.to_cache(), timeout=settings.PLAN_CONTEXT_TTL_S)
+    _remember(context)
+    return plan_id
+
+
+def load(plan_id: str) -> Optional[PlanContext]:
+    with _local_lock:
+        context = _local.get(plan_id)
+        if context is not None:
+            _local.move_to_end(plan_id)
+    if context is not None:
+        # Cache expiry still applies to contexts this process remembers
+        return context if cache.touch(CACHE_PREFIX + plan_id, settings.PLAN_CONTEXT_TTL_S) else None
+
+    stored = cache.get(CACHE_PREFIX + plan_id)
+    if stored is None:
+        return None
+    context = PlanContext(plan_id, **stored)
+    _remember(context)
+    return context
@@ -0,0 +1,108 @@
+"""
+Postgres-backed queue for plan jobs (no broker needed).
+
+Workers claim the highest-priority, oldest queued job with
+SELECT ... FOR UPDATE SKIP LOCKED, so any number of `run_plan_worker`
+processes can poll the same table without handing out a job twice. Results are
+kept for `result_ttl_s` after the job finishes, then purged.
+"""
+import time
+import logging
+from datetime import timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from routing.models import PlanJob
+
+logger = logging.getLogger(__name__)
+
+
+def submit(kind: str, payload: dict, priority: int = 5, timeout_s: Optional[int] = None,
+           result_ttl_s: Optional[int] = None) -> PlanJob:
+    return PlanJob.objects.create(
+        kind=kind,
+        payload=payload,
+        priority=priority,
+        timeout_s=timeout_s or settings.PLAN_JOB_DEFAULT_TIMEOUT_S,
+        result_ttl_s=result_ttl_s or settings.PLAN_JOB_RESULT_TTL_S,
+    )
+
+
+def claim(worker: str) -> Optional[PlanJob]:
+    """Atomically move the next queued job to running, or None if the queue is empty."""
+    with transaction.atomic():
+        job = (
+            PlanJob.objects.select_for_update(skip_locked=True)
+            .filter(state=PlanJob.STATE_QUEUED)
+            .order_by("-priority", "created_at")
+            .first()
+        )
+        if job is None:
+            return None
+        job.state = PlanJob.STATE_RUNNING
+        job.started_at = timezone.now()
+        job.worker = worker
+        job.save(update_fields=["state", "started_at", "worker"])
+    return job
+
+
+def finish(job: PlanJob, status_code: int, result) -> bool:
+    """
+    Store a job's outcome. Returns False if the job is no longer running (it was
+    already failed for exceeding its timeout), in which case the late result is dropped.
+    """
+    now = timezone.now()
+    state = PlanJob.STATE_SUCCEEDED if status_code < 500 else PlanJob.STATE_FAILED
+    return bool(PlanJob.objects.filter(pk=job.pk, state=PlanJob.STATE_RUNNING).update(
+        state=state,
+        status_code=status_code,
+        result=result,
+        finished_at=now,
+        expires_at=now + timedelta(seconds=job.result_ttl_s),
+    ))
+
+
+def fail_timed_out(now=None) -> int:
+    """Fail running jobs past their timeout with 504 (the worker's late result is discarded)."""
+    now = now or timezone.now()
+    failed = 0
+    for job in PlanJob.objects.filter(state=PlanJob.STATE_RUNNING).only("id", "started_at", "timeout_s", "result_ttl_s"):
+        if job.started_at + timedelta(seconds=job.timeout_s) < now:
+            failed += PlanJob.objects.filter(pk=job.pk, state=PlanJob.STATE_RUNNING).update(
+                state=PlanJob.STATE_FAILED,
+                status_code=504,
+                result={"error": f"Plan job exceeded its {job.timeout_s}s timeout."},
+                finished_at=now,
+                expires_at=now + timedelta(seconds=job.result_ttl_s),
+            )
+    if failed:
+        logger.warning(f"Failed {failed} plan job(s) that exceeded their timeout")
+    return failed
+
+
+def purge_expired(now=None) -> int:
+    deleted, _ = PlanJob.objects.filter(
+        state__in=PlanJob.FINISHED_STATES, expires_at__lt=now or timezone.now()
+    ).delete()
+    return deleted
+
+
+def get_live(job_id) -> Optional[PlanJob]:
+    """The job, unless it does not exist or its result has expired."""
+    job = PlanJob.objects.filter(pk=job_id).first()
+    if job is None or (job.expires_at is not None and job.expires_at < timezone.now()):
+        return None
+    return job
+
+
+def wait_for(job_id, wait_s: float, poll_s: float = 0.25) -> Optional[PlanJob]:
+    """Long-poll: the job once finished, or its current state after wait_s."""
+    deadline = time.monotonic() + max(0.0, wait_s)
+    while True:
+        job = get_live(job_id)
+        if job is None or job.state in PlanJob.FINISHED_STATES or time.monotonic() >= deadline:
+            return job
+        time.sleep(min(poll_s, max(0.0, deadline - time.monotonic())))
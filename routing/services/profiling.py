@@ -0,0 +1,223 @@
+"""
+On-demand profiling of a single request.
+
+Two modes:
+  - "sample": a background thread snapshots the request thread's stack every
+    `interval_ms`. Overhead is bounded by the interval, so it is safe in production.
+  - "cprofile": deterministic cProfile (exact call counts, noticeably slower),
+    with the stack sampler running alongside for the flamegraph.
+
+Either way the stored profile holds collapsed stacks (`frame;frame;frame count`,
+the input format of flamegraph.pl, speedscope and friends) and the top functions.
+Profiles live in the default cache for PROFILING_TTL_S under a random id.
+
+Admission is bounded: only a fraction of flagged requests is profiled
+(PROFILING_SAMPLE_RATE), and at most PROFILING_MAX_CONCURRENT at a time per process.
+"""
+import cProfile
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+MODE_SAMPLE = "sample"
+MODE_CPROFILE = "cprofile"
+MODES = (MODE_SAMPLE, MODE_CPROFILE)
+
+SKIP_DISABLED = "disabled"
+SKIP_NOT_PERMITTED = "not_permitted"
+SKIP_BAD_MODE = "unknown_mode"
+SKIP_SAMPLED_OUT = "sampled_out"
+SKIP_BUSY = "busy"
+SKIP_STREAMING = "streaming"
+
+TOP_FUNCTIONS = 30
+CACHE_PREFIX = "profile:"
+
+_slots = None
+_slots_lock = threading.Lock()
+
+
+def _admission() -> threading.BoundedSemaphore:
+    global _slots
+    with _slots_lock:
+        if _slots is None:
+            _slots = threading.BoundedSemaphore(settings.PROFILING_MAX_CONCURRENT)
+        return _slots
+
+
+def _frame_label(filename: str, name: str) -> str:
+    for root in (str(settings.BASE_DIR) + os.sep, os.path.dirname(os.__file__) + os.sep):
+        if filename.startswith(root):
+            filename = filename[len(root):]
+            break
+    else:
+        marker = "site-packages" + os.sep
+        if marker in filename:
+            filename = filename.split(marker, 1)[1]
+    return f"{filename}:{name}"
+
+
+def collapse(frame, max_depth: int = 256) -> str:
+    """Root-first `file:function;...` for a frame's stack."""
+    labels = []
+    while frame is not None and len(labels) < max_depth:
+        labels.append(_frame_label(frame.f_code.co_filename, frame.f_code.co_name))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class StackSampler(threading.Thread):
+    """Samples one thread's stack at a fixed interval until stopped."""
+
+    def __init__(self, thread_id: int, interval_s: float):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval_s = interval_s
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._halt = threading.Event()
+
+    def run(self):
+        while not self._halt.wait(self.interval_s):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[collapse(frame)] += 1
+                self.samples += 1
+            del frame
+
+    def stop(self):
+        self._halt.set()
+        self.join()
+
+
+def top_from_samples(stacks: Counter, limit: int = TOP_FUNCTIONS) -> List[Dict[str, Any]]:
+    """Functions by self samples (leaf frame) with their inclusive samples."""
+    total = sum(stacks.values()) or 1
+    own: Counter = Counter()
+    inclusive: Counter = Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(";")
+        own[frames[-1]] += count
+        for label in set(frames):
+            inclusive[label] += count
+    return [
+        {
+            "function": label,
+            "self_samples": own[label],
+            "total_samples": inclusive[label],
+            "self_pct": round(100.0 * own[label] / total, 1),
+            "total_pct": round(100.0 * inclusive[label] / total, 1),
+        }
+        for label, _ in sorted(own.items(), key=lambda item: (-item[1], -inclusive[item[0]]))[:limit]
+    ]
+
+
+def top_from_cprofile(profiler: cProfile.Profile, limit: int = TOP_FUNCTIONS) -> List[Dict[str, Any]]:
+    """Functions by own time, with call counts and cumulative time."""
+    stats = pstats.Stats(profiler).stats
+    rows = sorted(stats.items(), key=lambda item: -item[1][2])[:limit]
+    top = []
+    for (filename, lineno, name), (primitive_calls, calls, own_s, cumulative_s, _) in rows:
+        top.append({
+            "function": f"{_frame_label(filename, name)}:{lineno}" if lineno else name,
+            "calls": calls,
+            "primitive_calls": primitive_calls,
+            "self_ms": round(own_s * 1000, 3),
+            "total_ms": round(cumulative_s * 1000, 3),
+        })
+    return top
+
+
+class RequestProfile:
+    """Profiles the calling thread from start() until finish()."""
+
+    def __init__(self, mode: str, interval_ms: float):
+        self.mode = mode
+        self.interval_ms = interval_ms
+        self.id = uuid.uuid4().hex
+        self._sampler = StackSampler(threading.get_ident(), interval_ms / 1000.0)
+        self._profiler = cProfile.Profile() if mode == MODE_CPROFILE else None
+        self._started = None
+        self._duration_s = None
+
+    def start(self):
+        if self._profiler is not None:
+            # Raises ValueError if another profiler is already active in this thread
+            self._profiler.enable()
+        self._started = time.perf_counter()
+        self._sampler.start()
+
+    def stop(self):
+        """Stop profiling (in the profiled thread); finish() may then run in any thread."""
+        if self._duration_s is None:
+            if self._profiler is not None:
+                self._profiler.disable()
+            self._sampler.stop()
+            self._duration_s = time.perf_counter() - self._started
+
+    def discard(self):
+        """Stop profiling without storing anything."""
+        try:
+            self.stop()
+        finally:
+            _admission().release()
+
+    def finish(self, **context) -> str:
+        """Stop profiling, store the result and return its id."""
+        try:
+            self.stop()
+        finally:
+            _admission().release()
+
+        stacks = Counter(dict(self._sampler.stacks.most_common(settings.PROFILING_MAX_STACKS)))
+        result = {
+            "profile_id": self.id,
+            "mode": self.mode,
+            "interval_ms": self.interval_ms,
+            "duration_ms": round(self._duration_s * 1000, 1),
+            "samples": self._sampler.samples,
+            "created_at": time.time(),
+            **context,
+            "top": top_from_cprofile(self._profiler) if self._profiler is not None else top_from_samples(stacks),
+            "collapsed": "".join(f"{stack} {count}\n" for stack, count in stacks.most_common()),
+        }
+        cache.set(CACHE_PREFIX + self.id, result, timeout=settings.PROFILING_TTL_S)
+        return self.id
+
+
+def start_profile(mode: str, interval_ms: Optional[float] = None) -> Tuple[Optional[RequestProfile], Optional[str]]:
+    """
+    Start profiling the current thread if admission allows it.
+    Returns (profile, None) or (None, skip reason). The caller checks permissions.
+    """
+    if not settings.PROFILING_ENABLED:
+        return None, SKIP_DISABLED
+    mode = mode.strip().lower()
+    if mode not in MODES:
+        return None, SKIP_BAD_MODE
+    if random.random() >= settings.PROFILING_SAMPLE_RATE:
+        return None, SKIP_SAMPLED_OUT
+    if not _admission().acquire(blocking=False):
+        return None, SKIP_BUSY
+
+    interval_ms = max(settings.PROFILING_MIN_INTERVAL_MS, float(interval_ms or settings.PROFILING_INTERVAL_MS))
+    profile = RequestProfile(mode, interval_ms)
+    try:
+        profile.start()
+    except ValueError:
+        _admission().release()
+        return None, SKIP_BUSY
+    return profile, None
+
+
+def load_profile(profile_id: str) -> Optional[Dict[str, Any]]:
+    return cache.get(CACHE_PREFIX + profile_id)
@@ -0,0 +1,45 @@
+"""
+SQL query accounting.
+
+One execute wrapper is installed on every database connection as it is created
+(RoutingConfig.ready). Each statement is counted in the process metrics under the
+stage it ran in, and added to the active timing session, if any (see
+routing.services.timing), so requests, command phases and tests can see how many
+queries each stage issued and how long they took.
+"""
+import time
+
+from django.db.backends.signals import connection_created
+
+from routing.services import timing
+from routing.services.metrics import REGISTRY
+
+DB_QUERIES = REGISTRY.counter("db_queries_total", "SQL statements executed, by stage")
+DB_SECONDS = REGISTRY.counter("db_query_seconds_total", "Time spent executing SQL, by stage")
+
+
+def account_query(execute, sql, params, many, context):
+    t0 = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - t0
+        stage = timing.current_stage()
+        DB_QUERIES.inc(stage=stage)
+        DB_SECONDS.inc(elapsed, stage=stage)
+        timings = timing.current()
+        if timings is not None:
+            timings.add_query(stage, sql, elapsed)
+
+
+def install(connection):
+    if account_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(account_query)
+
+
+def _on_connection_created(sender, connection, **kwargs):
+    install(connection)
+
+
+def enable():
+    connection_created.connect(_on_connection_created, dispatch_uid="routing.query_accounting")
@@ -0,0 +1,145 @@
+"""
+Cluster-wide outbound rate limiting (GCRA) for geocoding providers.
+
+One limiter per (provider, API key) is shared by every API worker and import job
+through Redis: a Lua script keeps the "theoretical arrival time" per key and
+reads Redis' own clock, so all machines agree. When the default cache is not
+Redis (local dev, tests) an equivalent in-process limiter is used.
+
+Two traffic classes share each bucket. Interactive calls (live /route-plan/
+requests) may use the full burst; bulk calls (imports) are only admitted while
+`bulk_reserve` of the burst is still free, so a running import never starves
+live traffic.
+"""
+import hashlib
+import logging
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+
+from routing.services.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+
+RATE_LIMIT_WAIT_SECONDS = REGISTRY.histogram(
+    "outbound_rate_limit_wait_seconds", "Time spent waiting for an outbound rate limit token"
+)
+RATE_LIMIT_REJECTIONS = REGISTRY.counter(
+    "outbound_rate_limit_rejections_total", "Outbound calls dropped because no token arrived before the deadline"
+)
+
+# KEYS[1] = bucket key; ARGV = emission interval (s), tolerance (s, may be negative), ttl (s)
+# Returns {allowed (0/1), retry_after_us}
+_GCRA_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local emission = tonumber(ARGV[1])
+local tolerance = tonumber(ARGV[2])
+local tat = tonumber(redis.call('GET', KEYS[1]) or 0)
+local wait = tat - now - tolerance
+if wait > 0 then
+  return {0, math.ceil(wait * 1000000)}
+end
+redis.call('SET', KEYS[1], tostring(math.max(tat, now) + emission), 'EX', tonumber(ARGV[3]))
+return {1, 0}
+"""
+
+
+class _LocalGCRA:
+    def __init__(self):
+        self._tat: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, key: str, emission: float, tolerance: float) -> Tuple[bool, float]:
+        now = time.monotonic()
+        with self._lock:
+            # The unclamped TAT matters for negative (bulk) tolerances: bulk
+            # is admitted only once the bucket has been idle long enough.
+            tat = self._tat.get(key, 0.0)
+            wait = tat - now - tolerance
+            if wait > 0:
+                return False, wait
+            self._tat[key] = max(tat, now) + emission
+            return True, 0.0
+
+
+_local_gcra = _LocalGCRA()
+_redis_script = None
+_redis_checked = False
+
+
+def _redis_gcra():
+    """The registered Lua script when the default cache is django-redis, else None."""
+    global _redis_script, _redis_checked
+    if not _redis_checked:
+        _redis_checked = True
+        try:
+            from django_redis import get_redis_connection
+            _redis_script = get_redis_connection("default").register_script(_GCRA_LUA)
+        except Exception as e:
+            logger.info(f"Outbound rate limiter using in-process buckets ({e.__class__.__name__}).")
+            _redis_script = None
+    return _redis_script
+
+
+class RateLimiter:
+    def __init__(self, name: str, rate: float, burst: int = 1, bulk_reserve: float = 0.2):
+        """
+        rate: sustained calls per second; burst: calls allowed back-to-back;
+        bulk_reserve: fraction of the burst (at least one slot) held back from bulk traffic.
+        """
+        self.name = name
+        self.emission = 1.0 / rate
+        self.tolerance = self.emission * (max(1, burst) - 1)
+        reserved_slots = max(1.0, bulk_reserve * max(1, burst))
+        self.bulk_tolerance = self.tolerance - reserved_slots * self.emission
+        self.ttl = int(self.emission * max(1, burst)) + 60
+
+    def _key(self, api_key: str) -> str:
+        digest = hashlib.sha1((api_key or "").encode("utf-8")).hexdigest()[:12]
+        return f"rl:{self.name}:{digest}"
+
+    def try_acquire(self, api_key: str = "", traffic: str = INTERACTIVE) -> Tuple[bool, float]:
+        """Returns (allowed, retry_after_s)."""
+        tolerance = self.bulk_tolerance if traffic == BULK else self.tolerance
+        key = self._key(api_key)
+        script = _redis_gcra()
+        if script is not None:
+            try:
+                allowed, retry_us = script(keys=[key], args=[self.emission, tolerance, self.ttl])
+                return bool(allowed), int(retry_us) / 1_000_000
+            except Exception as e:
+                logger.warning(f"Rate limiter '{self.name}' Redis error, using local bucket: {e}")
+        return _local_gcra(key, self.emission, tolerance)
+
+    def acquire(self, api_key: str = "", traffic: str = INTERACTIVE, deadline=None) -> bool:
+        """
+        Block until a token is granted. With a Deadline, give up (False) as soon as
+        the next token would arrive after it.
+        """
+        started = time.monotonic()
+        while True:
+            allowed, retry_after = self.try_acquire(api_key, traffic)
+            if allowed:
+                RATE_LIMIT_WAIT_SECONDS.observe(time.monotonic() - started, provider=self.name, traffic=traffic)
+                return True
+            if deadline is not None and retry_after >= deadline.remaining():
+                RATE_LIMIT_REJECTIONS.inc(provider=self.name, traffic=traffic)
+                return False
+            time.sleep(retry_after)
+
+
+_limiters: Dict[str, Optional[RateLimiter]] = {}
+
+
+def get_rate_limiter(name: str) -> Optional[RateLimiter]:
+    """Process-wide limiter for a provider, or None if it has no configured limit."""
+    if name not in _limiters:
+        conf = getattr(settings, "OUTBOUND_RATE_LIMITS", {}).get(name)
+        _limiters[name] = RateLimiter(name, **conf) if conf else None
+    return _limiters[name]
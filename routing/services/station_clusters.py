@@ -0,0 +1,77 @@
+"""
+Station clusters: truck stops that share an interchange.
+
+Several stations often sit within a few hundred meters of each other at one
+exit. To the planner they differ only in price, so FuelPlanner.solve plans over
+the cheapest member of each cluster and lists the others with the stop it picks.
+
+Clusters are leader-based. Stations are visited in a fixed order; each one not
+yet assigned seeds a cluster and takes every unassigned station within
+CLUSTER_RADIUS_MILES of it. A cluster therefore spans at most twice the radius,
+and no chain of stations along a commercial strip is merged into one. There is
+no road network here, so "reached from the same exit" is approximated by
+proximity; the radius is kept far below interchange spacing.
+
+Stored as FuelStation.cluster_id (the pk of the seed station; null for stations
+alone at their location) by rebuild_station_clusters, which import_fuel_prices
+runs after geocoding.
+"""
+import math
+from collections import defaultdict
+from typing import Dict, Hashable, Iterable, Tuple
+
+from routing.services.corridor import MILES_PER_DEG_LAT, haversine_miles
+
+CLUSTER_RADIUS_MILES = 0.2
+
+
+def cluster_points(points: Iterable[Tuple[Hashable, float, float]],
+                   radius_miles: float = CLUSTER_RADIUS_MILES) -> Dict[Hashable, Hashable]:
+    """
+    points: (key, lat, lon) in seeding order. Returns {key: seed key} for every
+    station in a cluster of two or more; lone stations are left out.
+    """
+    points = list(points)
+    cell = radius_miles / MILES_PER_DEG_LAT
+    grid = defaultdict(list)
+    for n, (_, lat, lon) in enumerate(points):
+        grid[(math.floor(lat / cell), math.floor(lon / cell))].append(n)
+
+    seed_of = {}
+    for n, (key, lat, lon) in enumerate(points):
+        if n in seed_of:
+            continue
+        members = [n]
+        reach_lon = math.ceil(1 / max(math.cos(math.radians(lat)), 1e-6))
+        ci, cj = math.floor(lat / cell), math.floor(lon / cell)
+        for i in range(ci - 1, ci + 2):
+            for j in range(cj - reach_lon, cj + reach_lon + 1):
+                for m in grid.get((i, j), ()):
+                    if m != n and m not in seed_of and \
+                            haversine_miles(lat, lon, points[m][1], points[m][2]) <= radius_miles:
+                        members.append(m)
+        for m in members:
+            seed_of[m] = n
+
+    sizes = defaultdict(int)
+    for seed in seed_of.values():
+        sizes[seed] += 1
+    return {points[m][0]: points[seed][0] for m, seed in seed_of.items() if sizes[seed] > 1}
+
+
+def rebuild_station_clusters(radius_miles: float = CLUSTER_RADIUS_MILES, batch_size: int = 2000) -> Tuple[int, int]:
+    """Recompute FuelStation.cluster_id for all located stations; returns (clusters, clustered stations)."""
+    from django.db import transaction
+    from routing.models import FuelStation
+
+    rows = FuelStation.objects.filter(location__isnull=False).order_by('id').values_list('id', 'location')
+    assignment = cluster_points((pk, location.y, location.x) for pk, location in rows.iterator(chunk_size=20000))
+
+    changed = [
+        FuelStation(id=pk, cluster_id=assignment.get(pk))
+        for pk, cluster_id in FuelStation.objects.values_list('id', 'cluster_id').iterator(chunk_size=20000)
+        if assignment.get(pk) != cluster_id
+    ]
+    with transaction.atomic():
+        FuelStation.objects.bulk_update(changed, ['cluster_id'], batch_size=batch_size)
+    return len(set(assignment.values())), len(assignment)
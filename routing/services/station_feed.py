@@ -0,0 +1,148 @@
+"""
+Station price feed readers/writers.
+
+Every reader yields column batches: dicts mapping feed header -> list of values,
+restricted to the columns the loader uses. CSV is read with the stdlib; Parquet
+and Arrow IPC go through pyarrow, reading only the needed columns batch by batch.
+"""
+import csv
+import logging
+from typing import Any, Dict, Iterator, List
+
+logger = logging.getLogger(__name__)
+
+# Feed headers used by the loader
+OPIS_ID = "OPIS Truckstop ID"
+NAME = "Truckstop Name"
+ADDRESS = "Address"
+CITY = "City"
+STATE = "State"
+RACK_ID = "Rack ID"
+RETAIL_PRICE = "Retail Price"
+FEED_COLUMNS = [OPIS_ID, NAME, ADDRESS, CITY, STATE, RACK_ID, RETAIL_PRICE]
+
+# Optional seed columns written by `export_fuel_stations`, so an import can skip geocoding
+LATITUDE = "Latitude"
+LONGITUDE = "Longitude"
+GEOCODE_SOURCE = "Geocode Source"
+SEED_COLUMNS = [LATITUDE, LONGITUDE, GEOCODE_SOURCE]
+
+FORMATS = ("csv", "parquet", "arrow")
+
+ColumnBatch = Dict[str, List[Any]]
+
+
+def require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise ImportError("Parquet/Arrow support requires pyarrow (pip install pyarrow).")
+    return pyarrow
+
+
+def iter_csv_batches(path: str, batch_size: int = 50000) -> Iterator[ColumnBatch]:
+    with open(path, "r", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        columns = [c for c in FEED_COLUMNS + SEED_COLUMNS if c in (reader.fieldnames or [])]
+        batch: ColumnBatch = {c: [] for c in columns}
+        n = 0
+        for row in reader:
+            for c in columns:
+                batch[c].append(row.get(c))
+            n += 1
+            if n >= batch_size:
+                yield batch
+                batch, n = {c: [] for c in columns}, 0
+        if n:
+            yield batch
+
+
+def iter_parquet_batches(path: str, batch_size: int = 65536) -> Iterator[ColumnBatch]:
+    require_pyarrow()
+    import pyarrow.parquet as pq
+
+    pf = pq.ParquetFile(path)
+    names = set(pf.schema_arrow.names)
+    columns = [c for c in FEED_COLUMNS + SEED_COLUMNS if c in names]
+    for batch in pf.iter_batches(batch_size=batch_size, columns=columns):
+        yield batch.to_pydict()
+
+
+def iter_arrow_batches(path: str, batch_size: int = 65536) -> Iterator[ColumnBatch]:
+    """Arrow IPC file (Feather v2) or stream; batches are memory-mapped, not copied up front."""
+    pa = require_pyarrow()
+
+    with pa.memory_map(path, "r") as source:
+        try:
+            reader = pa.ipc.open_file(source)
+            batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+            schema = reader.schema
+        except pa.ArrowInvalid:
+            source.seek(0)
+            reader = pa.ipc.open_stream(source)
+            batches = iter(reader)
+            schema = reader.schema
+
+        columns = [c for c in FEED_COLUMNS + SEED_COLUMNS if c in schema.names]
+        for batch in batches:
+            batch = batch.select(columns)
+            for offset in range(0, batch.num_rows, batch_size):
+                yield batch.slice(offset, batch_size).to_pydict()
+
+
+def iter_feed_batches(path: str, fmt: str = "csv") -> Iterator[ColumnBatch]:
+    if fmt == "csv":
+        return iter_csv_batches(path)
+    if fmt == "parquet":
+        return iter_parquet_batches(path)
+    if fmt == "arrow":
+        return iter_arrow_batches(path)
+    raise ValueError(f"Unsupported feed format: {fmt} (expected one of {', '.join(FORMATS)})")
+
+
+def export_stations_parquet(path: str, queryset, chunk_size: int = 50000) -> int:
+    """
+    Write FuelStation rows (feed columns + location + geocode_source) to Parquet,
+    streaming the queryset in chunks. Returns the number of rows written.
+    """
+    pa = require_pyarrow()
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        (OPIS_ID, pa.int64()),
+        (NAME, pa.string()),
+        (ADDRESS, pa.string()),
+        (CITY, pa.string()),
+        (STATE, pa.string()),
+        (RACK_ID, pa.int64()),
+        (RETAIL_PRICE, pa.float64()),
+        (LATITUDE, pa.float64()),
+        (LONGITUDE, pa.float64()),
+        (GEOCODE_SOURCE, pa.string()),
+    ])
+
+    rows = queryset.order_by("opis_id").values_list(
+        "opis_id", "name", "address", "city", "state", "rack_id", "retail_price", "location", "geocode_source"
+    ).iterator(chunk_size=chunk_size)
+
+    written = 0
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        while True:
+            chunk = [r for _, r in zip(range(chunk_size), rows)]
+            if not chunk:
+                break
+            cols: ColumnBatch = {name: [] for name in schema.names}
+            for opis_id, name, address, city, state, rack_id, price, loc, source in chunk:
+                cols[OPIS_ID].append(opis_id)
+                cols[NAME].append(name)
+                cols[ADDRESS].append(address)
+                cols[CITY].append(city)
+                cols[STATE].append(state)
+                cols[RACK_ID].append(rack_id)
+                cols[RETAIL_PRICE].append(float(price) if price is not None else None)
+                cols[LATITUDE].append(loc.y if loc else None)
+                cols[LONGITUDE].append(loc.x if loc else None)
+                cols[GEOCODE_SOURCE].append(source)
+            writer.write_table(pa.Table.from_pydict(cols, schema=schema))
+            written += len(chunk)
+    return written
@@ -0,0 +1,61 @@
+"""
+Read-only, in-memory station snapshots for planning without per-trip queries.
+
+Rows are plain dicts (no GEOS objects) so a snapshot is cheap to pickle and can
+be shared with worker processes, either inherited on fork or sent once per
+worker through a pool initializer.
+"""
+import hashlib
+
+from routing.services.corridor import StationGrid
+
+# station_version is cached briefly so per-request users cost no query
+STATION_VERSION_CACHE_KEY = "stations:version"
+STATION_VERSION_TTL_S = 60
+
+SNAPSHOT_FIELDS = ('opis_id', 'name', 'address', 'city', 'state', 'retail_price', 'location', 'cluster_id')
+
+
+def snapshot_row(row: dict) -> dict:
+    """A FuelStation .values() row (SNAPSHOT_FIELDS) as a plain, picklable dict."""
+    location = row['location']
+    return {
+        'opis_id': row['opis_id'],
+        'name': row['name'],
+        'address': row['address'],
+        'city': row['city'],
+        'state': row['state'],
+        'retail_price': float(row['retail_price']),
+        'lat': location.y,
+        'lon': location.x,
+        'cluster_id': row['cluster_id'],
+    }
+
+
+def station_snapshot(queryset=None, chunk_size: int = 20000) -> StationGrid:
+    """Every located station (or those in `queryset`) bucketed in a StationGrid."""
+    from routing.models import FuelStation
+
+    qs = FuelStation.objects.all() if queryset is None else queryset
+    rows = qs.filter(location__isnull=False).values(*SNAPSHOT_FIELDS).iterator(chunk_size=chunk_size)
+    return StationGrid(snapshot_row(row) for row in rows)
+
+
+def station_version() -> str:
+    """
+    Fingerprint of the station table (row count, last update, price sum), so plans
+    computed against different station data can be told apart. One aggregate query.
+    """
+    from django.db.models import Count, Max, Sum
+    from routing.models import FuelStation
+
+    agg = FuelStation.objects.aggregate(count=Count('id'), updated=Max('updated_at'), prices=Sum('retail_price'))
+    raw = f"{agg['count']}:{agg['updated'].isoformat() if agg['updated'] else ''}:{agg['prices'] or 0}"
+    return f"{agg['count']}-{hashlib.blake2b(raw.encode(), digest_size=6).hexdigest()}"
+
+
+def cached_station_version() -> str:
+    """station_version, at most STATION_VERSION_TTL_S old."""
+    from django.core.cache import cache
+
+    return cache.get_or_set(STATION_VERSION_CACHE_KEY, station_version, STATION_VERSION_TTL_S)
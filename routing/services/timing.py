@@ -0,0 +1,160 @@
+"""
+Per-request stage timings.
+
+`timed(stage)` measures a block and records it in the stage latency histogram.
+While a request is being timed (ServerTimingMiddleware) the duration is also
+added to that request's timings, which become its `Server-Timing` header.
+Stages entered more than once per request (e.g. geocoding both ends) are summed.
+
+SQL run while timings are active is attributed to the innermost stage (see
+routing.services.query_accounting), so the header and command summaries also
+show queries and DB time per stage. Timings nest: a request timed inside a
+test's query budget reports to both.
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, NamedTuple, Optional
+
+from routing.services.metrics import REGISTRY
+
+STAGE_SECONDS = REGISTRY.histogram("route_plan_stage_seconds", "Wall time of each route-planning stage")
+
+# Queries outside any timed stage
+UNSTAGED = "other"
+# Statements kept per timing session for budget failure reports
+MAX_STATEMENTS = 200
+
+_current: contextvars.ContextVar = contextvars.ContextVar("stage_timings", default=None)
+_stage: contextvars.ContextVar = contextvars.ContextVar("timed_stage", default=UNSTAGED)
+
+
+class StageTotals(NamedTuple):
+    stage: str
+    seconds: float
+    calls: int
+    queries: int
+    db_seconds: float
+
+
+class StageTimings:
+    def __init__(self, parent: Optional["StageTimings"] = None):
+        self.started = time.perf_counter()
+        self.parent = parent
+        self.statements: List[tuple] = []
+        self._lock = threading.Lock()
+        # stage -> [seconds, calls, queries, db_seconds]
+        self._stages: Dict[str, list] = {}
+
+    def _entry(self, stage: str) -> list:
+        return self._stages.setdefault(stage, [0.0, 0, 0, 0.0])
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            entry = self._entry(stage)
+            entry[0] += seconds
+            entry[1] += 1
+        if self.parent is not None:
+            self.parent.add(stage, seconds)
+
+    def add_query(self, stage: str, sql: str, seconds: float):
+        with self._lock:
+            entry = self._entry(stage)
+            entry[2] += 1
+            entry[3] += seconds
+            if len(self.statements) < MAX_STATEMENTS:
+                self.statements.append((stage, sql, seconds))
+        if self.parent is not None:
+            self.parent.add_query(stage, sql, seconds)
+
+    def items(self) -> List[StageTotals]:
+        """Per-stage totals in the order the stages were first entered."""
+        with self._lock:
+            return [StageTotals(stage, *entry) for stage, entry in self._stages.items()]
+
+    def query_counts(self) -> Dict[str, int]:
+        return {t.stage: t.queries for t in self.items() if t.queries}
+
+    @property
+    def queries(self) -> int:
+        return sum(t.queries for t in self.items())
+
+    def server_timing(self) -> str:
+        parts, queries, db_seconds = [], 0, 0.0
+        for t in self.items():
+            queries += t.queries
+            db_seconds += t.db_seconds
+            if t.calls:
+                desc = f';desc="{_queries(t.queries)}"' if t.queries else ""
+                parts.append(f"{t.stage};dur={t.seconds * 1000:.1f}{desc}")
+        if queries:
+            parts.append(f'db;dur={db_seconds * 1000:.1f};desc="{_queries(queries)}"')
+        parts.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(parts)
+
+    def summary(self) -> str:
+        """One line per stage, for management command output."""
+        return "\n".join(
+            f"  {t.stage}: {t.seconds:.2f}s, {_queries(t.queries)} ({t.db_seconds * 1000:.0f} ms DB)"
+            for t in self.items()
+        )
+
+
+def _queries(n: int) -> str:
+    return f"{n} {'query' if n == 1 else 'queries'}"
+
+
+def start() -> contextvars.Token:
+    """Begin timing the current request; pass the token to `stop`."""
+    return _current.set(StageTimings(parent=_current.get()))
+
+
+def current() -> Optional[StageTimings]:
+    return _current.get()
+
+
+def current_stage() -> str:
+    return _stage.get()
+
+
+def stop(token: contextvars.Token):
+    _current.reset(token)
+
+
+@contextmanager
+def recording():
+    """Time a block (a management command phase, a test) as its own session."""
+    token = start()
+    try:
+        yield current()
+    finally:
+        stop(token)
+
+
+@contextmanager
+def collecting(timings: StageTimings):
+    """
+    Add stages timed in the block to an existing session, e.g. one that spans the
+    chunks of a streamed response (each chunk is produced in its own call).
+    """
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def timed(stage: str):
+    stage_token = _stage.set(stage)
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - t0
+        _stage.reset(stage_token)
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        timings = _current.get()
+        if timings is not None:
+            timings.add(stage, elapsed)
@@ -0,0 +1,160 @@
+"""
+Record-and-replay traces of /route-plan/ requests.
+
+While TRACE_RECORDING_ENABLED, a sampled share (TRACE_SAMPLE_RATE) of route-plan
+requests is written as one JSON line each:
+  - the request body,
+  - what the upstreams answered: coordinates per geocoded address and the OSRM
+    route (or routes, when alternatives were requested),
+  - the station data version the plan was computed against (stations.station_version),
+  - per-stage timings and a summary of the result (status, cost, stops).
+
+Upstream answers are captured where the view consumes them rather than on the
+wire, so lookups served from the geocode or route caches are recorded too and a
+trace replays the same way whatever the caches held.
+
+Each request is appended as its own gzip member to TRACE_DIR/route-plan-YYYYMMDD-<pid>.jsonl.gz;
+files can be concatenated. `manage.py replay_traces` reruns them against the
+current code with the upstreams served from the trace.
+
+Traces contain customer addresses: record only while capturing a workload.
+"""
+import contextvars
+import gzip
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from django.conf import settings
+
+from routing.services import timing
+from routing.services.stations import cached_station_version
+
+logger = logging.getLogger(__name__)
+
+TRACE_FORMAT = 1
+
+_current: contextvars.ContextVar = contextvars.ContextVar("route_plan_trace", default=None)
+_write_lock = threading.Lock()
+
+
+def plan_summary(status_code: int, body: Any) -> Dict[str, Any]:
+    """The parts of a route-plan response that replay compares."""
+    if status_code != 200 or not isinstance(body, dict):
+        return {"status": status_code, "error": body.get("error") if isinstance(body, dict) else None}
+    return {
+        "status": status_code,
+        "total_cost": body["total_cost"],
+        "total_gallons": body["total_gallons"],
+        "stops": [[stop["station_id"], stop["gallons_purchased"]] for stop in body["fuel_plan"]],
+    }
+
+
+class TraceRecorder:
+    """Collects one request's trace entry; written by finish()."""
+
+    def __init__(self, payload: Any):
+        self.started = time.perf_counter()
+        self.entry: Dict[str, Any] = {
+            "format": TRACE_FORMAT,
+            "id": uuid.uuid4().hex,
+            "recorded_at": time.time(),
+            "input": payload,
+            "geocodes": {},
+            "route": None,
+        }
+
+    def geocode(self, query: str, coords):
+        self.entry["geocodes"][query] = list(coords)
+
+    def route(self, route_data: Dict[str, Any]):
+        self.entry["route"] = route_data
+
+    def routes(self, routes: List[Dict[str, Any]]):
+        self.entry["routes"] = routes
+
+    def finish(self, status_code: int, body: Any):
+        timings = timing.current()
+        self.entry.update(
+            elapsed_ms=round((time.perf_counter() - self.started) * 1000, 3),
+            stages_ms={t.stage: round(t.seconds * 1000, 3) for t in timings.items() if t.calls} if timings else {},
+            station_version=cached_station_version(),
+            result=plan_summary(status_code, body),
+        )
+        write(self.entry)
+
+
+def should_record() -> bool:
+    return settings.TRACE_RECORDING_ENABLED and random.random() < settings.TRACE_SAMPLE_RATE
+
+
+@contextmanager
+def recording(payload: Any):
+    """Record the enclosed request if sampled; yields its TraceRecorder or None."""
+    if not should_record():
+        yield None
+        return
+    recorder = TraceRecorder(payload)
+    token = _current.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _current.reset(token)
+
+
+def record_geocode(query: Any, coords):
+    """Note a resolved address (coordinate inputs are not geocoded and not recorded)."""
+    recorder = _current.get()
+    if recorder is not None and isinstance(query, str):
+        recorder.geocode(query, coords)
+
+
+def record_route(route_data: Dict[str, Any]):
+    recorder = _current.get()
+    if recorder is not None:
+        recorder.route(route_data)
+
+
+def record_routes(routes: List[Dict[str, Any]]):
+    """Note the OSRM routes of a request that asked for alternatives."""
+    recorder = _current.get()
+    if recorder is not None:
+        recorder.routes(routes)
+
+
+def trace_path(now: Optional[float] = None) -> str:
+    day = time.strftime("%Y%m%d", time.gmtime(now))
+    return os.path.join(str(settings.TRACE_DIR), f"route-plan-{day}-{os.getpid()}.jsonl.gz")
+
+
+def write(entry: Dict[str, Any]):
+    """Append one entry as its own gzip member. Failures are logged, never raised to the request."""
+    path = trace_path(entry.get("recorded_at"))
+    try:
+        with _write_lock:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with gzip.open(path, "at", encoding="utf-8") as f:
+                f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+    except OSError as e:
+        logger.warning(f"Could not write route-plan trace to {path}: {e}")
+
+
+def read_traces(paths: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """Entries from trace files (.jsonl or .jsonl.gz), skipping other trace formats."""
+    for path in paths:
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if entry.get("format") != TRACE_FORMAT:
+                    logger.warning(f"Skipping trace {entry.get('id')} in {path}: format {entry.get('format')}")
+                    continue
+                yield entry
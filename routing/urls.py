@@ -1,6 +1,15 @@
 from django.urls import path
-from routing.api.views import RoutePlanView
+from routing.api.views import RoutePlanView, RoutePlanBatchView, RouteReplanView
+from routing.api.async_views import AsyncRoutePlanView
+from routing.api.jobs import PlanJobDetailView, PlanJobListView
+from routing.api.profiling import ProfileDetailView
 
 urlpatterns = [
     path('route-plan/', RoutePlanView.as_view(), name='route-plan'),
+    path('route-plan/replan/', RouteReplanView.as_view(), name='route-replan'),
+    path('route-plan/batch/', RoutePlanBatchView.as_view(), name='route-plan-batch'),
+    path('route-plan/jobs/', PlanJobListView.as_view(), name='plan-jobs'),
+    path('route-plan/jobs/<uuid:job_id>/', PlanJobDetailView.as_view(), name='plan-job-detail'),
+    path('route-plan/async/', AsyncRoutePlanView.as_view(), name='route-plan-async'),
+    path('profiles/<str:profile_id>/', ProfileDetailView.as_view(), name='profile-detail'),
 ]
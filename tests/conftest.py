@@ -0,0 +1,37 @@
+from contextlib import contextmanager
+
+import pytest
+
+from routing.services import timing
+
+
+@pytest.fixture
+def query_budget():
+    """
+    Fail the test when a block runs more SQL than budgeted, overall and/or per stage:
+
+        with query_budget(2, corridor=1) as timings:
+            client.post(...)
+
+    Queries are attributed to the timed stage they ran in (geocode, route, corridor, ...;
+    "other" outside any stage). The failure lists every statement with its stage.
+    """
+    @contextmanager
+    def budget(max_queries=None, **stage_budgets):
+        with timing.recording() as timings:
+            yield timings
+
+        problems = []
+        if max_queries is not None and timings.queries > max_queries:
+            problems.append(f"{timings.queries} queries, budget {max_queries}")
+        counts = timings.query_counts()
+        for stage, limit in stage_budgets.items():
+            if counts.get(stage, 0) > limit:
+                problems.append(f"stage '{stage}': {counts[stage]} queries, budget {limit}")
+        if problems:
+            statements = "\n".join(
+                f"  [{stage}] {seconds * 1000:.1f} ms  {sql}" for stage, sql, seconds in timings.statements
+            )
+            pytest.fail("Query budget exceeded: " + "; ".join(problems) + "\n" + statements, pytrace=False)
+
+    return budget
@@ -3,7 +3,7 @@ import unittest.mock
 from django.urls import reverse
 from django.contrib.gis.geos import Point
 from django.core.management import call_command
-from routing.models import FuelStation
+from routing.models import FuelStation, GeocodeRunItem
 
 @pytest.mark.django_db
 def test_route_plan_api_success(client):
@@ -96,3 +96,758 @@ def test_import_command_integration(tmp_path):
         station = FuelStation.objects.get(opis_id=101)
         assert station.location is not None
         assert station.location.x == -80.0
+
+@pytest.mark.django_db
+def test_import_command_skips_clusters_when_feed_fails(tmp_path):
+    """A feed that cannot be loaded leaves the existing station clusters alone."""
+    import io
+    out = io.StringIO()
+    with unittest.mock.patch('routing.management.commands.import_fuel_prices.rebuild_station_clusters') as mock_rebuild:
+        call_command('import_fuel_prices', csv=str(tmp_path / "missing.csv"), stdout=out, stderr=io.StringIO())
+
+    mock_rebuild.assert_not_called()
+    assert "not rebuilt" in out.getvalue()
+
+@pytest.mark.django_db(transaction=True)
+def test_import_command_dedupes_shared_queries(tmp_path):
+    """Stations with the same normalized address share a single geocode."""
+    csv_file = tmp_path / "fuel_dupes.csv"
+    csv_file.write_text(
+        "OPIS Truckstop ID,Truckstop Name,Address,City,State,Rack ID,Retail Price\n"
+        "201,Dup One,123 Main St,Miami,FL,100,3.50\n"
+        "202,Dup Two,123  Main St,Miami,FL,100,3.55\n",
+        encoding='utf-8'
+    )
+
+    import io
+    mock_point = Point(-80.0, 25.0)
+    attempts = [{"label": "census_cached", "query": "123 Main St, Miami, FL"}, {"label": "osm_query", "query": "Miami, FL"}]
+    mock_debug = {"success_label": "mock_provider", "classification": "POSTAL_ADDRESS", "attempts": attempts}
+    out = io.StringIO()
+
+    with unittest.mock.patch('routing.services.geocoding.GeocodingRouter.geocode_station', return_value=(mock_point, mock_debug)) as mock_geocode:
+        call_command('import_fuel_prices', csv=str(csv_file), concurrent=1, sleep=0, stdout=out)
+
+        assert mock_geocode.call_count == 1
+        assert "lookups saved: 2 (1 shared by a work unit, 1 answered by the geocode cache). Provider calls: 1" in out.getvalue()
+        assert FuelStation.objects.filter(opis_id__in=[201, 202], location__isnull=False).count() == 2
+
+@pytest.mark.django_db(transaction=True)
+def test_import_command_resumes_journaled_run(tmp_path):
+    """Re-running a journaled run id skips stations already checkpointed."""
+    csv_file = tmp_path / "fuel_resume.csv"
+    csv_file.write_text(
+        "OPIS Truckstop ID,Truckstop Name,Address,City,State,Rack ID,Retail Price\n"
+        "301,Resume Station,I-95 & US-1,Nowhere,FL,100,3.50\n",
+        encoding='utf-8'
+    )
+
+    mock_debug = {"classification": "HIGHWAY_INTERSECTION_2", "reason": "hwy2_no_match", "attempts": []}
+
+    with unittest.mock.patch('routing.services.geocoding.GeocodingRouter.geocode_station', return_value=(None, mock_debug)) as mock_geocode:
+        call_command('import_fuel_prices', csv=str(csv_file), concurrent=1, sleep=0, run_id='resume-test')
+        call_command('import_fuel_prices', csv=str(csv_file), concurrent=1, sleep=0, run_id='resume-test')
+
+        assert mock_geocode.call_count == 1
+        assert GeocodeRunItem.objects.filter(run__run_id='resume-test', state='unresolved').count() == 1
+
+@pytest.mark.django_db(transaction=True)
+def test_parquet_export_seeds_import(tmp_path):
+    """Stations exported to Parquet re-import with their locations and skip geocoding."""
+    pytest.importorskip("pyarrow")
+    FuelStation.objects.create(
+        opis_id=401, name="Seed Station", address="123 Main St", city="Miami", state="FL",
+        retail_price="3.459", location=Point(-80.1, 25.7, srid=4326), geocode_source="geocoded:census:postal_full",
+    )
+    out = tmp_path / "stations.parquet"
+    call_command('export_fuel_stations', out=str(out))
+
+    FuelStation.objects.all().delete()
+    with unittest.mock.patch('routing.services.geocoding.GeocodingRouter.geocode_station') as mock_geocode:
+        call_command('import_fuel_prices', csv=str(out), format='parquet', concurrent=1, sleep=0)
+        mock_geocode.assert_not_called()
+
+    station = FuelStation.objects.get(opis_id=401)
+    assert station.location.x == pytest.approx(-80.1)
+    assert station.geocode_source == "geocoded:census:postal_full"
+
+@pytest.mark.django_db
+def test_async_route_plan_geocodes_ends_concurrently(client):
+    """The ASGI view resolves start and finish in parallel and matches the sync contract."""
+    import threading
+    url = reverse('route-plan-async')
+    payload = {"start": "Miami, FL", "finish": "New York, NY", "corridor_miles": 10}
+    headers = {'HTTP_X_API_KEY': 'spotter_dev_key_2026'}
+
+    both_started = threading.Barrier(2, timeout=5)
+    coords = {"Miami, FL": (25.7617, -80.1918), "New York, NY": (40.7128, -74.0060)}
+
+    def resolve(value, deadline=None):
+        # Deadlocks (BrokenBarrierError -> 500) unless both ends run at once
+        both_started.wait()
+        return coords[value]
+
+    with unittest.mock.patch('routing.api.views.RoutePlanView.resolve_location', side_effect=resolve), \
+         unittest.mock.patch('routing.services.osrm_client.OSRMClient.aget_route',
+                             new_callable=unittest.mock.AsyncMock) as mock_osrm, \
+         unittest.mock.patch('routing.services.geometry.GeometryService.decode_polyline') as mock_decode, \
+         unittest.mock.patch('routing.services.fuel_planner.FuelPlanner.plan_fuel_stops') as mock_plan:
+        mock_osrm.return_value = {'geometry': 'mock_polyline', 'distance': 2000000}
+        mock_decode.return_value = [(25.7617, -80.1918), (40.7128, -74.0060)]
+        mock_plan.return_value = (
+            [{'name': 'Test Stop', 'stop_cost': 50.0, 'gallons_purchased': 20.0}],
+            {'total_cost': 50.0, 'total_gallons': 20.0}
+        )
+
+        response = client.post(url, payload, content_type='application/json', **headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert data['total_cost'] == 50.0
+        assert data['finish'] == {"lat": 40.7128, "lon": -74.0060}
+        mock_osrm.assert_awaited_once_with((25.7617, -80.1918), (40.7128, -74.0060))
+
+    # Auth is enforced exactly like the sync view
+    assert client.post(url, payload, content_type='application/json').status_code == 403
+
+@pytest.mark.django_db
+def test_route_plan_batch_shares_geocodes_routes_and_candidates(client, django_assert_num_queries):
+    """Batch plans dedupe geocoding/routing, fetch candidates once and keep input order."""
+    import polyline
+    url = reverse('route-plan-batch')
+    headers = {'HTTP_X_API_KEY': 'spotter_dev_key_2026'}
+
+    # Stations on a straight northbound route along lon -80 (one far away)
+    for opis_id, lat, price in [(1, 29.0, 3.50), (2, 30.0, 3.00), (3, 40.0, 2.00)]:
+        FuelStation.objects.create(
+            opis_id=opis_id, name=f"Stop {opis_id}", address="I-95", city="Somewhere", state="FL",
+            retail_price=price, location=Point(-80.0, lat, srid=4326)
+        )
+    route = {'geometry': polyline.encode([(25.0, -80.0), (34.0, -80.0)], precision=6), 'distance': 1000000}
+    finish = {"lat": 34.0, "lon": -80.0}
+    payload = {"trips": [
+        {"start": "Miami, FL", "finish": finish},
+        {"start": " miami,  fl ", "finish": finish, "corridor_miles": 5},
+        {"start": "", "finish": finish},
+        {"start": "Miami, FL", "finish": finish, "alternatives": 2},
+        {"start": "Miami, FL", "finish": finish, "corridor_mode": "adaptive"},
+    ]}
+
+    def resolve(value, deadline=None):
+        return value if isinstance(value, tuple) else (25.0, -80.0)
+
+    with unittest.mock.patch('routing.api.views.RoutePlanView.resolve_location', side_effect=resolve) as mock_resolve, \
+         unittest.mock.patch('routing.services.osrm_client.OSRMClient.get_route', return_value=route) as mock_osrm:
+        # A single shared candidate query for the whole batch
+        with django_assert_num_queries(1):
+            response = client.post(url, payload, content_type='application/json', **headers)
+
+    assert response.status_code == 200
+    data = response.json()
+    assert [r['index'] for r in data['results']] == [0, 1, 2, 3, 4]
+    assert [r['status'] for r in data['results']] == [200, 200, 400, 400, 400]
+    assert 'start' in data['results'][2]['error']
+    # Single-trip options are refused rather than silently ignored
+    assert all('non_field_errors' in r['error'] for r in data['results'][3:])
+
+    # "Miami, FL" once + the shared finish coordinates once; one OSRM call
+    assert mock_resolve.call_count == 2
+    assert mock_osrm.call_count == 1
+    assert data['stats']['distinct_routes'] == 1
+
+    stops = data['results'][0]['result']['fuel_plan']
+    assert [s['station_id'] for s in stops] == [2]
+    assert data['results'][1]['result']['fuel_plan'] == stops
+
+@pytest.mark.django_db
+def test_route_plan_batch_streams_ndjson_per_window(client, settings):
+    """With Accept: application/x-ndjson, the first trips are sent before later windows are planned."""
+    import json
+    from routing.services.corridor import StationGrid
+    settings.ROUTE_PLAN_STREAM_WINDOW = 2
+    settings.PROFILING_API_KEYS = ['spotter_profile_key']
+    url = reverse('route-plan-batch')
+    headers = {'HTTP_X_API_KEY': 'spotter_profile_key', 'HTTP_ACCEPT': 'application/x-ndjson', 'HTTP_X_PROFILE': 'sample'}
+    payload = {"trips": [{"start": {"lat": 25.0 + i, "lon": -80.0}, "finish": {"lat": 34.0, "lon": -80.0}} for i in range(5)]}
+    plan = ([{'name': 'Test Stop', 'stop_cost': 50.0, 'gallons_purchased': 20.0}], {'total_cost': 50.0, 'total_gallons': 20.0})
+
+    with unittest.mock.patch('routing.api.views.RoutePlanView.resolve_location', side_effect=lambda v, d=None: v), \
+         unittest.mock.patch('routing.services.osrm_client.OSRMClient.get_route',
+                             return_value={'geometry': '_ibE_seK_seK_seK', 'distance': 1000000}), \
+         unittest.mock.patch('routing.services.fuel_planner.FuelPlanner.fetch_union_grid',
+                             return_value=StationGrid([])) as mock_fetch, \
+         unittest.mock.patch('routing.services.fuel_planner.FuelPlanner.plan_with_grid', return_value=plan):
+        response = client.post(url, payload, content_type='application/json', **headers)
+        assert response.status_code == 200
+        assert response.streaming
+        assert response['Content-Type'].startswith('application/x-ndjson')
+        assert 'Server-Timing' not in response  # timings are sent in the stats line
+        assert response['X-Profile-Skipped'] == 'streaming'
+
+        chunks = iter(response.streaming_content)
+        first = json.loads(next(chunks))
+        assert first['index'] == 0 and first['status'] == 200
+        assert mock_fetch.call_count == 1  # only the first window has been planned
+
+        lines = [first] + [json.loads(chunk) for chunk in chunks]
+
+    assert [line['index'] for line in lines[:-1]] == [0, 1, 2, 3, 4]
+    assert lines[-1]['stats']['windows'] == 3
+    assert set(lines[-1]['stats']['stages_ms']) == {'geocode', 'route'}
+    assert mock_fetch.call_count == 3
+
+@pytest.mark.django_db
+def test_plan_trips_command_writes_parquet(tmp_path):
+    """Offline fleet planning reuses geocodes/routes and writes one row per trip."""
+    pq = pytest.importorskip("pyarrow.parquet")
+    import polyline
+
+    FuelStation.objects.create(
+        opis_id=7, name="Stop 7", address="I-95", city="Somewhere", state="FL",
+        retail_price=3.10, location=Point(-80.0, 30.0, srid=4326)
+    )
+    trips = tmp_path / "trips.csv"
+    trips.write_text(
+        "trip_id,start,finish_lat,finish_lon,corridor_miles\n"
+        "a,\"Miami, FL\",34.0,-80.0,10\n"
+        "b,\"MIAMI, FL\",34.0,-80.0,10\n"
+        "c,,34.0,-80.0,10\n"
+    )
+    out = tmp_path / "plans.parquet"
+    route = {'geometry': polyline.encode([(25.0, -80.0), (34.0, -80.0)], precision=6), 'distance': 1000000}
+
+    with unittest.mock.patch('routing.services.geocoding.GeocodingRouter.geocode_string',
+                             return_value=(Point(-80.0, 25.0, srid=4326), {})) as mock_geocode, \
+         unittest.mock.patch('routing.services.osrm_client.OSRMClient.get_route', return_value=route) as mock_osrm:
+        call_command('plan_trips', trips=str(trips), out=str(out), workers=0)
+
+    rows = {r['trip_id']: r for r in pq.read_table(out).to_pylist()}
+    assert mock_geocode.call_count == 1
+    assert mock_osrm.call_count == 1
+    assert rows['a']['status'] == rows['b']['status'] == 'ok'
+    assert rows['a']['stop_count'] == 1 and '"station_id":7' in rows['a']['stops_json']
+    assert rows['a']['plan_ms'] is not None
+    assert rows['c']['status'] == 'invalid'
+
+@pytest.mark.django_db
+def test_plan_jobs_run_by_priority_and_long_poll(client):
+    """Queued plans are run by the worker, highest priority first, and fetched by job id."""
+    from datetime import timedelta
+    from django.utils import timezone
+    from routing.models import PlanJob
+    from routing.services import plan_jobs
+
+    url = reverse('plan-jobs')
+    headers = {'HTTP_X_API_KEY': 'spotter_dev_key_2026'}
+    trip = {"start": {"lat": 25.7617, "lon": -80.1918}, "finish": {"lat": 40.7128, "lon": -74.0060}}
+
+    low = client.post(url, {"request": trip, "priority": 1}, content_type='application/json', **headers)
+    high = client.post(url, {"request": trip, "priority": 9}, content_type='application/json', **headers)
+    assert low.status_code == high.status_code == 202
+    assert high['Location'].endswith(f"/route-plan/jobs/{high.json()['job_id']}/")
+    assert client.post(url, {"request": {"start": ""}}, content_type='application/json', **headers).status_code == 400
+
+    with unittest.mock.patch('routing.services.osrm_client.OSRMClient.get_route',
+                             return_value={'geometry': 'mock_polyline', 'distance': 2000000}), \
+         unittest.mock.patch('routing.services.geometry.GeometryService.decode_polyline', return_value=[(25.7, -80.1), (40.7, -74.0)]), \
+         unittest.mock.patch('routing.services.fuel_planner.FuelPlanner.plan_fuel_stops',
+                             return_value=([], {'total_cost': 0.0, 'total_gallons': 0.0})):
+        call_command('run_plan_worker', concurrency=1, once=True)
+
+    jobs = {str(j.id): j for j in PlanJob.objects.all()}
+    low_job, high_job = jobs[low.json()['job_id']], jobs[high.json()['job_id']]
+    assert high_job.started_at <= low_job.started_at
+
+    response = client.get(high['Location'] + '?wait=1', **headers)
+    assert response.status_code == 200
+    body = response.json()
+    assert body['state'] == 'succeeded' and body['status'] == 200
+    assert body['result']['total_cost'] == 0.0
+
+    # A job stuck past its timeout is failed with 504
+    stuck = plan_jobs.submit(PlanJob.KIND_ROUTE_PLAN, trip, timeout_s=5)
+    PlanJob.objects.filter(pk=stuck.pk).update(state=PlanJob.STATE_RUNNING, started_at=timezone.now() - timedelta(seconds=10))
+    assert plan_jobs.fail_timed_out() == 1
+    stuck.refresh_from_db()
+    assert stuck.state == PlanJob.STATE_FAILED and stuck.status_code == 504
+
+@pytest.mark.django_db
+def test_plan_job_runs_under_its_timeout_outside_interactive_bulkheads(settings):
+    """A job is not shed by a saturated interactive bulkhead, but stops once its own deadline passes."""
+    from routing.api.jobs import execute_job
+    from routing.models import PlanJob
+    from routing.services import bulkhead
+    from routing.services.deadline import Deadline
+
+    settings.STAGE_BULKHEADS = {'route': {'max_concurrent': 1, 'max_queue': 0, 'max_wait_s': 1.0}}
+    bulkhead._bulkheads.clear()
+    trip = {"start": {"lat": 25.7617, "lon": -80.1918}, "finish": {"lat": 40.7128, "lon": -74.0060}}
+
+    route_slot = bulkhead.get_bulkhead('route').slot()
+    route_slot.__enter__()
+    try:
+        with unittest.mock.patch('routing.services.osrm_client.OSRMClient.get_route',
+                                 return_value={'geometry': 'mock_polyline', 'distance': 2000000}) as mock_osrm, \
+             unittest.mock.patch('routing.services.geometry.GeometryService.decode_polyline', return_value=[(25.7, -80.1), (40.7, -74.0)]), \
+             unittest.mock.patch('routing.services.fuel_planner.FuelPlanner.plan_fuel_stops',
+                                 return_value=([], {'total_cost': 0.0, 'total_gallons': 0.0})):
+            status_code, result = execute_job(PlanJob(kind=PlanJob.KIND_ROUTE_PLAN, payload=trip, timeout_s=600))
+            assert status_code == 200 and result['total_cost'] == 0.0
+
+            with unittest.mock.patch('routing.api.jobs.Deadline', side_effect=lambda timeout_s: Deadline(0)):
+                status_code, result = execute_job(PlanJob(kind=PlanJob.KIND_ROUTE_PLAN, payload=trip, timeout_s=600))
+            assert status_code == 503 and 'Deadline exceeded' in result['error']
+            assert mock_osrm.call_count == 1
+    finally:
+        route_slot.__exit__(None, None, None)
+        bulkhead._bulkheads.clear()
+
+def test_batch_job_stops_geocoding_routing_and_planning_at_its_timeout():
+    """Trips still unplanned when a batch job's deadline passes fail at once instead of running on."""
+    import time
+    from routing.api.jobs import execute_job
+    from routing.models import PlanJob
+    from routing.services.deadline import Deadline
+
+    payload = {"trips": [{"start": "Miami, FL", "finish": "Atlanta, GA"}, {"start": "Tampa, FL", "finish": "Atlanta, GA"}]}
+    budgets = []
+
+    def slow_resolve(value, deadline=None):
+        budgets.append(deadline.budget_s)
+        time.sleep(0.3)
+        return (25.7, -80.1)
+
+    with unittest.mock.patch('routing.api.jobs.Deadline', side_effect=lambda timeout_s: Deadline(0.2)), \
+         unittest.mock.patch('routing.api.views.RoutePlanView.resolve_location', side_effect=slow_resolve), \
+         unittest.mock.patch('routing.services.osrm_client.OSRMClient.get_route') as mock_osrm, \
+         unittest.mock.patch('routing.services.fuel_planner.FuelPlanner.fetch_union_grid') as mock_fetch:
+        status_code, result = execute_job(PlanJob(kind=PlanJob.KIND_BATCH, payload=payload, timeout_s=600))
+
+    assert status_code == 200
+    assert [r['status'] for r in result['results']] == [503, 503]
+    assert all(budget <= 0.2 for budget in budgets)  # geocodes are capped by the job's deadline
+    mock_osrm.assert_not_called()
+    mock_fetch.assert_not_called()
+
+@pytest.mark.django_db
+def test_route_plan_sheds_load_when_stage_is_saturated(client, settings):
+    """A full stage bulkhead rejects new requests at once with 503 + Retry-After."""
+    from routing.services import bulkhead
+
+    settings.STAGE_BULKHEADS = {'route': {'max_concurrent': 1, 'max_queue': 0, 'max_wait_s': 1.0, 'retry_after_s': 3}}
+    bulkhead._bulkheads.clear()
+    url = reverse('route-plan')
+    payload = {"start": "Miami, FL", "finish": "New York, NY", "corridor_miles": 10}
+    headers = {'HTTP_X_API_KEY': 'spotter_dev_key_2026'}
+
+    # Occupy the only route slot, as a stuck OSRM call would
+    route_slot = bulkhead.get_bulkhead('route').slot()
+    route_slot.__enter__()
+    try:
+        with unittest.mock.patch('routing.api.views.RoutePlanView.resolve_location') as mock_resolve, \
+             unittest.mock.patch('routing.services.osrm_client.OSRMClient.get_route') as mock_osrm:
+            mock_resolve.side_effect = [(25.7617, -80.1918), (40.7128, -74.0060)]
+            response = client.post(url, payload, content_type='application/json', **headers)
+
+        assert response.status_code == 503
+        assert response['Retry-After'] == '3'
+        assert 'overloaded' in response.json()['error']
+        mock_osrm.assert_not_called()
+        assert bulkhead.SHED.value(stage='route', reason=bulkhead.SHED_QUEUE_FULL) >= 1
+    finally:
+        route_slot.__exit__(None, None, None)
+        bulkhead._bulkheads.clear()
+
+@pytest.mark.django_db
+def test_async_route_plan_shares_stage_admission_with_sync_view(client, settings):
+    """The ASGI view plans through RoutePlanView, so its OSRM call is shed by the same bulkhead."""
+    from routing.services import bulkhead
+
+    settings.STAGE_BULKHEADS = {'route': {'max_concurrent': 1, 'max_queue': 0, 'max_wait_s': 1.0, 'retry_after_s': 3}}
+    bulkhead._bulkheads.clear()
+    payload = {"start": "Miami, FL", "finish": "New York, NY", "corridor_miles": 10}
+
+    route_slot = bulkhead.get_bulkhead('route').slot()
+    route_slot.__enter__()
+    try:
+        with unittest.mock.patch('routing.api.views.RoutePlanView.resolve_location') as mock_resolve, \
+             unittest.mock.patch('routing.services.osrm_client.OSRMClient.aget_route',
+                                 new_callable=unittest.mock.AsyncMock) as mock_osrm:
+            mock_resolve.side_effect = lambda value, deadline=None: (25.7617, -80.1918)
+            response = client.post(reverse('route-plan-async'), payload, content_type='application/json',
+                                   HTTP_X_API_KEY='spotter_dev_key_2026')
+
+        assert response.status_code == 503
+        assert response['Retry-After'] == '3'
+        mock_osrm.assert_not_awaited()
+    finally:
+        route_slot.__exit__(None, None, None)
+        bulkhead._bulkheads.clear()
+
+@pytest.mark.django_db
+def test_route_plan_reports_server_timing_and_prometheus_metrics(client):
+    """Each stage shows up in Server-Timing and in the /metrics histograms."""
+    url = reverse('route-plan')
+    payload = {"start": "Miami, FL", "finish": "New York, NY", "corridor_miles": 10}
+    headers = {'HTTP_X_API_KEY': 'spotter_dev_key_2026'}
+
+    with unittest.mock.patch('routing.api.views.RoutePlanView.resolve_location') as mock_resolve, \
+         unittest.mock.patch('routing.services.osrm_client.OSRMClient.get_route') as mock_osrm, \
+         unittest.mock.patch('routing.services.geometry.GeometryService.decode_polyline') as mock_decode, \
+         unittest.mock.patch('routing.services.fuel_planner.FuelPlanner.fetch_candidates') as mock_candidates:
+        mock_resolve.side_effect = [(25.7617, -80.1918), (40.7128, -74.0060)]
+        mock_osrm.return_value = {'geometry': 'mock_polyline', 'distance': 160934}
+        mock_decode.return_value = [(25.7617, -80.1918), (26.7617, -80.1918)]
+        mock_candidates.return_value = []
+        response = client.post(url, payload, content_type='application/json', **headers)
+
+    assert response.status_code == 200
+    timings = dict(part.split(';dur=') for part in response['Server-Timing'].split(', '))
+    assert list(timings) == ['geocode', 'route', 'decode', 'corridor', 'plan', 'total']
+    assert all(float(ms) >= 0 for ms in timings.values())
+
+    metrics = client.get(reverse('metrics'))
+    assert metrics.status_code == 200
+    assert metrics['Content-Type'].startswith('text/plain; version=0.0.4')
+    body = metrics.content.decode()
+    assert '# TYPE route_plan_stage_seconds histogram' in body
+    assert 'route_plan_stage_seconds_bucket{stage="corridor",le="+Inf"}' in body
+    assert 'route_plan_stage_seconds_count{stage="geocode"}' in body
+    assert 'plan_candidate_stations_bucket{le="0"}' in body
+
+@pytest.mark.django_db
+def test_profile_header_stores_retrievable_profile_for_flagged_keys(client, settings):
+    """Only profiling keys get a profile; it is served as JSON and as collapsed stacks."""
+    import time
+    settings.PROFILING_API_KEYS = ['spotter_profile_key']
+    settings.PROFILING_SAMPLE_RATE = 1.0
+    url = reverse('route-plan')
+    payload = {"start": "Miami, FL", "finish": "New York, NY", "corridor_miles": 10}
+
+    def slow_resolve(value, deadline=None):
+        time.sleep(0.05)
+        return (25.7617, -80.1918) if value == "Miami, FL" else (40.7128, -74.0060)
+
+    with unittest.mock.patch('routing.api.views.RoutePlanView.resolve_location', side_effect=slow_resolve), \
+         unittest.mock.patch('routing.services.osrm_client.OSRMClient.get_route') as mock_osrm, \
+         unittest.mock.patch('routing.services.fuel_planner.FuelPlanner.plan_fuel_stops') as mock_plan:
+        mock_osrm.return_value = {'geometry': '_p~iF~ps|U_ulLnnqC', 'distance': 2000000}
+        mock_plan.return_value = ([], {'total_cost': 0.0, 'total_gallons': 0.0})
+
+        plain = client.post(url, payload, content_type='application/json',
+                            HTTP_X_API_KEY='spotter_dev_key_2026', HTTP_X_PROFILE='sample')
+        profiled = client.post(url, payload, content_type='application/json',
+                               HTTP_X_API_KEY='spotter_profile_key', HTTP_X_PROFILE='sample',
+                               HTTP_X_PROFILE_INTERVAL_MS='1')
+
+    assert plain.status_code == 200
+    assert plain['X-Profile-Skipped'] == 'not_permitted'
+    assert 'X-Profile-Id' not in plain
+
+    assert profiled.status_code == 200
+    profile_url = profiled['X-Profile-Url']
+    assert client.get(profile_url, HTTP_X_API_KEY='spotter_dev_key_2026').status_code == 403
+
+    profile = client.get(profile_url, HTTP_X_API_KEY='spotter_profile_key').json()
+    assert profile['profile_id'] == profiled['X-Profile-Id']
+    assert profile['mode'] == 'sample' and profile['status'] == 200
+    assert profile['samples'] > 0 and profile['top']
+    assert 'routing/api/views.py:plan' in profile['collapsed']
+
+    collapsed = client.get(profile_url + '?format=collapsed', HTTP_X_API_KEY='spotter_profile_key')
+    assert collapsed['Content-Type'].startswith('text/plain')
+    stack, count = collapsed.content.decode().splitlines()[0].rsplit(' ', 1)
+    assert int(count) > 0 and ';' in stack
+
+@pytest.mark.django_db
+def test_route_plan_stays_within_query_budget(client, query_budget):
+    """route-plan issues a single candidate query, attributed to the corridor stage."""
+    import polyline
+    url = reverse('route-plan')
+    headers = {'HTTP_X_API_KEY': 'spotter_dev_key_2026'}
+    for opis_id, lat, price in [(1, 29.0, 3.50), (2, 30.0, 3.00)]:
+        FuelStation.objects.create(
+            opis_id=opis_id, name=f"Stop {opis_id}", address="I-95", city="Somewhere", state="FL",
+            retail_price=price, location=Point(-80.0, lat, srid=4326)
+        )
+    route = {'geometry': polyline.encode([(25.0, -80.0), (34.0, -80.0)], precision=6), 'distance': 1000000}
+
+    with unittest.mock.patch('routing.api.views.RoutePlanView.resolve_location', side_effect=[(25.0, -80.0), (34.0, -80.0)]), \
+         unittest.mock.patch('routing.services.osrm_client.OSRMClient.get_route', return_value=route):
+        with query_budget(2, corridor=1, plan=0) as timings:
+            response = client.post(url, {"start": "Miami, FL", "finish": "Charlotte, NC"},
+                                   content_type='application/json', **headers)
+
+    assert response.status_code == 200
+    assert [s['station_id'] for s in response.json()['fuel_plan']] == [2]
+    assert timings.query_counts() == {'corridor': 1}
+    assert 'corridor;dur=' in response['Server-Timing'] and 'desc="1 query"' in response['Server-Timing']
+
+@pytest.mark.django_db
+def test_recorded_route_plan_trace_replays_offline(client, settings, tmp_path, capsys):
+    """A recorded request replays without network and reproduces the same plan."""
+    import polyline
+    settings.TRACE_RECORDING_ENABLED = True
+    settings.TRACE_SAMPLE_RATE = 1.0
+    settings.TRACE_DIR = str(tmp_path)
+    url = reverse('route-plan')
+    headers = {'HTTP_X_API_KEY': 'spotter_dev_key_2026'}
+    stations = [
+        {'id': 1, 'dist': 300.0, 'price': 3.5, 'name': 'A', 'address': 'I-95', 'city': 'X', 'state': 'FL', 'lat': 29.0, 'lon': -80.0},
+        {'id': 2, 'dist': 450.0, 'price': 3.0, 'name': 'B', 'address': 'I-95', 'city': 'Y', 'state': 'GA', 'lat': 31.0, 'lon': -80.0},
+    ]
+    route = {'geometry': polyline.encode([(25.0, -80.0), (34.0, -80.0)], precision=6), 'distance': 1000000}
+
+    with unittest.mock.patch('routing.api.views.RoutePlanView.resolve_location', side_effect=[(25.0, -80.0), (34.0, -80.0)]), \
+         unittest.mock.patch('routing.services.osrm_client.OSRMClient.get_route', return_value=route), \
+         unittest.mock.patch('routing.services.fuel_planner.FuelPlanner.fetch_candidates', return_value=stations):
+        response = client.post(url, {"start": "Miami, FL", "finish": "Charlotte, NC"}, content_type='application/json', **headers)
+    assert response.status_code == 200
+
+    from routing.services.traces import read_traces
+    [entry] = list(read_traces([str(p) for p in tmp_path.iterdir()]))
+    assert entry['input']['start'] == "Miami, FL"
+    assert entry['geocodes'] == {"Miami, FL": [25.0, -80.0], "Charlotte, NC": [34.0, -80.0]}
+    assert entry['route'] == route and entry['station_version'].startswith('0-')
+    assert entry['result']['total_cost'] == response.json()['total_cost']
+    assert {'geocode', 'route', 'corridor', 'plan'} <= set(entry['stages_ms'])
+
+    # Offline: any provider call fails the replay
+    settings.TRACE_RECORDING_ENABLED = False
+    with unittest.mock.patch('routing.services.osrm_client.OSRMClient.get_route', side_effect=AssertionError), \
+         unittest.mock.patch('routing.services.geocoding.GeocodingRouter.geocode_string', side_effect=AssertionError), \
+         unittest.mock.patch('routing.services.fuel_planner.FuelPlanner.fetch_candidates', return_value=stations):
+        call_command('replay_traces', str(tmp_path), '--fail_on_diff', '--json', str(tmp_path / 'replay.json'))
+    out = capsys.readouterr().out
+    assert "Replayed 1 traces" in out and "0 plan difference(s)" in out
+
+@pytest.mark.django_db
+def test_route_plan_alternatives_share_one_corridor_fetch(client):
+    """All OSRM alternatives are planned from one union fetch and the cheapest plan is returned."""
+    import polyline
+    from routing.services.corridor import StationGrid
+    url = reverse('route-plan')
+    headers = {'HTTP_X_API_KEY': 'spotter_dev_key_2026'}
+    fastest = {'geometry': polyline.encode([(25.0, -80.0), (34.0, -80.0)], precision=6), 'distance': 1000000, 'duration': 36000}
+    detour = {'geometry': polyline.encode([(25.0, -80.0), (29.5, -81.0), (34.0, -80.0)], precision=6), 'distance': 1050000, 'duration': 38000}
+    row = {'name': 'Stop', 'address': 'I-95', 'city': 'X', 'state': 'FL'}
+    grid = StationGrid([
+        {**row, 'opis_id': 1, 'retail_price': 4.00, 'lat': 29.0, 'lon': -80.0},   # on the fastest route
+        {**row, 'opis_id': 2, 'retail_price': 2.50, 'lat': 29.5, 'lon': -81.0},   # on the detour
+    ])
+
+    with unittest.mock.patch('routing.api.views.RoutePlanView.resolve_location', side_effect=[(25.0, -80.0), (34.0, -80.0)]), \
+         unittest.mock.patch('routing.services.osrm_client.OSRMClient.get_routes', return_value=[fastest, detour]) as mock_osrm, \
+         unittest.mock.patch('routing.services.fuel_planner.FuelPlanner.fetch_union_grid', return_value=grid) as mock_fetch, \
+         unittest.mock.patch('routing.services.fuel_planner.FuelPlanner.fetch_candidates') as mock_single:
+        response = client.post(url, {"start": "Miami, FL", "finish": "Charlotte, NC", "alternatives": 2},
+                               content_type='application/json', **headers)
+
+    assert response.status_code == 200
+    data = response.json()
+    assert mock_osrm.call_args.args[2] == 2
+    assert mock_fetch.call_count == 1 and len(mock_fetch.call_args.args[0]) == 2
+    mock_single.assert_not_called()
+
+    assert data['polyline'] == detour['geometry']
+    assert [s['station_id'] for s in data['fuel_plan']] == [2]
+    alternatives = data['alternatives']
+    assert [(a['index'], a['selected'], a['stops']) for a in alternatives] == [(0, False, 1), (1, True, 1)]
+    assert alternatives[1]['total_cost'] == data['total_cost'] < alternatives[0]['total_cost']
+
+@pytest.mark.django_db
+def test_route_replan_reuses_plan_context(client):
+    """A replan from the plan_id snaps the position onto the route and plans only stations ahead."""
+    import polyline
+    headers = {'HTTP_X_API_KEY': 'spotter_dev_key_2026'}
+    route = {'geometry': polyline.encode([(25.0, -80.0), (34.0, -80.0)], precision=6), 'distance': 1000000}
+    row = {'name': 'Stop', 'address': 'I-95', 'city': 'X', 'state': 'FL', 'lon': -80.0}
+    candidates = [
+        {**row, 'id': 1, 'dist': 200.0, 'price': 3.00, 'lat': 27.9},
+        {**row, 'id': 2, 'dist': 400.0, 'price': 3.50, 'lat': 30.8},
+    ]
+
+    with unittest.mock.patch('routing.api.views.RoutePlanView.resolve_location', side_effect=[(25.0, -80.0), (34.0, -80.0)]), \
+         unittest.mock.patch('routing.services.osrm_client.OSRMClient.get_route', return_value=route), \
+         unittest.mock.patch('routing.services.fuel_planner.FuelPlanner.fetch_candidates', return_value=candidates):
+        plan = client.post(reverse('route-plan'), {"start": "Miami, FL", "finish": "Charlotte, NC"},
+                           content_type='application/json', **headers)
+    assert plan.status_code == 200
+    plan_id = plan.json()['plan_id']
+
+    url = reverse('route-replan')
+    with unittest.mock.patch('routing.services.osrm_client.OSRMClient.get_route') as mock_osrm, \
+         unittest.mock.patch('routing.services.fuel_planner.FuelPlanner.fetch_candidates') as mock_fetch:
+        # ~300 miles in (past station 1) with 120 miles of fuel left
+        response = client.post(url, {"plan_id": plan_id, "position": {"lat": 29.35, "lon": -80.01}, "fuel_gallons": 12},
+                               content_type='application/json', **headers)
+        unknown = client.post(url, {"plan_id": "nope", "position": {"lat": 29.35, "lon": -80.0}, "fuel_gallons": 12},
+                              content_type='application/json', **headers)
+        off_route = client.post(url, {"plan_id": plan_id, "position": {"lat": 29.35, "lon": -85.0}, "fuel_gallons": 12},
+                                content_type='application/json', **headers)
+    mock_osrm.assert_not_called()
+    mock_fetch.assert_not_called()
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data['plan_id'] == plan_id
+    assert 299 < data['position']['miles_from_start'] < 303 and data['position']['off_route_miles'] < 1
+    assert [s['station_id'] for s in data['fuel_plan']] == [2]
+    assert data['fuel_plan'][0]['miles_from_start'] == 400.0
+    assert unknown.status_code == 404
+    assert off_route.status_code == 422
+
+@pytest.mark.django_db
+def test_route_plan_scenarios_share_one_candidate_fetch(client):
+    """Each scenario is solved over the stations within its own corridor from a single fetch."""
+    import polyline
+    url = reverse('route-plan')
+    headers = {'HTTP_X_API_KEY': 'spotter_dev_key_2026'}
+    route = {'geometry': polyline.encode([(25.0, -80.0), (34.0, -80.0)], precision=6), 'distance': 1000000}
+    row = {'name': 'Stop', 'address': 'I-95', 'city': 'X', 'state': 'FL', 'lat': 30.0, 'lon': -80.0}
+    candidates = [
+        {**row, 'id': 1, 'dist': 200.0, 'price': 3.00, 'off': 2.0},
+        {**row, 'id': 2, 'dist': 300.0, 'price': 2.50, 'off': 20.0},
+        {**row, 'id': 3, 'dist': 450.0, 'price': 3.20, 'off': 1.0},
+    ]
+    scenarios = [
+        {"name": "default"},
+        {"name": "wide", "corridor_miles": 25},
+        {"name": "thirsty", "mpg": 6, "reserve_gallons": 10},
+    ]
+
+    with unittest.mock.patch('routing.api.views.RoutePlanView.resolve_location', side_effect=[(25.0, -80.0), (34.0, -80.0)]), \
+         unittest.mock.patch('routing.services.osrm_client.OSRMClient.get_route', return_value=route), \
+         unittest.mock.patch('routing.services.fuel_planner.FuelPlanner.fetch_candidates', return_value=candidates) as mock_fetch:
+        response = client.post(url, {"start": "Miami, FL", "finish": "Charlotte, NC", "scenarios": scenarios},
+                               content_type='application/json', **headers)
+
+    assert response.status_code == 200
+    assert mock_fetch.call_count == 1
+    data = response.json()
+    results = data['scenarios']
+    assert [(s['name'], s['candidates'], s['selected']) for s in results] == [
+        ("default", 2, True), ("wide", 3, False), ("thirsty", 2, False)
+    ]
+    assert [s['station_id'] for s in results[0]['fuel_plan']] == [1] == [s['station_id'] for s in data['fuel_plan']]
+    assert [s['station_id'] for s in results[1]['fuel_plan']] == [2]
+    assert results[1]['total_cost'] < results[0]['total_cost']
+    assert 'error' in results[2] and 'fuel_plan' not in results[2]
+
+    both = client.post(url, {"start": "A", "finish": "B", "alternatives": 1, "scenarios": scenarios},
+                       content_type='application/json', **headers)
+    assert both.status_code == 400
+
+@pytest.mark.django_db
+def test_route_plan_adaptive_corridor_widens_dead_end_segments(client):
+    """Only segments on a stretch longer than one tank are widened and fetched again."""
+    import polyline
+    url = reverse('route-plan')
+    headers = {'HTTP_X_API_KEY': 'spotter_dev_key_2026'}
+    route = {'geometry': polyline.encode([(25.0, -80.0), (34.0, -80.0)], precision=6), 'distance': 1500000}  # 932.1 mi
+    row = {'name': 'Stop', 'address': 'I-95', 'city': 'X', 'state': 'FL', 'lat': 30.0, 'lon': -80.0, 'off': 1.0}
+    # 10 segments of ~93.2 mi; nothing within 5 miles between 230 and 780 (550 mi, more than a tank)
+    narrow = [
+        {**row, 'id': i, 'dist': d, 'price': 4.00}
+        for i, d in enumerate([30, 80, 130, 180, 230, 780, 830, 880])
+    ]
+    extra = [{**row, 'id': 100, 'dist': 500.0, 'price': 3.50, 'off': 8.0}, narrow[4]]
+
+    with unittest.mock.patch('routing.api.views.RoutePlanView.resolve_location', side_effect=[(25.0, -80.0), (34.0, -80.0)]), \
+         unittest.mock.patch('routing.services.osrm_client.OSRMClient.get_route', return_value=route), \
+         unittest.mock.patch('routing.services.fuel_planner.FuelPlanner.fetch_candidates', return_value=narrow) as mock_fetch, \
+         unittest.mock.patch('routing.services.fuel_planner.FuelPlanner.fetch_span_candidates', return_value=extra) as mock_span:
+        response = client.post(url, {"start": "Miami, FL", "finish": "Charlotte, NC", "corridor_miles": 50,
+                                     "corridor_mode": "adaptive"},
+                               content_type='application/json', **headers)
+
+    assert response.status_code == 200
+    data = response.json()
+    assert mock_fetch.call_args.args == (5,)
+    assert mock_span.call_count == 1
+    (spans, width), _ = mock_span.call_args
+    assert width == 10 and len(spans) == 1 and 186 < spans[0][0] < 187 and 838 < spans[0][1] < 839
+
+    corridor = data['corridor']
+    assert corridor['fetches'] == 2 and corridor['candidates'] == 9
+    assert [s['width_miles'] for s in corridor['segments']] == [5, 5] + [10] * 7 + [5]
+    assert 100 in [s['station_id'] for s in data['fuel_plan']]
+
+@pytest.mark.django_db
+def test_route_plan_compacts_co_located_stations(client):
+    """A cluster is planned without its pricier far members; the others are listed with the stop."""
+    import polyline
+    from routing.services.station_clusters import cluster_points
+    url = reverse('route-plan')
+    headers = {'HTTP_X_API_KEY': 'spotter_dev_key_2026'}
+    route = {'geometry': polyline.encode([(25.0, -80.0), (34.0, -80.0)], precision=6), 'distance': 1000000}
+    row = {'name': 'Stop', 'address': 'EXIT 12', 'city': 'X', 'state': 'FL', 'off': 0.5}
+    # Three stops at one interchange, one a mile down the road
+    points = [(1, 29.0, -80.0), (2, 29.001, -80.001), (3, 29.002, -80.0), (4, 29.015, -80.0)]
+    clusters = cluster_points(points)
+    assert clusters == {1: 1, 2: 1, 3: 1}
+    prices = {1: 3.60, 2: 3.20, 3: 3.40, 4: 3.50}
+    candidates = [
+        {**row, 'id': pk, 'dist': 276.0 + n * 0.1, 'price': prices[pk], 'lat': lat, 'lon': lon, 'cluster': clusters.get(pk)}
+        for n, (pk, lat, lon) in enumerate(points)
+    ]
+
+    with unittest.mock.patch('routing.api.views.RoutePlanView.resolve_location', side_effect=[(25.0, -80.0), (34.0, -80.0)]), \
+         unittest.mock.patch('routing.services.osrm_client.OSRMClient.get_route', return_value=route), \
+         unittest.mock.patch('routing.services.fuel_planner.FuelPlanner.fetch_candidates', return_value=candidates), \
+         unittest.mock.patch('routing.services.fuel_planner.PLAN_CANDIDATES.observe') as mock_observe:
+        response = client.post(url, {"start": "Miami, FL", "finish": "Charlotte, NC"},
+                               content_type='application/json', **headers)
+
+    assert response.status_code == 200
+    # Station 3 is dropped: 2 is nearer and cheaper
+    mock_observe.assert_called_once_with(3)
+    stop, = response.json()['fuel_plan']
+    assert stop['station_id'] == 2
+    assert [(s['station_id'], s['price_per_gallon']) for s in stop['co_located']] == [(3, 3.40), (1, 3.60)]
+
+@pytest.mark.django_db
+def test_precomputed_lane_served_without_routing_and_repriced(client, tmp_path):
+    """A precomputed lane answers with no geocode/OSRM/corridor work and is repriced when prices move."""
+    import polyline
+    from django.core.cache import cache
+    from routing.services.stations import STATION_VERSION_CACHE_KEY
+    url = reverse('route-plan')
+    headers = {'HTTP_X_API_KEY': 'spotter_dev_key_2026'}
+    route = {'geometry': polyline.encode([(25.0, -80.0), (34.0, -80.0)], precision=6), 'distance': 1000000}
+    row = {'name': 'Stop', 'address': 'I-95', 'city': 'X', 'state': 'FL', 'off': 0.5, 'cluster': None}
+    candidates = [
+        {**row, 'id': 1, 'dist': 200.0, 'price': 3.00, 'lat': 27.9, 'lon': -80.0},
+        {**row, 'id': 2, 'dist': 400.0, 'price': 3.50, 'lat': 30.8, 'lon': -80.0},
+    ]
+    for c in candidates:
+        FuelStation.objects.create(opis_id=c['id'], name=c['name'], address=c['address'], city=c['city'],
+                                   state=c['state'], retail_price=c['price'], location=Point(c['lon'], c['lat']))
+    lanes_csv = tmp_path / "lanes.csv"
+    lanes_csv.write_text("start,finish\nMiami FL,Charlotte NC\n")
+
+    with unittest.mock.patch('routing.api.views.RoutePlanView.resolve_location', side_effect=[(25.0, -80.0), (34.0, -80.0)]), \
+         unittest.mock.patch('routing.services.osrm_client.OSRMClient.get_route', return_value=route), \
+         unittest.mock.patch('routing.services.fuel_planner.FuelPlanner.fetch_candidates', return_value=candidates):
+        call_command('precompute_lanes', '--lanes', str(lanes_csv), '--workers', '1')
+
+    def plan():
+        with unittest.mock.patch('routing.api.views.RoutePlanView.resolve_location') as mock_resolve, \
+             unittest.mock.patch('routing.services.osrm_client.OSRMClient.get_route') as mock_osrm, \
+             unittest.mock.patch('routing.services.fuel_planner.FuelPlanner.fetch_candidates') as mock_fetch:
+            response = client.post(url, {"start": "miami  fl", "finish": "Charlotte NC"},
+                                   content_type='application/json', **headers)
+        mock_resolve.assert_not_called()
+        mock_osrm.assert_not_called()
+        mock_fetch.assert_not_called()
+        assert response.status_code == 200
+        assert response['Server-Timing'].startswith('lane;')
+        return response.json()
+
+    first = plan()
+    assert [s['station_id'] for s in first['fuel_plan']] == [1] and first['plan_id']
+
+    FuelStation.objects.filter(opis_id=2).update(retail_price=2.00)
+    cache.delete(STATION_VERSION_CACHE_KEY)
+    second = plan()
+    assert [(s['station_id'], s['price_per_gallon']) for s in second['fuel_plan']] == [(2, 2.0)]
+    assert second['total_cost'] < first['total_cost']
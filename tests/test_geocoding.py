@@ -39,3 +39,130 @@ def test_address_classification():
     # Mile Marker
     atype, _ = classify_address("I-75 MM 120")
     assert atype == AddrType.MILE_MARKER
+
+def test_address_parser_matches_reference_functions():
+    """The fused parser must agree with normalize_address_components + classify_address."""
+    from routing.services.address_parser import parse_stations_batch
+    from routing.services.geocoding import classify_address, normalize_address_components
+
+    rows = [
+        ("123  Main St", " Miami ", "fl"),
+        ("I-95 and US-1, EXIT 12", "Jacksonville", "FL"),
+        ("I-40 EXIT 271", "Amarillo", "TX"),
+        ("US-41 & SR-70 & I-75", "Arcadia", "FL"),
+        ("I-75 MM 120", "Ocala", "FL"),
+        ("US-46", "Clifton", "NJ"),
+        ("Truck Plaza", "Gary", "IN"),
+        ("I-95 & US-1", "Miami", "FL"),
+        ("123  Main St", " Miami ", "fl"),
+    ]
+
+    parsed = parse_stations_batch(rows)
+
+    assert len(parsed) == len(rows)
+    for (address, city, state), p in zip(rows, parsed):
+        normalized = normalize_address_components(address, city, state)
+        assert (p.address, p.city, p.state) == normalized
+        assert p.classification() == classify_address(normalized[0])
+
+@pytest.mark.django_db
+def test_geocoding_router_hedges_slow_provider():
+    """A slow provider is hedged by the next one and the first good answer wins."""
+    import time
+
+    def slow_census(query, deadline=None):
+        time.sleep(1.0)
+        return Point(-81.0, 26.0), {"provider": "census"}
+
+    with unittest.mock.patch('routing.services.geocoding.GoogleMapsProvider.geocode', return_value=(None, {"error": "no key"})):
+        with unittest.mock.patch('routing.services.geocoding.CensusProvider.geocode', side_effect=slow_census):
+            with unittest.mock.patch('routing.services.geocoding.OSMProvider.geocode', return_value=(Point(-80.0, 25.0), {"provider": "osm"})):
+                router = GeocodingRouter(provider_priority="smart", budget_s=5, hedge_delay_s=0.1)
+                router.has_api_key = False
+
+                started = time.monotonic()
+                # Timing assertion: keep the shared OSM quota out of the picture
+                with unittest.mock.patch('routing.services.geocoding.get_rate_limiter', return_value=None):
+                    loc, debug = router.geocode_string("Slow Census City, ST")
+
+                assert time.monotonic() - started < 0.9
+                assert loc.x == -80.0
+                assert debug["hedged"] == ["osm"]
+                assert debug["abandoned"] == ["census"]
+
+def test_geocoding_router_queries_a_shared_key_once_across_threads():
+    """Import workers missing the same query wait for the first one's answer instead of repeating it."""
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    def slow_osm(query, deadline=None):
+        time.sleep(0.2)
+        return Point(-80.0, 25.0), {"provider": "osm"}
+
+    router = GeocodingRouter(provider_priority="smart")
+    with unittest.mock.patch('routing.services.geocoding.OSMProvider.geocode', side_effect=slow_osm) as mock_osm, \
+         unittest.mock.patch('routing.services.geocoding.get_rate_limiter', return_value=None):
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            attempts = [[] for _ in range(4)]
+            locs = list(pool.map(lambda debug: router._try(router.osm, "Shared City, ST", debug), attempts))
+
+    assert mock_osm.call_count == 1
+    assert all(loc.x == -80.0 for loc in locs)
+    assert sorted(debug[0]["label"] for debug in attempts) == ["osm_cached"] * 3 + ["osm_query"]
+
+def test_circuit_breaker_opens_and_probes():
+    """Breaker opens on a high failure rate, fails fast, then lets one probe through."""
+    import uuid
+    from routing.services.circuit_breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+
+    breaker = CircuitBreaker(f"test-{uuid.uuid4().hex}", failure_rate=0.5, min_calls=4, window_s=60, open_s=60)
+    breaker.record_success()
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.record_failure()
+
+    assert breaker.state() == OPEN
+    assert not breaker.allow()
+
+    # Cool-down elapsed -> half-open: a single probe, success closes the breaker
+    breaker.open_s = 0
+    assert breaker.state() == HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state() == CLOSED
+
+
+@pytest.mark.django_db
+def test_geocoding_router_skips_open_provider():
+    """Calls to a provider with an open breaker are skipped and the router moves on."""
+    from routing.services.circuit_breaker import get_breaker
+
+    census_breaker = get_breaker("census")
+    with unittest.mock.patch.object(census_breaker, 'allow', return_value=False):
+        with unittest.mock.patch('routing.services.geocoding.CensusProvider.geocode') as mock_census:
+            with unittest.mock.patch('routing.services.geocoding.OSMProvider.geocode', return_value=(Point(-80.0, 25.0), {"provider": "osm"})):
+                router = GeocodingRouter(provider_priority="smart")
+                router.has_api_key = False
+
+                loc, debug = router.geocode_string("Breaker City, ST")
+
+                mock_census.assert_not_called()
+                assert loc.x == -80.0
+                assert any(a.get('reason') == 'circuit_open' for a in debug['attempts'])
+
+def test_rate_limiter_reserves_burst_for_interactive_traffic():
+    """Bulk callers stop short of the burst so interactive calls still get tokens."""
+    import uuid
+    from routing.services.rate_limiter import RateLimiter, BULK, INTERACTIVE
+
+    limiter = RateLimiter("test-lane", rate=1, burst=5, bulk_reserve=0.4)
+    key = uuid.uuid4().hex
+
+    bulk = [limiter.try_acquire(key, BULK)[0] for _ in range(5)]
+    assert bulk == [True, True, True, False, False]
+
+    assert limiter.try_acquire(key, INTERACTIVE)[0]
+    assert limiter.try_acquire(key, INTERACTIVE)[0]
+    allowed, retry_after = limiter.try_acquire(key, INTERACTIVE)
+    assert not allowed and retry_after > 0
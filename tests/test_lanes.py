@@ -0,0 +1,60 @@
+import unittest.mock
+from decimal import Decimal
+
+import polyline
+from django.core.cache import cache
+
+from routing.models import FuelStation
+from routing.services import lanes
+
+ROUTE = {'geometry': polyline.encode([(25.0, -80.0), (34.0, -80.0)], precision=6), 'distance': 1000000}
+ROW = {'name': 'Stop', 'address': 'I-95', 'city': 'X', 'state': 'FL', 'lat': 30.0, 'lon': -80.0, 'off': 1.0}
+
+
+def lane(version):
+    entry = {
+        "key": lanes.lane_key("Miami, FL", "Jacksonville, FL", 10),
+        "start": (25.0, -80.0), "finish": (34.0, -80.0), "corridor_miles": 10, "route": dict(ROUTE),
+        "candidates": [{**ROW, 'id': 1, 'dist': 100.0, 'price': 3.00}, {**ROW, 'id': 2, 'dist': 400.0, 'price': 4.00}],
+        "built_at": 0,
+    }
+    return lanes.price(entry, version)
+
+
+def test_lane_is_repriced_when_station_data_changes():
+    """A stale lane reloads its candidates' prices in one query and is solved and stored again."""
+    entry = lane("v1")
+    assert entry["plan_id"] and [s['station_id'] for s in entry["stops"]] == [1, 2]
+
+    filtered = unittest.mock.MagicMock()
+    filtered.values_list.return_value = [(1, Decimal('3.90')), (2, Decimal('2.90'))]
+    with unittest.mock.patch('routing.services.lanes.cached_station_version', return_value="v2"), \
+         unittest.mock.patch.object(FuelStation.objects, 'filter', return_value=filtered) as mock_filter:
+        served = lanes.serve(entry)
+
+    mock_filter.assert_called_once_with(opis_id__in={1, 2})
+    assert served["station_version"] == "v2"
+    assert [c['price'] for c in served["candidates"]] == [3.90, 2.90]
+    # Station 2 is now the cheaper one, so the plan skips station 1
+    assert [(s['station_id'], s['price_per_gallon']) for s in served["stops"]] == [(2, 2.90)]
+    assert cache.get(entry["key"])["station_version"] == "v2"
+
+
+def test_fresh_lane_is_served_without_repricing():
+    entry = lane("v1")
+    with unittest.mock.patch('routing.services.lanes.cached_station_version', return_value="v1"), \
+         unittest.mock.patch.object(FuelStation.objects, 'filter') as mock_filter:
+        assert lanes.serve(entry) is entry
+
+    mock_filter.assert_not_called()
+
+
+def test_repricing_drops_candidates_that_no_longer_exist():
+    entry = lane("v1")
+    filtered = unittest.mock.MagicMock()
+    filtered.values_list.return_value = [(2, Decimal('3.10'))]
+    with unittest.mock.patch.object(FuelStation.objects, 'filter', return_value=filtered):
+        entry = lanes.reprice(entry, "v2")
+
+    assert [c['id'] for c in entry["candidates"]] == [2]
+    assert [s['station_id'] for s in entry["stops"]] == [2]
@@ -0,0 +1,53 @@
+import polyline
+import pytest
+
+from routing.services import plan_context
+
+ROUTE = {'geometry': polyline.encode([(25.0, -80.0), (34.0, -80.0)], precision=6), 'distance': 1000000}
+ROW = {'name': 'Stop', 'address': 'I-95', 'city': 'X', 'state': 'FL', 'lat': 30.0, 'lon': -80.0, 'price': 3.0}
+
+
+def plan_id_candidates(plan_id):
+    return [c['id'] for c in plan_context.load(plan_id).candidates]
+
+
+def test_adaptive_and_fixed_plans_of_one_route_keep_separate_contexts():
+    """An adaptive plan's candidates must not replace those of a fixed plan over the same route."""
+    fixed = [{**ROW, 'id': 1, 'dist': 100.0, 'off': 20.0}, {**ROW, 'id': 2, 'dist': 300.0, 'off': 25.0}]
+    adaptive = [{**ROW, 'id': 2, 'dist': 300.0, 'off': 25.0}]
+
+    fixed_id = plan_context.save(ROUTE, 50, fixed)
+    adaptive_id = plan_context.save(ROUTE, 50, adaptive, widths=[5, 5, 50, 5, 5, 5, 5])
+    other_id = plan_context.save(ROUTE, 50, adaptive, widths=[5, 10, 10, 5, 5, 5, 5])
+
+    assert len({fixed_id, adaptive_id, other_id}) == 3
+    assert plan_id_candidates(fixed_id) == [1, 2]
+    assert plan_id_candidates(adaptive_id) == [2]
+    assert plan_context.load(adaptive_id).widths == [5, 5, 50, 5, 5, 5, 5]
+    assert plan_context.load(fixed_id).widths is None
+
+
+def test_remembered_context_expires_with_the_cache_entry():
+    """A context this process still holds is not served once its cache entry has expired."""
+    from django.core.cache import cache
+
+    plan_id = plan_context.save(ROUTE, 10, [{**ROW, 'id': 1, 'dist': 100.0, 'off': 2.0}])
+    cache.delete(plan_context.CACHE_PREFIX + plan_id)
+
+    assert plan_id in plan_context._local
+    assert plan_context.load(plan_id) is None
+
+
+def test_evicted_context_is_reloaded_from_the_cache(monkeypatch):
+    """Past LOCAL_CONTEXTS, the oldest context is dropped locally but still loads from the cache."""
+    monkeypatch.setattr(plan_context, 'LOCAL_CONTEXTS', 1)
+    widths = [5, 20, 5, 5, 5, 5, 5]
+    first = plan_context.save(ROUTE, 20, [{**ROW, 'id': 1, 'dist': 100.0, 'off': 2.0}], widths=widths)
+    plan_context.save(ROUTE, 10, [{**ROW, 'id': 2, 'dist': 300.0, 'off': 2.0}])
+    assert first not in plan_context._local
+
+    context = plan_context.load(first)
+    assert [c['id'] for c in context.candidates] == [1]
+    assert context.widths == widths and context.corridor_miles == 20
+    assert context.snap(30.0, -80.0, 1.0)[0] == pytest.approx(345.2, abs=0.5)
+    assert first in plan_context._local
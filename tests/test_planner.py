@@ -0,0 +1,112 @@
+import unittest.mock
+
+from routing.services.fuel_planner import FuelPlanner
+
+ROW = {'name': 'Stop', 'address': 'I-95', 'city': 'X', 'state': 'FL', 'lat': 30.0, 'lon': -80.0, 'off': 1.0}
+
+
+def stations(*dists, price=4.00, first_id=1, **fields):
+    return [{**ROW, 'id': first_id + n, 'dist': float(d), 'price': price, **fields} for n, d in enumerate(dists)]
+
+
+def test_adaptive_corridor_keeps_sparse_crossable_segments_narrow():
+    """A segment with no station at 5 miles stays narrow while the plan can cross it."""
+    planner = FuelPlanner(None, 1000000, corridor_miles=50)  # 621.4 mi, 7 segments
+    narrow = stations(10, 60, 100, 150, 190, 240, 370, 420, 460, 510, 550, 600)
+
+    with unittest.mock.patch.object(FuelPlanner, 'fetch_candidates', return_value=narrow), \
+         unittest.mock.patch.object(FuelPlanner, 'fetch_span_candidates') as mock_span:
+        stops, _ = planner.plan_adaptive()
+
+    assert stops is not None
+    mock_span.assert_not_called()
+    assert planner.corridor_fetches == 1
+    assert [s['width_miles'] for s in planner.corridor_segments] == [5] * 7
+    assert planner.corridor_segments[3]['candidates'] == 0
+
+
+def test_adaptive_corridor_widens_until_the_gap_is_crossed():
+    """A stretch longer than one tank is widened step by step, and only where the gap is."""
+    planner = FuelPlanner(None, 1000000, corridor_miles=20)
+    narrow = stations(20, 95, 600)  # 505 mi with nothing, just past the 500-mile range
+    fetched = []
+
+    def spans(spans, width):
+        fetched.append(width)
+        # Nothing more at 10 miles; a station at 300 turns up at 20
+        return stations(300, first_id=100) if width == 20 else []
+
+    with unittest.mock.patch.object(FuelPlanner, 'fetch_candidates', return_value=narrow), \
+         unittest.mock.patch.object(FuelPlanner, 'fetch_span_candidates', side_effect=spans):
+        stops, _ = planner.plan_adaptive()
+
+    assert stops is not None and planner.dead_end is None
+    assert fetched == [10, 20] and planner.corridor_fetches == 3
+    assert [s['width_miles'] for s in planner.corridor_segments] == [5, 20, 20, 20, 20, 20, 20]
+
+
+def test_adaptive_corridor_reports_dead_end_at_full_width():
+    planner = FuelPlanner(None, 1000000, corridor_miles=10)
+
+    with unittest.mock.patch.object(FuelPlanner, 'fetch_candidates', return_value=stations(20, 60, 600)), \
+         unittest.mock.patch.object(FuelPlanner, 'fetch_span_candidates', return_value=[]):
+        stops, error = planner.plan_adaptive()
+
+    assert stops is None and "dead-end" in error
+    assert planner.dead_end == (60.0, 560.0)
+    assert planner.corridor_fetches == 2
+
+
+def test_cluster_compaction_keeps_the_reachable_member_at_the_range_boundary():
+    """The cluster's cheapest member lies just out of range; its nearer member is still planned."""
+    planner = FuelPlanner(None, 1000000)  # 621.4 mi, 500-mile range
+    cluster = stations(499.8, cluster=7, price=3.50) + stations(500.2, cluster=7, price=3.00, first_id=2)
+
+    kept, members = planner.compact_clusters(cluster)
+    assert [s['id'] for s in kept] == [1, 2] and [s['id'] for s in members[7]] == [1, 2]
+
+    # Just enough at the nearer member to roll on to the cheaper one
+    stops, _ = planner.solve(cluster)
+    assert [s['station_id'] for s in stops] == [1, 2]
+    assert [s['station_id'] for s in stops[0]['co_located']] == [2]
+
+
+def test_cluster_compaction_plans_a_dropped_member_its_keeper_cannot_replace():
+    """Only the dropped member reaches the next station, so it is stopped at after its keeper."""
+    planner = FuelPlanner(None, 1100000)  # 683.5 mi
+    candidates = (stations(100.0, cluster=7, price=3.00) + stations(100.3, cluster=7, price=3.10, first_id=2)
+                  + stations(600.2, first_id=3))
+
+    assert [s['id'] for s in planner.compact_clusters(candidates)[0]] == [1, 3]
+    stops, _ = planner.solve(candidates)
+    assert [s['station_id'] for s in stops] == [1, 2, 3]
+
+
+
+def test_cluster_compaction_keeps_the_cost_of_planning_every_station():
+    """
+    From the cluster's cheap member only its pricier neighbour is in range of the next
+    stop; the neighbour is planned rather than the dearer station past the cluster.
+    """
+    candidates = (stations(100.0, cluster=7, price=3.00) + stations(100.5, cluster=7, price=3.20, first_id=2)
+                  + stations(150.0, price=3.50, first_id=3) + stations(600.4, price=3.00, first_id=4))
+    compacted_stops, compacted = FuelPlanner(None, 1450000).solve(candidates)  # 901 mi
+    full_stops, full = FuelPlanner(None, 1450000).solve([{**s, 'cluster': None} for s in candidates])
+
+    assert [s['station_id'] for s in compacted_stops] == [s['station_id'] for s in full_stops] == [1, 2, 4]
+    assert compacted['total_cost'] == full['total_cost']
+
+def test_scenarios_locate_candidates_without_an_off_route_distance():
+    """Candidates without 'off' are measured against the route before each scenario's corridor filter."""
+    from routing.services.fuel_planner import Scenario
+
+    route = [(25.0, -80.0), (34.0, -80.0)]  # 621.4 mi due north
+    candidates = (stations(100.0)
+                  + stations(200.0, first_id=2, off=None, lon=-80.12)  # about 7 mi off the route
+                  + stations(300.0, first_id=3, off=None, lon=-81.0))  # not found within 10 mi: on the edge
+
+    with unittest.mock.patch.object(FuelPlanner, 'fetch_candidates', return_value=candidates) as mock_fetch:
+        results = FuelPlanner.plan_scenarios(route, 1000000, [Scenario(corridor_miles=5), Scenario(corridor_miles=10)])
+
+    mock_fetch.assert_called_once_with()
+    assert [count for count, _ in results] == [1, 3]